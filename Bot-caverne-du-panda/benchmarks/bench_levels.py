@@ -0,0 +1,50 @@
+"""Benchmark du recalcul des niveaux (courbes de niveaux compilées).
+
+Usage : python benchmarks/bench_levels.py [nombre_utilisateurs]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import levels
+from core.levels import LevelCurve, recompute_levels
+from core.records import XPUser
+
+
+def build_users(count, seed=42):
+    rng = random.Random(seed)
+    return {10 ** 17 + i: XPUser(xp=rng.randrange(0, 5_000_000), level=1) for i in range(count)}
+
+
+def bench(count):
+    curve = LevelCurve("sqrt", 100)
+    other = LevelCurve("exponential", 100, 1.15)
+
+    print(f"📊 Recalcul des niveaux pour {count:,} utilisateurs".replace(",", " "))
+    print(f"   NumPy : {'oui' if levels.np is not None else 'non (repli Python)'}")
+
+    users = build_users(count)
+    start = time.perf_counter()
+    changed = recompute_levels(users, curve)
+    print(f"   Passe initiale ({len(changed)} niveaux modifiés) : {time.perf_counter() - start:.3f} s")
+
+    start = time.perf_counter()
+    changed = recompute_levels(users, curve)
+    print(f"   Détection de dérive sans changement ({len(changed)}) : {time.perf_counter() - start:.3f} s")
+
+    start = time.perf_counter()
+    changed = recompute_levels(users, other)
+    print(f"   Changement de courbe ({len(changed)} niveaux modifiés) : {time.perf_counter() - start:.3f} s")
+
+    # Comparaison avec une recherche par utilisateur
+    start = time.perf_counter()
+    for record in users.values():
+        curve.level(record.xp)
+    print(f"   Référence : bisect utilisateur par utilisateur : {time.perf_counter() - start:.3f} s")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,335 @@
+"""Benchmark hors ligne de XP.on_message et du coût des écritures.
+
+Un trafic de messages synthétique est rejoué dans le vrai cog XP avec de
+faux objets Discord. Le temps est simulé (``--rate`` messages par seconde)
+pour que le taux de messages en cooldown soit celui demandé, quelle que
+soit la vitesse de la machine ; les écritures sur disque, elles, tournent
+en temps réel dans un dossier temporaire.
+
+Les paramètres acceptent plusieurs valeurs séparées par des virgules :
+chaque combinaison est mesurée et ajoutée (une ligne JSON par mesure) au
+fichier de résultats (``benchmarks/results/``, ignoré par git), avec le
+commit courant, pour comparer deux commits.
+
+Usage : python benchmarks/bench_xp.py --guilds 1,10 --users 1000,100000 --hit-ratio 0.9
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cogs.xp
+import core.cooldown
+from cogs.xp import XP
+from core.backends import JsonBackend, ShardedJsonBackend, SqliteBackend
+from core.records import XPUser
+from core.storage import WriteBehindStore
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "bench_xp.jsonl")
+
+
+# ---- FAUX OBJETS DISCORD ----
+class SimClock:
+    """Remplace le module ``time`` du cog : horloge avancée par le benchmark."""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeGuild:
+    __slots__ = ("id",)
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeMember:
+    __slots__ = ("id", "bot", "mention")
+
+    def __init__(self, member_id):
+        self.id = member_id
+        self.bot = False
+        self.mention = f"<@{member_id}>"
+
+
+class FakeChannel:
+    __slots__ = ("id", "sent")
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+
+class FakeMessage:
+    __slots__ = ("author", "guild", "channel")
+
+    def __init__(self, author, guild, channel):
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+
+
+# ---- MESURES ----
+class LoopMonitor:
+    """Mesure le temps pendant lequel la boucle asyncio ne rend pas la main."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.blocked = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            if lag > 0.001:
+                self.blocked += lag
+                self.max_lag = max(self.max_lag, lag)
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def written_bytes():
+    """Octets passés à write() par le processus (Linux), ou ``None``."""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_backend(name, data_dir):
+    if name == "json":
+        return JsonBackend(data_dir)
+    if name == "sqlite":
+        return SqliteBackend(os.path.join(data_dir, "bot.db"), data_dir)
+    return ShardedJsonBackend(data_dir)
+
+
+# ---- SCÉNARIO ----
+def build_data(guilds, users, channels, boost_ratio, cooldown, rng):
+    """Serveurs pré-remplis (fiches XP existantes, salons boostés)."""
+    data = {}
+    for g in range(guilds):
+        guild_id = 10 ** 15 + g
+        boosted = rng.sample(range(channels), int(channels * boost_ratio))
+        data[str(guild_id)] = {
+            "users": {10 ** 17 + u: XPUser(xp=rng.randrange(0, 50_000), level=1) for u in range(users)},
+            "boosts": {str(guild_id * 100 + c): 2.0 for c in boosted},
+            "cooldown": cooldown,
+        }
+    return data
+
+
+async def run_case(params, seed=42):
+    rng = random.Random(seed)
+    clock = SimClock()
+    with tempfile.TemporaryDirectory() as data_dir:
+        backend = make_backend(params["backend"], data_dir)
+        data = build_data(
+            params["guilds"], params["users"], params["channels"], params["boost_ratio"], params["cooldown"], rng
+        )
+        # État initial sur disque : la taille du fichier fait partie du scénario
+        backend.write("xp", {
+            guild_id: {**doc, "users": {str(u): r.to_dict() for u, r in doc["users"].items()}}
+            for guild_id, doc in data.items()
+        }, {guild_id: None for guild_id in data})
+
+        original_time = cogs.xp.time, core.cooldown.time
+        cogs.xp.time = core.cooldown.time = clock
+        try:
+            cog = XP(None)
+            cog.store = WriteBehindStore("xp", XPUser, backend=backend, flush_interval=params["flush_interval"])
+            cog.xp_data = cog.store.data
+            cog.store.on_load.append(cog.guild_loaded)
+            cog.store.on_evict.append(cog.guild_evicted)
+            await cog.cog_load()
+            return await replay(cog, params, clock, rng, data_dir)
+        finally:
+            cogs.xp.time, core.cooldown.time = original_time
+            if hasattr(backend, "close"):
+                backend.close()
+
+
+async def replay(cog, params, clock, rng, data_dir):
+    guilds = [FakeGuild(10 ** 15 + g) for g in range(params["guilds"])]
+    channels = [[FakeChannel(guild.id * 100 + c) for c in range(params["channels"])] for guild in guilds]
+    members = {}
+    cooldown_until = {}  # (serveur, membre) -> fin du cooldown simulée
+    hot = []             # membres probablement en cooldown, pour les messages « touchés »
+    step = 1.0 / params["rate"]
+
+    def pick_member():
+        if hot and rng.random() < params["hit_ratio"]:
+            while hot:
+                i = rng.randrange(len(hot))
+                key = hot[i]
+                if cooldown_until.get(key, 0) > clock.now:
+                    return key
+                hot[i] = hot[-1]
+                hot.pop()
+        for _ in range(20):
+            key = (rng.randrange(params["guilds"]), 10 ** 17 + rng.randrange(params["users"]))
+            if cooldown_until.get(key, 0) <= clock.now:
+                break
+        return key
+
+    latencies = []
+    monitor = LoopMonitor()
+    monitor.start()
+    bytes_before = written_bytes()
+    start = time.perf_counter()
+
+    for n in range(params["messages"]):
+        clock.now += step
+        g, user_id = key = pick_member()
+        author = members.get(user_id)
+        if author is None:
+            author = members[user_id] = FakeMember(user_id)
+        message = FakeMessage(author, guilds[g], rng.choice(channels[g]))
+
+        t0 = time.perf_counter()
+        await cog.on_message(message)
+        latencies.append(time.perf_counter() - t0)
+
+        if cooldown_until.get(key, 0) <= clock.now:
+            cooldown_until[key] = clock.now + params["cooldown"]
+            hot.append(key)
+        if n % params["batch"] == params["batch"] - 1:
+            # Le gateway livre les événements par paquets : rendre la main
+            await asyncio.sleep(0)
+
+    elapsed = time.perf_counter() - start
+    cog.announcer.close()
+    await cog.store.close()
+    await monitor.stop()
+    bytes_after = written_bytes()
+
+    latencies.sort()
+    stats = cog.store.stats()
+    gate = cog.cooldown_gate
+    return {
+        "messages": params["messages"],
+        "elapsed_s": round(elapsed, 4),
+        "throughput_msg_s": round(params["messages"] / elapsed, 1),
+        "latency_p50_us": round(percentile(latencies, 0.50) * 1e6, 2),
+        "latency_p99_us": round(percentile(latencies, 0.99) * 1e6, 2),
+        "latency_max_us": round(latencies[-1] * 1e6, 2),
+        "cooldown_hit_ratio": round(gate.rejected / max(gate.passed + gate.rejected, 1), 4),
+        "loop_blocked_ms": round(monitor.blocked * 1000, 2),
+        "loop_max_lag_ms": round(monitor.max_lag * 1000, 2),
+        "bytes_written": bytes_after - bytes_before if bytes_before is not None else None,
+        "flushes": stats["flush_count"],
+        "avg_flush_ms": round(stats["avg_flush_duration"] * 1000, 3),
+        "last_snapshot_ms": round(stats["last_snapshot_duration"] * 1000, 3),
+        "data_size_bytes": directory_size(data_dir),
+    }
+
+
+def parse_list(kind):
+    return lambda text: [kind(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de XP.on_message et des écritures différées")
+    parser.add_argument("--guilds", type=parse_list(int), default=[1, 10])
+    parser.add_argument("--users", type=parse_list(int), default=[1_000, 50_000], help="fiches par serveur")
+    parser.add_argument("--hit-ratio", type=parse_list(float), default=[0.9], help="part des messages en cooldown")
+    parser.add_argument("--boost-ratio", type=parse_list(float), default=[0.0, 0.5], help="part des salons boostés")
+    parser.add_argument("--backend", type=parse_list(str), default=["sharded"], help="json, sharded ou sqlite")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--channels", type=int, default=20, help="salons par serveur")
+    parser.add_argument("--cooldown", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=200.0, help="messages par seconde (temps simulé)")
+    parser.add_argument("--batch", type=int, default=50, help="messages traités entre deux retours à la boucle")
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="fichier JSON Lines des résultats")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    cases = itertools.product(args.guilds, args.users, args.hit_ratio, args.boost_ratio, args.backend)
+    for guilds, users, hit_ratio, boost_ratio, backend in cases:
+        params = {
+            "guilds": guilds, "users": users, "hit_ratio": hit_ratio, "boost_ratio": boost_ratio,
+            "backend": backend, "messages": args.messages, "channels": args.channels,
+            "cooldown": args.cooldown, "rate": args.rate, "batch": args.batch,
+            "flush_interval": args.flush_interval,
+        }
+        print(f"📊 {guilds} serveur(s) × {users} fiches • cooldown {hit_ratio:.0%} • boosts {boost_ratio:.0%} • {backend}")
+        results = asyncio.run(run_case(params))
+        print(
+            f"   {results['throughput_msg_s']:.0f} msg/s • p50 {results['latency_p50_us']:.1f} µs • "
+            f"p99 {results['latency_p99_us']:.1f} µs • boucle bloquée {results['loop_blocked_ms']:.0f} ms • "
+            f"{results['flushes']} écriture(s), {results['avg_flush_ms']:.1f} ms en moyenne • "
+            f"{(results['bytes_written'] or 0) / 1024:.0f} Kio écrits"
+        )
+
+        entry = {
+            "bench": "xp",
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "params": params,
+            "results": results,
+        }
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    print(f"✅ Résultats ajoutés à {args.output}")
+
+
+if __name__ == "__main__":
+    main()
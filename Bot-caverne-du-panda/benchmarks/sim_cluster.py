@@ -0,0 +1,238 @@
+"""Simulation du mode cluster avec une fausse gateway, sans connexion à Discord.
+
+Le lanceur prépare une base SQLite partagée puis démarre les processus
+avec les mêmes variables que ``cluster.py``. Chaque processus rejoue le
+même flux de messages (temps simulé, graine fixe), mais sa fausse gateway
+ne lui livre que les serveurs de ses shards, comme Discord. Ensuite,
+chaque processus répond à ``/leaderboard`` (la vraie commande du cog XP)
+pour tous les serveurs, y compris ceux des autres processus.
+
+Les réponses doivent être identiques d'un processus à l'autre et à celles
+d'une exécution de référence en un seul processus.
+
+Usage : python benchmarks/sim_cluster.py --processes 2 --shards 4 --guilds 16 --messages 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="sim_cluster-"))
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+
+
+# ---- FAUX OBJETS DISCORD ----
+class SimClock:
+    """Remplace le module ``time`` du cog : horloge avancée par le flux d'événements."""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeMember:
+    def __init__(self, member_id):
+        self.id = member_id
+        self.bot = False
+        self.mention = f"<@{member_id}>"
+        self.display_name = f"membre{member_id}"
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+    async def send(self, content=None, **kwargs):
+        pass
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+    def get_member(self, member_id):
+        return FakeMember(member_id)
+
+
+class FakeMessage:
+    def __init__(self, author, guild, channel):
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+
+
+class FakeResponse:
+    def __init__(self):
+        self.answer = None
+
+    async def send_message(self, content=None, embed=None, ephemeral=False, **kwargs):
+        if embed is not None:
+            self.answer = {
+                "footer": embed.footer.text,
+                "fields": [[field.name, field.value] for field in embed.fields],
+            }
+        else:
+            self.answer = {"content": content}
+
+
+class FakeInteraction:
+    def __init__(self, guild):
+        self.guild = guild
+        self.response = FakeResponse()
+
+
+class FakeBot:
+    def get_cog(self, name):
+        return None
+
+    def get_guild(self, guild_id):
+        return None
+
+
+def guild_ids(count):
+    """Ids répartis sur les shards : le shard d'un id est ``(id >> 22) % shards``."""
+    return [(1_000_000 + g) << 22 for g in range(count)]
+
+
+def events(args):
+    """Flux de messages déterministe, identique pour tous les processus."""
+    rng = random.Random(args.seed)
+    guilds = guild_ids(args.guilds)
+    for n in range(args.messages):
+        guild_id = rng.choice(guilds)
+        yield n, guild_id, 10 ** 17 + rng.randrange(args.users), guild_id + rng.randrange(args.channels)
+
+
+# ---- PROCESSUS DU CLUSTER ----
+async def worker(args):
+    import cogs.xp
+    import core.cooldown
+    from cogs.xp import XP
+    from core.cluster import CLUSTER_ID, owns
+    from core.log import setup_logging
+
+    setup_logging(args.log_level, stream=sys.stderr)
+    clock = SimClock()
+    cogs.xp.time = core.cooldown.time = clock
+
+    cog = XP(FakeBot())
+    await cog.cog_load()
+
+    # Fausse gateway : seuls les serveurs des shards de ce processus sont livrés
+    guilds = {guild_id: FakeGuild(guild_id) for guild_id in guild_ids(args.guilds)}
+    delivered = 0
+    start = time.perf_counter()
+    for n, guild_id, user_id, channel_id in events(args):
+        if not owns(guild_id):
+            continue
+        clock.now = 1_700_000_000.0 + n * args.step
+        await cog.on_message(FakeMessage(FakeMember(user_id), guilds[guild_id], FakeChannel(channel_id)))
+        delivered += 1
+        if delivered % 50 == 0:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    await cog.store.save()
+    cog.announcer.close()
+    print(json.dumps({"ready": CLUSTER_ID, "delivered": delivered, "elapsed": elapsed}), flush=True)
+
+    # Attendre que tous les processus aient écrit leurs données
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+
+    answers = {}
+    for guild_id, guild in guilds.items():
+        interaction = FakeInteraction(guild)
+        await cog.interaction_check(interaction)
+        await XP.leaderboard.callback(cog, interaction, page=1)
+        answers[str(guild_id)] = {"owned": owns(guild_id), "answer": interaction.response.answer}
+    await cog.cog_unload()
+    print(json.dumps({"cluster": CLUSTER_ID, "answers": answers}), flush=True)
+
+
+# ---- LANCEUR ----
+def run_cluster(args, processes, shards, data_dir):
+    from cluster import plan_clusters, worker_env
+
+    plan = plan_clusters(shards, processes)
+    command = [sys.executable, os.path.abspath(__file__), "--worker"] + sys.argv[1:]
+    workers = []
+    for cluster_id, shard_ids in enumerate(plan):
+        env = worker_env(cluster_id, shard_ids, shards, len(plan))
+        env["DATA_DIR"] = data_dir
+        workers.append(subprocess.Popen(
+            command, cwd=BOT_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        ))
+
+    ready = [json.loads(process.stdout.readline()) for process in workers]
+    for process in workers:
+        process.stdin.write("go\n")
+        process.stdin.flush()
+    results = [json.loads(process.stdout.readline()) for process in workers]
+    for process in workers:
+        process.wait()
+    return plan, ready, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation du mode cluster (fausse gateway)")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--guilds", type=int, default=16)
+    parser.add_argument("--users", type=int, default=500, help="membres par serveur")
+    parser.add_argument("--channels", type=int, default=5, help="salons par serveur")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--step", type=float, default=0.05, help="secondes simulées entre deux messages")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(worker(args))
+        return
+
+    from cluster import prepare_storage
+
+    # Référence : un seul processus, dans son propre dossier
+    reference_dir = tempfile.mkdtemp(prefix="sim_cluster-ref-")
+    _, _, (reference,) = run_cluster(args, 1, 1, reference_dir)
+
+    # Cluster : base partagée préparée une fois, comme cluster.py
+    prepare_storage()
+    plan, ready, results = run_cluster(args, args.processes, args.shards, os.environ["DATA_DIR"])
+
+    print(f"📊 {args.messages} message(s) • {args.guilds} serveur(s) • {args.shards} shard(s) sur {len(plan)} processus")
+    for (shard_ids, state) in zip(plan, ready):
+        print(
+            f"   Cluster {state['ready']} (shards {shard_ids}) : {state['delivered']} message(s) livrés "
+            f"en {state['elapsed']:.2f} s"
+        )
+
+    mismatches = 0
+    for guild_id, expected in reference["answers"].items():
+        for result in results:
+            entry = result["answers"][guild_id]
+            if entry["answer"] != expected["answer"]:
+                mismatches += 1
+                origin = "propriétaire" if entry["owned"] else "autre processus"
+                print(f"   ❌ Serveur {guild_id} : réponse différente dans le cluster {result['cluster']} ({origin})")
+    checked = len(reference["answers"]) * len(results)
+    if mismatches:
+        print(f"❌ {mismatches}/{checked} réponse(s) de /leaderboard différentes de la référence")
+        sys.exit(1)
+    print(f"✅ {checked} réponse(s) de /leaderboard identiques dans tous les processus et à la référence")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Simulation du moteur d'envoi de DMs (/broadcast) sans Discord.
+
+De faux membres injectent de la latence, des 429 (avec retry_after), des
+erreurs serveur passagères et des DMs fermés.
+
+Usage : python benchmarks/sim_delivery.py [membres] [workers] [débit]
+"""
+import asyncio
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.delivery import AdaptiveTokenBucket, DeliveryEngine
+
+
+class FakeHTTPError(Exception):
+    """Imite discord.HTTPException : attributs ``status`` et ``code``."""
+
+    def __init__(self, status, code=0, retry_after=None):
+        super().__init__(f"HTTP {status} (code {code})")
+        self.status = status
+        self.code = code
+        if retry_after is not None:
+            self.retry_after = retry_after
+
+
+class FakeGateway:
+    """Compte les envois et renvoie un 429 au-delà de ``limit`` envois par seconde."""
+
+    def __init__(self, limit, latency, rng):
+        self.limit = limit
+        self.latency = latency
+        self.rng = rng
+        self.window_start = 0.0
+        self.window_count = 0
+        self.calls = 0
+
+    async def request(self):
+        loop = asyncio.get_running_loop()
+        self.calls += 1
+        await asyncio.sleep(self.rng.uniform(*self.latency))
+        now = loop.time()
+        if now - self.window_start >= 1:
+            self.window_start = now
+            self.window_count = 0
+        self.window_count += 1
+        if self.window_count > self.limit:
+            raise FakeHTTPError(429, retry_after=1 - (now - self.window_start))
+
+
+class FakeMember:
+    def __init__(self, member_id, gateway, rng, dm_closed_ratio, error_ratio):
+        self.id = member_id
+        self.gateway = gateway
+        self.dm_closed = rng.random() < dm_closed_ratio
+        self.flaky = rng.random() < error_ratio
+        self.received = 0
+
+    async def send(self, **kwargs):
+        await self.gateway.request()
+        if self.dm_closed:
+            raise FakeHTTPError(403, 50007)
+        if self.flaky:
+            # Première tentative en erreur serveur, la suivante passe
+            self.flaky = False
+            raise FakeHTTPError(503)
+        self.received += 1
+
+
+async def simulate(count=500, workers=4, rate=4.0, limit=10, seed=1):
+    rng = random.Random(seed)
+    gateway = FakeGateway(limit, (0.02, 0.12), rng)
+    members = [FakeMember(i, gateway, rng, dm_closed_ratio=0.1, error_ratio=0.02) for i in range(count)]
+
+    engine = DeliveryEngine(
+        workers=workers,
+        bucket=AdaptiveTokenBucket(rate=rate, max_rate=limit * 2),
+        base_backoff=0.1,
+    )
+    report = await engine.run(members, lambda member: member.send(embed=None))
+
+    duplicates = sum(1 for member in members if member.received > 1)
+    print(f"📊 {count} membres, {workers} workers, débit initial {rate}/s, limite serveur {limit}/s")
+    print(f"   {report.to_dict()}")
+    print(f"   Appels API : {gateway.calls} • doublons : {duplicates} • débit final du seau : {engine.bucket.rate:.2f}/s")
+    return report
+
+
+if __name__ == "__main__":
+    args = [float(arg) for arg in sys.argv[1:]]
+    count = int(args[0]) if len(args) > 0 else 500
+    workers = int(args[1]) if len(args) > 1 else 4
+    rate = args[2] if len(args) > 2 else 4.0
+    asyncio.run(simulate(count, workers, rate))
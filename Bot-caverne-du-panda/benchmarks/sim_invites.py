@@ -0,0 +1,295 @@
+"""Simulation de vagues d'arrivées (join storms) à travers le cog Invites.
+
+Un faux serveur remplace Discord : liste d'invitations, membres, rôles et
+salons. Chaque appel REST (``guild.invites()``, ``add_roles``, DMs,
+message de bienvenue) subit une latence et une limite par route ; au-delà,
+un 429 est compté et l'appel attend ``retry_after`` avant de réessayer,
+comme le client HTTP de discord.py.
+
+Pour chaque taille de vague, le rapport donne la justesse de l'attribution
+(comparée à la vérité du simulateur), les appels API par arrivée et la
+latence de bout en bout de ``on_member_join``.
+
+Usage : python benchmarks/sim_invites.py --joins 10,100,1000 --join-rate 50 --hot-share 0.8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="sim_invites-"))
+
+from cogs.invites import Invites
+from cogs.xp import XP
+from core.log import setup_logging, stop_logging
+
+
+class FakeHTTPError(Exception):
+    """Imite discord.HTTPException : attributs ``status`` et ``code``."""
+
+    def __init__(self, status, code=0):
+        super().__init__(f"HTTP {status} (code {code})")
+        self.status = status
+        self.code = code
+
+
+class FakeAPI:
+    """Latence et limite de débit par route, avec attente des 429."""
+
+    def __init__(self, latency, limit, rng):
+        self.latency = latency
+        self.limit = limit
+        self.rng = rng
+        self.windows = {}  # route -> [début de la fenêtre, appels]
+        self.calls = Counter()
+        self.rate_limited = Counter()
+
+    async def request(self, route):
+        loop = asyncio.get_running_loop()
+        while True:
+            self.calls[route] += 1
+            await asyncio.sleep(self.rng.uniform(*self.latency))
+            now = loop.time()
+            window = self.windows.setdefault(route, [now, 0])
+            if now - window[0] >= 1:
+                window[0] = now
+                window[1] = 0
+            window[1] += 1
+            if window[1] <= self.limit:
+                return
+            self.rate_limited[route] += 1
+            await asyncio.sleep(1 - (now - window[0]))
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.bot = False
+
+
+class FakeInvite:
+    def __init__(self, guild, code, inviter, uses=0, max_uses=0):
+        self.guild = guild
+        self.code = code
+        self.inviter = inviter
+        self.uses = uses
+        self.max_uses = max_uses
+
+    def copy(self):
+        return FakeInvite(self.guild, self.code, self.inviter, self.uses, self.max_uses)
+
+
+class FakeRole:
+    def __init__(self, role_id, position):
+        self.id = role_id
+        self.name = f"role{role_id}"
+        self.position = position
+
+
+class FakeChannel:
+    def __init__(self, channel_id, api):
+        self.id = channel_id
+        self.name = f"salon{channel_id}"
+        self.api = api
+
+    async def send(self, content=None, **kwargs):
+        await self.api.request("channel_message")
+
+
+class FakeMember(FakeUser):
+    def __init__(self, user_id, guild, api):
+        super().__init__(user_id)
+        self.guild = guild
+        self.api = api
+        self.roles = []
+        self.mention = f"<@{user_id}>"
+
+    async def add_roles(self, *roles, reason=None):
+        await self.api.request("member_roles")
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def send(self, content=None, **kwargs):
+        await self.api.request("dm")
+
+
+class FakeGuild:
+    def __init__(self, guild_id, api):
+        self.id = guild_id
+        self.name = f"serveur{guild_id}"
+        self.api = api
+        self.members = {}
+        self.invite_list = {}
+        self.roles = {}
+        self.me = FakeMember(1, self, api)
+        self.me.roles = [FakeRole(2, 100)]
+        self.me.top_role = self.me.roles[0]
+        self.system_channel = FakeChannel(3, api)
+        self.text_channels = [self.system_channel]
+
+    async def invites(self):
+        await self.api.request("guild_invites")
+        # État du serveur au moment de la réponse
+        return [invite.copy() for invite in self.invite_list.values()]
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+
+class FakeBot:
+    def __init__(self):
+        self.cogs = {}
+        self.guilds = []
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    def get_user(self, user_id):
+        return None
+
+
+# ---- SCÉNARIO ----
+def build_guild(api, rng, inviters, codes_per_inviter, thresholds):
+    guild = FakeGuild(10 ** 15, api)
+    for i in range(inviters):
+        member = FakeMember(10 ** 16 + i, guild, api)
+        guild.members[member.id] = member
+        for c in range(codes_per_inviter):
+            code = f"c{i}x{c}"
+            guild.invite_list[code] = FakeInvite(guild, code, member, uses=rng.randrange(0, 50))
+    for n, required in enumerate(thresholds):
+        guild.roles[1000 + n] = FakeRole(1000 + n, 10 + n)
+    return guild
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def simulate(joins, args, seed=1):
+    rng = random.Random(seed)
+    api = FakeAPI((args.latency_min, args.latency_max), args.limit, rng)
+    guild = build_guild(api, rng, args.inviters, args.codes, args.thresholds)
+
+    bot = FakeBot()
+    bot.guilds = [guild]
+    bot.cogs["XP"] = XP(bot)
+    cog = Invites(bot)
+    settings = cog.get_guild_data(guild.id)["settings"]
+    settings["roles"] = {str(1000 + n): required for n, required in enumerate(args.thresholds)}
+
+    # Cache chaud avant la vague, puis compteurs remis à zéro
+    await cog.tracker.warm_up(bot.guilds)
+    api.calls.clear()
+    api.rate_limited.clear()
+
+    codes = list(guild.invite_list)
+    hot_code = codes[0]
+    truth = {}
+    latencies = []
+
+    async def join(member):
+        start = time.perf_counter()
+        await cog.on_member_join(member)
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    started = time.perf_counter()
+    for n in range(joins):
+        member = FakeMember(10 ** 17 + n, guild, api)
+        roll = rng.random()
+        if roll < args.vanity:
+            # Arrivée par un lien non suivi (URL personnalisée, découverte...)
+            truth[member.id] = None
+        else:
+            code = hot_code if roll < args.vanity + args.hot_share else rng.choice(codes)
+            invite = guild.invite_list[code]
+            invite.uses += 1
+            truth[member.id] = invite.inviter.id
+        guild.members[member.id] = member
+        tasks.append(asyncio.create_task(join(member)))
+        if args.join_rate:
+            await asyncio.sleep(rng.expovariate(args.join_rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    cog.tracker.close()
+
+    users = cog.get_guild_data(guild.id)["users"]
+    correct = wrong = unknown = 0
+    for member_id, inviter_id in truth.items():
+        record = users.get(member_id)
+        attributed = record.invited_by if record is not None else None
+        if attributed is None:
+            unknown += 1
+        elif attributed == inviter_id:
+            correct += 1
+        else:
+            wrong += 1
+    attributable = sum(1 for inviter_id in truth.values() if inviter_id is not None)
+
+    latencies.sort()
+    total_calls = sum(api.calls.values())
+    print(f"📊 {joins} arrivée(s) en {elapsed:.1f} s ({args.join_rate or '∞'}/s)")
+    print(
+        f"   Attribution : {correct} justes • {wrong} fausses • {unknown} inconnues "
+        f"(dont {joins - attributable} sans invitation) • précision "
+        f"{correct / max(correct + wrong, 1):.1%} • couverture {correct / max(attributable, 1):.1%}"
+    )
+    print(
+        f"   Appels API : {total_calls / joins:.2f} par arrivée • "
+        + " • ".join(f"{route} {count}" for route, count in sorted(api.calls.items()))
+        + f" • 429 : {sum(api.rate_limited.values())}"
+    )
+    print(
+        f"   Latence par arrivée : p50 {percentile(latencies, 0.5) * 1000:.0f} ms • "
+        f"p99 {percentile(latencies, 0.99) * 1000:.0f} ms • max {latencies[-1] * 1000:.0f} ms"
+    )
+    return {
+        "joins": joins,
+        "correct": correct,
+        "wrong": wrong,
+        "unknown": unknown,
+        "api_calls": dict(api.calls),
+        "rate_limited": dict(api.rate_limited),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p99": percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation de vagues d'arrivées pour le cog Invites")
+    parser.add_argument("--joins", default="10,100,1000", help="tailles des vagues (10 à 10000), séparées par des virgules")
+    parser.add_argument("--join-rate", type=float, default=50.0, help="arrivées par seconde (0 = toutes d'un coup)")
+    parser.add_argument("--hot-share", type=float, default=0.8, help="part des arrivées par l'invitation la plus utilisée")
+    parser.add_argument("--vanity", type=float, default=0.05, help="part des arrivées sans invitation suivie")
+    parser.add_argument("--inviters", type=int, default=20)
+    parser.add_argument("--codes", type=int, default=2, help="invitations par inviteur")
+    parser.add_argument("--thresholds", default="1,5,10", help="seuils des rôles automatiques")
+    parser.add_argument("--latency-min", type=float, default=0.05)
+    parser.add_argument("--latency-max", type=float, default=0.15)
+    parser.add_argument("--limit", type=int, default=50, help="appels par seconde et par route avant un 429")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    args.thresholds = [int(value) for value in args.thresholds.split(",") if value]
+
+    setup_logging(args.log_level)
+    try:
+        for joins in (int(value) for value in args.joins.split(",")):
+            asyncio.run(simulate(joins, args))
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
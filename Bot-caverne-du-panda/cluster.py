@@ -0,0 +1,169 @@
+"""Lanceur du mode cluster : plusieurs processus, chacun avec une partie des shards.
+
+Chaque processus exécute ``main.py`` avec un ``AutoShardedBot`` limité à
+ses shards (variables SHARD_COUNT, SHARD_IDS, CLUSTER_ID). Un serveur
+appartient toujours au processus de son shard : lui seul garde ses
+données en mémoire et les écrit. Le stockage partagé est la base SQLite
+(mode WAL), préparée une seule fois ici avant le démarrage des processus.
+
+Usage : python cluster.py --processes 2 --shards 4
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from core.cluster import plan_clusters
+from core.log import setup_logging
+
+log = logging.getLogger("cluster")
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Réglages par défaut, modifiables via les variables d'environnement
+CLUSTER_PROCESSES = int(os.environ.get("CLUSTER_PROCESSES", 2))
+CLUSTER_RESTART_DELAY = float(os.environ.get("CLUSTER_RESTART_DELAY", 5))
+
+
+def recommended_shards(token):
+    """Nombre de shards conseillé par Discord pour ce bot (``GET /gateway/bot``)."""
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "DiscordBot (cluster.py, 1.0)"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["shards"]
+
+
+def prepare_storage():
+    """Crée ou met à jour la base et importe les anciennes données, une seule fois.
+
+    Fait par le lanceur pour que les processus ne lancent pas en même temps
+    les migrations (ALTER TABLE, import JSON, conversion de l'historique).
+    """
+    from core.backends import get_backend
+    from core.history import BroadcastHistory
+
+    backend = get_backend()
+    BroadcastHistory()._resolve().migrate()
+    backend.close()
+
+
+def worker_env(cluster_id, shard_ids, shard_count, processes):
+    """Variables d'environnement d'un processus du cluster."""
+    from core.storage import GUILD_CACHE_MAX_GUILDS, GUILD_CACHE_MAX_USERS
+
+    env = dict(os.environ)
+    env.update({
+        "SHARD_COUNT": str(shard_count),
+        "SHARD_IDS": ",".join(str(shard_id) for shard_id in shard_ids),
+        "CLUSTER_ID": str(cluster_id),
+        "CLUSTER_COUNT": str(processes),
+        "STORAGE_BACKEND": "sqlite",
+    })
+    # Les processus se partagent la mémoire du conteneur : budget du cache divisé d'autant
+    env.setdefault("GUILD_CACHE_MAX_GUILDS", str(max(GUILD_CACHE_MAX_GUILDS // processes, 1)))
+    env.setdefault("GUILD_CACHE_MAX_USERS", str(max(GUILD_CACHE_MAX_USERS // processes, 1)))
+    return env
+
+
+class Worker:
+    """Un processus du cluster, relancé s'il s'arrête de lui-même."""
+
+    def __init__(self, cluster_id, shard_ids, env, command):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.env = env
+        self.command = command
+        self.process = None
+        self.restarts = 0
+        self.restart_at = None
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, cwd=BOT_DIR, env=self.env)
+        self.restart_at = None
+        log.info("🚀 Cluster %d démarré (pid %d, shard(s) %s)", self.cluster_id, self.process.pid, self.shard_ids)
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            # SIGTERM : main.py ferme le bot, ce qui force l'écriture des données
+            self.process.terminate()
+
+
+def run(workers):
+    """Surveille les processus jusqu'à SIGTERM/SIGINT, puis attend leur arrêt propre."""
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            log.info("🛑 Arrêt du cluster demandé")
+        stopping = True
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for worker in workers:
+        worker.start()
+
+    while True:
+        running = 0
+        for worker in workers:
+            code = worker.process.poll()
+            if code is None:
+                running += 1
+            elif not stopping:
+                if worker.restart_at is None:
+                    worker.restarts += 1
+                    worker.restart_at = time.monotonic() + CLUSTER_RESTART_DELAY
+                    log.error("❌ Cluster %d arrêté (code %s), relance dans %.0f s", worker.cluster_id, code, CLUSTER_RESTART_DELAY)
+                elif time.monotonic() >= worker.restart_at:
+                    worker.start()
+                running += 1
+        if stopping and not running:
+            break
+        time.sleep(0.5)
+    log.info("✅ Cluster arrêté")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lance le bot en plusieurs processus (shards répartis)")
+    parser.add_argument("--processes", type=int, default=CLUSTER_PROCESSES, help="nombre de processus")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("SHARD_COUNT", 0)),
+                        help="nombre total de shards (0 = valeur conseillée par Discord)")
+    args = parser.parse_args()
+
+    setup_logging()
+    backend = os.environ.setdefault("STORAGE_BACKEND", "sqlite").lower()
+    if backend != "sqlite":
+        # Les fichiers JSON (manifestes) ne supportent pas plusieurs écrivains
+        log.error("❌ Le mode cluster nécessite STORAGE_BACKEND=sqlite (actuellement %s)", backend)
+        sys.exit(1)
+
+    shard_count = args.shards
+    if not shard_count:
+        token = os.environ.get("Token_bot")
+        if not token:
+            raise ValueError("❌ Le token n'est pas défini dans les variables d'environnement.")
+        shard_count = recommended_shards(token)
+    plan = plan_clusters(shard_count, args.processes)
+    log.info("🧩 %d shard(s) répartis sur %d processus : %s", shard_count, len(plan), plan)
+
+    prepare_storage()
+    command = [sys.executable, os.path.join(BOT_DIR, "main.py")]
+    workers = [
+        Worker(cluster_id, shard_ids, worker_env(cluster_id, shard_ids, shard_count, len(plan)), command)
+        for cluster_id, shard_ids in enumerate(plan)
+    ]
+    run(workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,160 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from cogs.utils import Utils
+from core.audience import AudienceSelection, GuildAudience
+from core.cluster import owns
+from core.delivery import DeliveryEngine
+from core.history import BroadcastHistory
+from core.jobs import BroadcastJob, JobStore, RUNNING, PAUSED, CANCELLED, DONE
+from core.metrics import timed
 import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+# Fréquence des points de contrôle d'un job de broadcast
+CHECKPOINT_EVERY = 25
+CHECKPOINT_INTERVAL = 5.0
+
+# Broadcasts affichés par page de /broadcast_history
+HISTORY_PAGE_SIZE = 5
+
+
+class MemberLeft(Exception):
+    """Le destinataire a quitté le serveur depuis la création du job."""
+    code = 10007  # Unknown member
+
 
 class Broadcast(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.broadcast_file = "./data/broadcast.json"
-        self.broadcast_data = Utils.load_json(self.broadcast_file)
+        self.history = BroadcastHistory()
+        self.jobs = JobStore()
+        self.active = {}  # job_id -> BroadcastJob en cours ou en pause
+        self.tasks = {}   # job_id -> tâche d'envoi
+        self.audiences = {}  # guild_id -> GuildAudience, construit à la demande
+        self._resume_task = None
+
+    async def cog_load(self):
+        await self.history.load()
+        removed = await self.history.compact_all()
+        if removed:
+            log.info("🗄️ %d ancienne(s) entrée(s) d'historique archivée(s)", removed)
+        for job in await self.jobs.load_all():
+            # En mode cluster, chaque job est repris par le processus de son serveur
+            if owns(job.guild_id):
+                self.active[job.id] = job
+        self._resume_task = asyncio.create_task(self.resume_jobs())
+
+    async def cog_unload(self):
+        # Un cog déchargé avant on_ready ne doit plus relancer de jobs
+        if self._resume_task is not None:
+            self._resume_task.cancel()
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        # Laisser chaque job sauvegarder son curseur avant l'arrêt
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_audience(self, guild):
+        """Récupère (ou construit) l'index des membres d'un serveur."""
+        audience = self.audiences.get(guild.id)
+        if audience is None:
+            audience = self.audiences[guild.id] = GuildAudience(guild.members)
+        return audience
+
+    @commands.Cog.listener()
+    @timed("listener")
+    async def on_member_join(self, member):
+        audience = self.audiences.get(member.guild.id)
+        if audience is not None:
+            audience.add(member)
+
+    @commands.Cog.listener()
+    @timed("listener")
+    async def on_member_remove(self, member):
+        audience = self.audiences.get(member.guild.id)
+        if audience is not None:
+            audience.remove(member.id)
+
+    @commands.Cog.listener()
+    @timed("listener")
+    async def on_member_update(self, before, after):
+        audience = self.audiences.get(after.guild.id)
+        if audience is not None and before.roles != after.roles:
+            audience.update_roles(
+                after.id, {role.id for role in before.roles}, {role.id for role in after.roles}
+            )
 
-    def save_data(self):
-        """Sauvegarde les données de broadcast."""
-        Utils.save_json(self.broadcast_file, self.broadcast_data)
+    @commands.Cog.listener()
+    @timed("listener")
+    async def on_guild_role_delete(self, role):
+        audience = self.audiences.get(role.guild.id)
+        if audience is not None:
+            audience.remove_role(role.id)
+
+    @commands.Cog.listener()
+    @timed("listener")
+    async def on_guild_remove(self, guild):
+        self.audiences.pop(guild.id, None)
+
+    async def select_audience(self, guild, role=None, niveau_min=None, invitations_min=None, rejoint_apres=None):
+        """Construit l'audience d'un broadcast à partir des filtres.
+
+        Retourne ``(sélection, description des filtres)`` ; lève
+        ``ValueError`` avec un message pour l'utilisateur si un filtre est
+        inutilisable.
+        """
+        filters = []
+        min_xp = xp_ranking = invite_ranking = joined_after = None
+
+        if role is not None:
+            filters.append(f"rôle {role.mention}")
+        if niveau_min is not None:
+            xp_cog = self.bot.get_cog("XP")
+            if xp_cog is None:
+                raise ValueError("Le module XP n'est pas chargé.")
+            # Le serveur a pu être évincé du cache : le classement serait construit à vide
+            await xp_cog.store.prefetch(guild.id)
+            min_xp = xp_cog.get_curve(guild.id).threshold(niveau_min)
+            xp_ranking = xp_cog.get_ranking(guild.id)
+            filters.append(f"niveau ≥ {niveau_min}")
+        if invitations_min is not None:
+            invites_cog = self.bot.get_cog("Invites")
+            if invites_cog is None:
+                raise ValueError("Le module d'invitations n'est pas chargé.")
+            await invites_cog.store.prefetch(guild.id)
+            invite_ranking = invites_cog.get_ranking(guild.id)
+            filters.append(f"invitations ≥ {invitations_min}")
+        if rejoint_apres is not None:
+            try:
+                date = datetime.strptime(rejoint_apres, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            except ValueError:
+                raise ValueError("La date doit être au format AAAA-MM-JJ (ex : 2025-01-31).")
+            joined_after = date.timestamp()
+            filters.append(f"arrivés après le {date:%d/%m/%Y}")
+
+        selection = AudienceSelection(
+            self.get_audience(guild),
+            role_id=role.id if role is not None else None,
+            xp_ranking=xp_ranking, min_xp=min_xp,
+            invite_ranking=invite_ranking, min_invites=invitations_min,
+            joined_after=joined_after,
+        )
+        return selection, ", ".join(filters) or "tous les membres"
 
-    @app_commands.command(name="broadcast", description="🔒 ADMIN : Envoie un message à tous les membres du serveur")
+    @app_commands.command(name="broadcast", description="🔒 ADMIN : Envoie un message aux membres du serveur (avec filtres optionnels)")
     @app_commands.describe(
         titre="Le titre de l'embed",
         description="La description du message",
         couleur="Couleur de l'embed (red, blue, green, gold, purple)",
-        image="URL de l'image à afficher (optionnel)"
+        image="URL de l'image à afficher (optionnel)",
+        role="Envoyer seulement aux membres ayant ce rôle",
+        niveau_min="Envoyer seulement aux membres ayant au moins ce niveau XP",
+        invitations_min="Envoyer seulement aux membres ayant au moins ce nombre d'invitations",
+        rejoint_apres="Envoyer seulement aux membres arrivés après cette date (AAAA-MM-JJ)"
     )
     @app_commands.checks.has_permissions(administrator=True)
     async def broadcast(
@@ -28,7 +163,11 @@ class Broadcast(commands.Cog):
         titre: str, 
         description: str,
         couleur: str = "blue",
-        image: str = None
+        image: str = None,
+        role: discord.Role = None,
+        niveau_min: app_commands.Range[int, 1] = None,
+        invitations_min: app_commands.Range[int, 1] = None,
+        rejoint_apres: str = None
     ):
         """Envoie un embed personnalisé en DM à tous les membres."""
 
@@ -70,74 +209,289 @@ class Broadcast(commands.Cog):
             icon_url=interaction.guild.icon.url if interaction.guild.icon else None
         )
 
-        # Récupérer tous les membres du serveur (hors bots)
-        members = [member for member in interaction.guild.members if not member.bot]
+        # Évaluer les filtres sur les index et figer les destinataires dans un job durable
+        try:
+            selection, targets = await self.select_audience(
+                interaction.guild, role, niveau_min, invitations_min, rejoint_apres
+            )
+        except ValueError as e:
+            await interaction.followup.send(f"⚠️ {e}", ephemeral=True)
+            return
+
+        recipients = list(selection)
+        if not recipients:
+            await interaction.followup.send(
+                f"❌ Aucun membre ne correspond aux filtres ({targets}).",
+                ephemeral=True
+            )
+            return
 
-        # Compteurs
-        success = 0
-        failed = 0
+        job = BroadcastJob(
+            interaction.guild.id, interaction.user.id, titre, description, embed.to_dict(), recipients,
+            created_at=discord.utils.utcnow().isoformat()
+        )
+        await self.jobs.create(job)
+        self.active[job.id] = job
 
         # Message de progression
         progress_msg = await interaction.followup.send(
-            f"📤 Envoi en cours... 0/{len(members)}",
+            f"📤 Envoi en cours... 0/{job.total} (job `{job.id}`)",
             ephemeral=True
         )
 
-        # Envoyer à chaque membre
-        for i, member in enumerate(members, start=1):
-            try:
-                await member.send(embed=embed)
-                success += 1
+        # L'envoi tourne en tâche de fond : la commande rend la main tout de suite
+        self.start_job(job, progress_msg)
 
-                # Mettre à jour le message de progression tous les 10 messages
-                if i % 10 == 0 or i == len(members):
-                    await progress_msg.edit(
-                        content=f"📤 Envoi en cours... {i}/{len(members)}\n✅ Réussis: {success} | ❌ Échecs: {failed}"
-                    )
+    def start_job(self, job, progress_msg=None):
+        """Lance (ou relance) l'envoi d'un job en tâche de fond."""
+        if job.id in self.tasks:
+            return
+        task = asyncio.create_task(self.run_job(job, progress_msg))
+        self.tasks[job.id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(job.id, None))
+
+    async def resume_jobs(self):
+        """Reprend au démarrage les broadcasts interrompus par un redémarrage."""
+        await self.bot.wait_until_ready()
+        for job in list(self.active.values()):
+            if job.status == RUNNING and job.id not in self.tasks:
+                log.info("🔁 Reprise du broadcast %s sur %s (%d/%d)", job.id, job.guild_id, job.processed, job.total)
+                self.start_job(job)
+
+    async def run_job(self, job, progress_msg=None):
+        """Envoie l'embed d'un job aux destinataires restants.
+
+        Le curseur est sauvegardé tous les ``CHECKPOINT_EVERY`` destinataires
+        (ou toutes les ``CHECKPOINT_INTERVAL`` secondes) : après un
+        redémarrage, seuls les envois en vol depuis le dernier point de
+        contrôle peuvent être refaits.
+        """
+        guild = self.bot.get_guild(job.guild_id)
+        if guild is None:
+            log.warning("❌ Serveur %s introuvable, broadcast %s annulé", job.guild_id, job.id)
+            job.status = CANCELLED
+            await self.finish_job(job)
+            return
 
-                # Petit délai pour éviter le rate limit
-                await asyncio.sleep(0.5)
+        embed = discord.Embed.from_dict(job.embed)
+        unsaved = 0
+        last_checkpoint = time.monotonic()
+        last_update = 0.0
+
+        async def send(index):
+            member = guild.get_member(job.recipients[index])
+            if member is None:
+                raise MemberLeft()
+            await member.send(embed=embed)
+
+        async def on_result(index, outcome, report):
+            nonlocal unsaved, last_checkpoint, last_update
+            job.mark_done(index, outcome)
+            unsaved += 1
+            now = time.monotonic()
+            if unsaved >= CHECKPOINT_EVERY or now - last_checkpoint >= CHECKPOINT_INTERVAL:
+                unsaved = 0
+                last_checkpoint = now
+                await self.jobs.checkpoint(job)
+
+            # Mettre à jour la progression au plus toutes les 2 secondes
+            if progress_msg is None or (now - last_update < 2 and job.processed < job.total):
+                return
+            last_update = now
+            try:
+                await progress_msg.edit(
+                    content=(
+                        f"📤 Envoi en cours... {job.processed}/{job.total} (job `{job.id}`)\n"
+                        f"✅ Réussis: {job.sent} | 🔕 DMs fermés: {job.blocked} | "
+                        f"❌ Échecs: {job.failed} • {report.throughput:.1f} msg/s"
+                    )
+                )
+            except Exception:
+                # Le jeton de l'interaction expire après 15 minutes
+                pass
+
+        engine = DeliveryEngine()
+        try:
+            report = await engine.run(
+                job.pending(), send, on_result,
+                # Une pause ou une annulation arrête les envois qui n'ont pas démarré
+                stop=lambda: job.status != RUNNING
+            )
+        except asyncio.CancelledError:
+            # Arrêt du bot : le job reste « running » et reprendra au démarrage
+            await self.jobs.checkpoint(job)
+            raise
+        log.info("📤 Broadcast %s (%s) sur %s : %s", job.id, job.status, job.guild_id, report.to_dict())
+
+        if job.status == PAUSED:
+            await self.jobs.checkpoint(job)
+            return
+        if job.status == RUNNING:
+            job.status = DONE
+        await self.finish_job(job)
 
-            except discord.Forbidden:
-                # L'utilisateur a bloqué les DMs
-                failed += 1
-            except Exception as e:
-                print(f"❌ Erreur pour {member.name}: {e}")
-                failed += 1
+        if progress_msg is None:
+            return
 
         # Message final
         final_embed = discord.Embed(
-            title="✅ Broadcast terminé !",
-            color=discord.Color.green()
+            title="✅ Broadcast terminé !" if job.status == DONE else "🛑 Broadcast annulé",
+            color=discord.Color.green() if job.status == DONE else discord.Color.red()
         )
-        final_embed.add_field(name="✅ Envoyés", value=str(success), inline=True)
-        final_embed.add_field(name="❌ Échecs", value=str(failed), inline=True)
-        final_embed.add_field(name="📊 Total", value=str(len(members)), inline=True)
-
-        await progress_msg.edit(content=None, embed=final_embed)
-
-        # Sauvegarder l'historique
-        guild_id = str(interaction.guild.id)
-        if guild_id not in self.broadcast_data:
-            self.broadcast_data[guild_id] = []
-
-        self.broadcast_data[guild_id].append({
-            "author": str(interaction.user.id),
-            "titre": titre,
-            "description": description,
-            "success": success,
-            "failed": failed,
+        final_embed.add_field(name="✅ Envoyés", value=str(job.sent), inline=True)
+        final_embed.add_field(name="❌ Échecs", value=str(job.blocked + job.failed), inline=True)
+        final_embed.add_field(name="📊 Total", value=str(job.total), inline=True)
+        final_embed.add_field(name="🔕 DMs fermés", value=str(job.blocked), inline=True)
+        final_embed.add_field(name="🔁 Nouvelles tentatives", value=str(report.retries), inline=True)
+        final_embed.add_field(name="⚡ Débit", value=f"{report.throughput:.1f} msg/s", inline=True)
+
+        try:
+            await progress_msg.edit(content=None, embed=final_embed)
+        except Exception:
+            pass
+
+    async def finish_job(self, job):
+        """Enregistre un job terminé ou annulé dans l'historique puis le supprime."""
+        # L'entrée est écrite (et synchronisée) avant que le job disparaisse
+        await self.history.append(job.guild_id, {
+            "author": str(job.author_id),
+            "titre": job.titre,
+            "description": job.description,
+            "success": job.sent,
+            "failed": job.blocked + job.failed,
+            "status": job.status,
             "timestamp": discord.utils.utcnow().isoformat()
         })
+        await self.jobs.delete(job)
+        self.active.pop(job.id, None)
+
+    def find_job(self, guild_id, job_id=None):
+        """Job actif du serveur (le plus récent si ``job_id`` est absent)."""
+        jobs = [job for job in self.active.values() if job.guild_id == guild_id]
+        if job_id is not None:
+            jobs = [job for job in jobs if job.id == job_id]
+        if not jobs:
+            return None
+        return max(jobs, key=lambda job: job.created_at or "")
+
+    @app_commands.command(name="broadcast_status", description="🔒 ADMIN : Affiche l'avancement des broadcasts en cours")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def broadcast_status(self, interaction: discord.Interaction):
+        """Affiche les broadcasts en cours ou en pause sur le serveur."""
+        jobs = [job for job in self.active.values() if job.guild_id == interaction.guild.id]
 
-        self.save_data()
+        if not jobs:
+            await interaction.response.send_message(
+                "❌ Aucun broadcast en cours sur ce serveur.",
+                ephemeral=True
+            )
+            return
+
+        embed = discord.Embed(
+            title="📤 Broadcasts en cours",
+            color=discord.Color.blue()
+        )
+
+        for job in sorted(jobs, key=lambda job: job.created_at or ""):
+            percent = job.processed / job.total * 100 if job.total else 100
+            status = "▶️ En cours" if job.status == RUNNING else "⏸️ En pause"
+            embed.add_field(
+                name=f"📨 {job.titre} (job `{job.id}`)",
+                value=(
+                    f"**Statut:** {status}\n"
+                    f"**Avancement:** {job.processed}/{job.total} ({percent:.0f}%)\n"
+                    f"✅ {job.sent} | 🔕 {job.blocked} | ❌ {job.failed}"
+                ),
+                inline=False
+            )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="broadcast_pause", description="🔒 ADMIN : Met en pause un broadcast en cours")
+    @app_commands.describe(job="Identifiant du job (par défaut le plus récent)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def broadcast_pause(self, interaction: discord.Interaction, job: str = None):
+        """Met en pause un broadcast ; il peut être repris avec /broadcast_resume."""
+        target = self.find_job(interaction.guild.id, job)
+
+        if target is None or target.status != RUNNING:
+            await interaction.response.send_message(
+                "❌ Aucun broadcast en cours à mettre en pause.",
+                ephemeral=True
+            )
+            return
+
+        target.status = PAUSED
+        await interaction.response.send_message(
+            f"⏸️ Broadcast `{target.id}` mis en pause ({target.processed}/{target.total}). "
+            f"Les envois déjà démarrés se terminent.",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="broadcast_resume", description="🔒 ADMIN : Reprend un broadcast en pause")
+    @app_commands.describe(job="Identifiant du job (par défaut le plus récent)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def broadcast_resume(self, interaction: discord.Interaction, job: str = None):
+        """Reprend un broadcast mis en pause là où il s'était arrêté."""
+        target = self.find_job(interaction.guild.id, job)
+
+        if target is None or target.status != PAUSED:
+            await interaction.response.send_message(
+                "❌ Aucun broadcast en pause à reprendre.",
+                ephemeral=True
+            )
+            return
+
+        if target.id in self.tasks:
+            await interaction.response.send_message(
+                "⏳ Ce broadcast est encore en train de se mettre en pause, réessaie dans un instant.",
+                ephemeral=True
+            )
+            return
+
+        target.status = RUNNING
+        self.start_job(target)
+        await self.jobs.checkpoint(target)
+        await interaction.response.send_message(
+            f"▶️ Broadcast `{target.id}` repris ({target.processed}/{target.total}).",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="broadcast_cancel", description="🔒 ADMIN : Annule un broadcast en cours ou en pause")
+    @app_commands.describe(job="Identifiant du job (par défaut le plus récent)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def broadcast_cancel(self, interaction: discord.Interaction, job: str = None):
+        """Annule un broadcast ; les statistiques partielles vont dans l'historique."""
+        target = self.find_job(interaction.guild.id, job)
+
+        if target is None or target.status not in (RUNNING, PAUSED):
+            await interaction.response.send_message(
+                "❌ Aucun broadcast à annuler.",
+                ephemeral=True
+            )
+            return
+
+        was_running = target.id in self.tasks
+        target.status = CANCELLED
+        if not was_running:
+            # Job en pause : aucune tâche ne l'enregistrera à notre place
+            await self.finish_job(target)
+
+        await interaction.response.send_message(
+            f"🛑 Broadcast `{target.id}` annulé ({target.sent} message(s) envoyé(s) sur {target.total}).",
+            ephemeral=True
+        )
 
     @app_commands.command(name="broadcast_preview", description="🔒 ADMIN : Prévisualise un broadcast sans l'envoyer")
     @app_commands.describe(
         titre="Le titre de l'embed",
         description="La description du message",
         couleur="Couleur de l'embed (red, blue, green, gold, purple)",
-        image="URL de l'image à afficher (optionnel)"
+        image="URL de l'image à afficher (optionnel)",
+        role="Envoyer seulement aux membres ayant ce rôle",
+        niveau_min="Envoyer seulement aux membres ayant au moins ce niveau XP",
+        invitations_min="Envoyer seulement aux membres ayant au moins ce nombre d'invitations",
+        rejoint_apres="Envoyer seulement aux membres arrivés après cette date (AAAA-MM-JJ)"
     )
     @app_commands.checks.has_permissions(administrator=True)
     async def broadcast_preview(
@@ -146,7 +500,11 @@ class Broadcast(commands.Cog):
         titre: str, 
         description: str,
         couleur: str = "blue",
-        image: str = None
+        image: str = None,
+        role: discord.Role = None,
+        niveau_min: app_commands.Range[int, 1] = None,
+        invitations_min: app_commands.Range[int, 1] = None,
+        rejoint_apres: str = None
     ):
         """Prévisualise un broadcast avant de l'envoyer."""
 
@@ -185,55 +543,127 @@ class Broadcast(commands.Cog):
             icon_url=interaction.guild.icon.url if interaction.guild.icon else None
         )
 
-        # Envoyer la prévisualisation
-        members_count = len([m for m in interaction.guild.members if not m.bot])
+        # Taille exacte de l'audience, calculée sur les index
+        try:
+            selection, targets = await self.select_audience(
+                interaction.guild, role, niveau_min, invitations_min, rejoint_apres
+            )
+        except ValueError as e:
+            await interaction.response.send_message(f"⚠️ {e}", ephemeral=True)
+            return
+        members_count = selection.count()
 
+        # Envoyer la prévisualisation
         await interaction.response.send_message(
-            f"👀 **Prévisualisation du broadcast**\nCe message sera envoyé à **{members_count} membre(s)**",
+            f"👀 **Prévisualisation du broadcast**\n"
+            f"Ce message sera envoyé à **{members_count} membre(s)** ({targets})",
             embed=embed,
             ephemeral=True
         )
 
-    @app_commands.command(name="broadcast_history", description="🔒 ADMIN : Affiche l'historique des broadcasts")
-    @app_commands.checks.has_permissions(administrator=True)
-    async def broadcast_history(self, interaction: discord.Interaction):
-        """Affiche l'historique des broadcasts du serveur."""
-        guild_id = str(interaction.guild.id)
-
-        if guild_id not in self.broadcast_data or not self.broadcast_data[guild_id]:
-            await interaction.response.send_message(
-                "❌ Aucun broadcast n'a été envoyé sur ce serveur.",
-                ephemeral=True
-            )
-            return
-
-        history = self.broadcast_data[guild_id]
+    async def history_embed(self, guild, page):
+        """Embed d'une page de l'historique (page 0 = les plus récents)."""
+        entries, total = await self.history.page(guild.id, page, HISTORY_PAGE_SIZE)
+        pages = max(1, -(-total // HISTORY_PAGE_SIZE))
 
         embed = discord.Embed(
             title="📜 Historique des Broadcasts",
-            description=f"{len(history)} broadcast(s) envoyé(s)",
+            description=f"{total} broadcast(s) envoyé(s)",
             color=discord.Color.blue()
         )
 
-        # Afficher les 5 derniers
-        for i, broadcast in enumerate(reversed(history[-5:]), start=1):
-            author = interaction.guild.get_member(int(broadcast["author"]))
+        for broadcast in entries:
+            author = guild.get_member(int(broadcast["author"]))
             author_name = author.display_name if author else "Utilisateur inconnu"
 
             embed.add_field(
                 name=f"📨 {broadcast['titre']}",
                 value=(
                     f"**Par:** {author_name}\n"
-                    f"**Envoyés:** {broadcast['success']} ✅ | {broadcast['failed']} ❌\n"
+                    f"**Envoyés:** {broadcast['success']} ✅ | {broadcast['failed']} ❌"
+                    f"{' (annulé)' if broadcast.get('status') == CANCELLED else ''}\n"
                     f"**Date:** <t:{int(discord.utils.parse_time(broadcast['timestamp']).timestamp())}:R>"
                 ),
                 inline=False
             )
 
-        if len(history) > 5:
-            embed.set_footer(text=f"+ {len(history) - 5} autre(s) broadcast(s)")
+        embed.set_footer(text=f"Page {page + 1}/{pages}")
+        return embed, total, pages
 
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+    @app_commands.command(name="broadcast_history", description="🔒 ADMIN : Affiche l'historique des broadcasts")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def broadcast_history(self, interaction: discord.Interaction):
+        """Affiche l'historique des broadcasts du serveur, page par page."""
+        embed, total, pages = await self.history_embed(interaction.guild, 0)
+
+        if total == 0:
+            await interaction.response.send_message(
+                "❌ Aucun broadcast n'a été envoyé sur ce serveur.",
+                ephemeral=True
+            )
+            return
+
+        view = HistoryView(self, interaction.user.id, pages) if pages > 1 else discord.utils.MISSING
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+    @app_commands.command(name="broadcast_history_compact", description="🔒 ADMIN : Archive les anciennes entrées de l'historique")
+    @app_commands.describe(
+        garder="Nombre d'entrées récentes à garder",
+        jours="Archiver les entrées plus anciennes que ce nombre de jours"
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def broadcast_history_compact(
+        self,
+        interaction: discord.Interaction,
+        garder: app_commands.Range[int, 1, 10000] = None,
+        jours: app_commands.Range[int, 1, 3650] = None
+    ):
+        """Archive les entrées d'historique en surnombre ou trop anciennes."""
+        if garder is None and jours is None:
+            await interaction.response.send_message(
+                "⚠️ Indique au moins `garder` ou `jours`.",
+                ephemeral=True
+            )
+            return
+
+        removed = await self.history.compact(interaction.guild.id, garder, jours)
+        await interaction.response.send_message(
+            f"🗄️ {removed} entrée(s) archivée(s) ; {await self.history.count(interaction.guild.id)} conservée(s).",
+            ephemeral=True
+        )
+
+
+class HistoryView(discord.ui.View):
+    """Boutons de navigation dans l'historique des broadcasts."""
+
+    def __init__(self, cog, author_id, pages):
+        super().__init__(timeout=180)
+        self.cog = cog
+        self.author_id = author_id
+        self.pages = pages
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.newer.disabled = self.page == 0
+        self.older.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.author_id
+
+    async def show(self, interaction, page):
+        self.page = page
+        embed, total, self.pages = await self.cog.history_embed(interaction.guild, page)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Plus récents", emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label="Plus anciens", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
 
 async def setup(bot):
     await bot.add_cog(Broadcast(bot))
\ No newline at end of file
@@ -1,129 +1,421 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-from cogs.utils import Utils
+from core.storage import WriteBehindStore
+from core.ranking import RankIndex, is_present
+from core.records import InviteUser
+from core.attribution import InviteTracker, RECONCILE_MINUTES
+from core.autoroles import RoleThresholds, ROLE_SYNC_BATCH, ROLE_SYNC_PAUSE
+from core.metrics import timed
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
 
 class Invites(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.invites_file = "./data/invites.json"
-        self.invites_data = Utils.load_json(self.invites_file)
-        self.invite_cache = {}  # Cache des invitations par serveur
-
-    def save_data(self):
-        """Sauvegarde les données d'invitations."""
-        Utils.save_json(self.invites_file, self.invites_data)
+        self.store = WriteBehindStore("invites", InviteUser)
+        self.invites_data = self.store.data
+        self.tracker = InviteTracker()  # Cache des invitations et attribution des arrivées
+        self.warmed_up = False  # on_ready est rappelé à chaque reconnexion
+        self.rankings = {}  # guild_id -> RankIndex des invitations, construit à la demande
+        self.thresholds = {}  # guild_id -> RoleThresholds, reconstruit quand la configuration change
+        self.role_syncs = {}  # guild_id -> (tâche, progression) de resynchronisation des rôles
+        self.store.on_evict.append(self.guild_evicted)
+
+    async def cog_load(self):
+        await self.store.load()
+        self.store.start()
+        # Le dernier cache connu permet d'attribuer les arrivées avant la fin du chargement
+        if await self.tracker.load_snapshot():
+            log.info("📨 Cache des invitations restauré depuis le disque")
+        self.reconcile_invites.start()
+
+    async def cog_unload(self):
+        self.reconcile_invites.cancel()
+        for task, _ in self.role_syncs.values():
+            task.cancel()
+        self.tracker.close()
+        await self.tracker.save_snapshot()
+        await self.store.close()
+
+    async def interaction_check(self, interaction):
+        # Les commandes lisent les données du serveur : on les charge hors de la boucle
+        if interaction.guild is not None:
+            await self.store.prefetch(interaction.guild.id)
+        return True
+
+    def guild_evicted(self, guild_id):
+        """Oublie les index dérivés d'un serveur évincé de la mémoire."""
+        self.rankings.pop(guild_id, None)
+        self.thresholds.pop(guild_id, None)
+
+    def save_data(self, guild_id, user_id=None):
+        """Marque les données d'invitations comme modifiées (écriture différée)."""
+        self.store.mark_dirty(guild_id, user_id)
 
     def get_guild_data(self, guild_id):
         """Récupère ou initialise les données d'un serveur."""
         guild_id = str(guild_id)
-        if guild_id not in self.invites_data:
-            self.invites_data[guild_id] = {
+        guild_data = self.invites_data.get(guild_id)  # recharge un serveur évincé
+        if guild_data is None:
+            guild_data = self.invites_data[guild_id] = {
                 "users": {},
                 "settings": {
                     "xp_per_invite": 50,
                     "roles": {}
                 }
             }
-        return self.invites_data[guild_id]
+        return guild_data
 
     def get_user_data(self, guild_id, user_id):
         """Récupère ou initialise les données d'un utilisateur."""
         guild_data = self.get_guild_data(guild_id)
-        user_id = str(user_id)
+        user_id = int(user_id)
         if user_id not in guild_data["users"]:
-            guild_data["users"][user_id] = {
-                "invites": 0,
-                "left": 0
-            }
+            guild_data["users"][user_id] = InviteUser()
         return guild_data["users"][user_id]
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        """Cache toutes les invitations au démarrage du bot."""
-        print("📨 Chargement du cache des invitations...")
-        for guild in self.bot.guilds:
+    def get_ranking(self, guild_id):
+        """Récupère (ou construit) le classement des inviteurs d'un serveur."""
+        guild_id = str(guild_id)
+        ranking = self.rankings.get(guild_id)
+        if ranking is None:
+            users = self.get_guild_data(guild_id)["users"]
+            guild = self.bot.get_guild(int(guild_id))
+            # Seuls les membres présents qui ont invité quelqu'un sont classés
+            # (ceux qui ne figurent que dans l'index d'arrivées n'y sont pas)
+            ranking = RankIndex({
+                user_id: data.invites for user_id, data in users.items()
+                if data.invites and is_present(guild, user_id)
+            })
+            if guild is None or guild.chunked:
+                # Sinon, membres pas encore reçus : classement reconstruit au prochain appel
+                self.rankings[guild_id] = ranking
+        return ranking
+
+    def get_thresholds(self, guild_id):
+        """Récupère (ou construit) l'index trié des rôles automatiques d'un serveur."""
+        guild_id = str(guild_id)
+        thresholds = self.thresholds.get(guild_id)
+        if thresholds is None:
+            thresholds = RoleThresholds(self.get_guild_data(guild_id)["settings"]["roles"])
+            self.thresholds[guild_id] = thresholds
+        return thresholds
+
+    def resolve_roles(self, guild, member, role_ids):
+        """Sépare les rôles manquants d'un membre : ``(attribuables, hors de portée du bot)``."""
+        held = {role.id for role in member.roles}
+        bot_top_role = guild.me.top_role
+        grantable = []
+        blocked = []
+        for role_id in role_ids:
+            if role_id in held:
+                continue
+            role = guild.get_role(role_id)
+            if role is None:
+                log.warning("❌ Rôle %s introuvable sur %s", role_id, guild.name)
+                continue
+            if bot_top_role.position <= role.position:
+                blocked.append(role)
+            else:
+                grantable.append(role)
+        return grantable, blocked
+
+    async def reward_inviter(self, guild, inviter, role_ids, total_invites):
+        """Donne en un seul appel les rôles dont l'inviteur vient d'atteindre le seuil."""
+        grantable, blocked = self.resolve_roles(guild, inviter, role_ids)
+
+        if grantable:
+            try:
+                await inviter.add_roles(*grantable, reason=f"{total_invites} invitations")
+            except discord.Forbidden:
+                log.warning("❌ Pas la permission de donner les rôles %s", [role.name for role in grantable])
+                grantable = []
+            except Exception as e:
+                log.error("❌ Erreur lors de l'ajout des rôles : %s", e)
+                grantable = []
+
+        if grantable:
+            names = ", ".join(f"**{role.name}**" for role in grantable)
+            log.info("✅ Rôles %s donnés à %s", [role.name for role in grantable], inviter.name)
+            try:
+                await inviter.send(
+                    f"🎉 Félicitations ! Tu as atteint **{total_invites} invitations** et tu as reçu {names} sur **{guild.name}** !"
+                )
+            except Exception:
+                log.debug("❌ Impossible d'envoyer un DM à %s", inviter.name)
+
+        if blocked:
+            names = ", ".join(f"**{role.name}**" for role in blocked)
+            log.warning("❌ Le bot ne peut pas donner %s (hiérarchie insuffisante)", [role.name for role in blocked])
+            try:
+                await inviter.send(
+                    f"⚠️ Tu devrais avoir {names} mais le bot n'a pas les permissions nécessaires. Contacte un administrateur !"
+                )
+            except Exception:
+                pass
+
+    def _role_sync_done(self, guild_id, task):
+        """Fin d'une resynchronisation : journalise une éventuelle erreur et libère le serveur."""
+        if self.role_syncs.get(guild_id, (None,))[0] is task:
+            del self.role_syncs[guild_id]
+        if not task.cancelled() and task.exception() is not None:
+            log.error("❌ Resynchronisation des rôles échouée sur %s", guild_id, exc_info=task.exception())
+
+    async def sync_roles(self, guild, remove, progress):
+        """Aligne les rôles automatiques de tous les membres sur les seuils actuels.
+
+        Les candidats sont les membres classés au-dessus du plus petit seuil
+        (et, avec ``remove``, ceux qui portent un rôle automatique). Chaque
+        membre reçoit au plus un ``add_roles`` et un ``remove_roles`` ; une
+        pause est faite tous les ``ROLE_SYNC_BATCH`` appels.
+        """
+        thresholds = self.get_thresholds(guild.id)
+        ranking = self.get_ranking(guild.id)
+        configured = thresholds.role_ids()
+
+        candidates = []
+        if thresholds:
+            for _, user_id, invites in ranking.iter_from(0):
+                if invites < thresholds.minimum:
+                    break
+                candidates.append(user_id)
+        if remove:
+            seen = set(candidates)
+            for role_id in configured:
+                role = guild.get_role(role_id)
+                for member in (role.members if role else ()):
+                    if member.id not in seen:
+                        seen.add(member.id)
+                        candidates.append(member.id)
+        progress["total"] = len(candidates)
+
+        calls = 0
+        bot_top_role = guild.me.top_role
+        for user_id in candidates:
+            progress["checked"] += 1
+            member = guild.get_member(user_id)
+            if member is None or member.bot:
+                continue
+
+            earned = set(thresholds.earned(ranking.score(user_id) or 0))
+            grantable, _ = self.resolve_roles(guild, member, earned)
+            removable = []
+            if remove:
+                removable = [
+                    role for role in member.roles
+                    if role.id in configured and role.id not in earned and role.position < bot_top_role.position
+                ]
+
             try:
-                invites = await guild.invites()
-                # Créer un dictionnaire avec code -> uses pour comparaison facile
-                self.invite_cache[guild.id] = {invite.code: invite.uses for invite in invites}
-                print(f"   ✅ Cache créé pour {guild.name} ({len(invites)} invitations)")
+                if grantable:
+                    await member.add_roles(*grantable, reason="Resynchronisation des rôles d'invitations")
+                    calls += 1
+                if removable:
+                    await member.remove_roles(*removable, reason="Resynchronisation des rôles d'invitations")
+                    calls += 1
+                if grantable or removable:
+                    progress["updated"] += 1
             except Exception as e:
-                print(f"   ❌ Erreur pour {guild.name}: {e}")
+                progress["errors"] += 1
+                log.error("❌ Erreur lors de la resynchronisation des rôles de %s: %s", member.name, e)
+
+            if calls >= ROLE_SYNC_BATCH:
+                calls = 0
+                await asyncio.sleep(ROLE_SYNC_PAUSE)
+            elif progress["checked"] % 500 == 0:
+                # Rendre la main à la boucle sur les très grands serveurs
+                await asyncio.sleep(0)
+
+        log.info(
+            "🔄 Rôles d'invitations resynchronisés sur %s : %d membre(s) mis à jour, %d erreur(s)",
+            guild.name, progress["updated"], progress["errors"]
+        )
+        return progress
+
+    def record_join(self, guild_id, member_id, inviter_id, code):
+        """Enregistre qui a invité un membre dans l'index membre -> inviteur."""
+        member_data = self.get_user_data(guild_id, member_id)
+        member_data.invited_by = inviter_id
+        member_data.invite_code = code
+        member_data.departed = False
+        self.save_data(guild_id, member_id)
+
+    def member_left(self, guild_id, member_id):
+        """Compte le départ d'un membre chez son inviteur, en O(1) grâce à l'index.
+
+        Retourne l'id de l'inviteur, ou ``None`` si le membre n'est pas
+        indexé ou si son départ est déjà compté.
+        """
+        member_data = self.get_guild_data(guild_id)["users"].get(int(member_id))
+        if member_data is None or member_data.invited_by is None or member_data.departed:
+            return None
+        member_data.departed = True
+        inviter_data = self.get_user_data(guild_id, member_data.invited_by)
+        inviter_data.left += 1
+        self.save_data(guild_id, member_id)
+        self.save_data(guild_id, member_data.invited_by)
+        return member_data.invited_by
+
+    def member_returned(self, guild_id, member_id):
+        """Annule le départ compté d'un membre indexé qui revient sur le serveur."""
+        member_data = self.get_guild_data(guild_id)["users"].get(int(member_id))
+        if member_data is None or member_data.invited_by is None or not member_data.departed:
+            return None
+        member_data.departed = False
+        inviter_data = self.get_user_data(guild_id, member_data.invited_by)
+        inviter_data.left = max(inviter_data.left - 1, 0)
+        self.save_data(guild_id, member_id)
+        self.save_data(guild_id, member_data.invited_by)
+        return member_data.invited_by
+
+    def recount(self, guild):
+        """Recalcule les compteurs d'un serveur depuis l'index, en une passe.
+
+        La présence de chaque membre indexé est vérifiée (départs et retours
+        manqués pendant que le bot était hors ligne), puis ``left`` est
+        recalculé pour chaque inviteur. ``invites`` n'est jamais baissé :
+        les invitations antérieures à l'index n'y figurent pas.
+        Retourne ``(membres indexés, présences corrigées, compteurs corrigés)``.
+        """
+        users = self.get_guild_data(guild.id)["users"]
+        invited = {}  # inviter_id -> membres indexés
+        left = {}     # inviter_id -> membres indexés partis
+        fixed = 0
+        for user_id, user_data in users.items():
+            if user_data.invited_by is None:
+                continue
+            departed = guild.get_member(user_id) is None
+            if user_data.departed != departed:
+                user_data.departed = departed
+                self.save_data(guild.id, user_id)
+                fixed += 1
+            invited[user_data.invited_by] = invited.get(user_data.invited_by, 0) + 1
+            if departed:
+                left[user_data.invited_by] = left.get(user_data.invited_by, 0) + 1
+
+        changed = 0
+        for user_id in list(users.keys() | invited.keys()):
+            user_data = self.get_user_data(guild.id, user_id)
+            invites = max(user_data.invites, invited.get(user_id, 0))
+            user_left = left.get(user_id, 0)
+            if (user_data.invites, user_data.left) != (invites, user_left):
+                user_data.invites = invites
+                user_data.left = user_left
+                self.save_data(guild.id, user_id)
+                changed += 1
+
+        # Le classement sera reconstruit à la prochaine lecture
+        self.rankings.pop(str(guild.id), None)
+        return sum(invited.values()), fixed, changed
 
     @commands.Cog.listener()
+    @timed("listener")
+    async def on_ready(self):
+        """Charge toutes les invitations une fois par session, en parallèle."""
+        if self.warmed_up:
+            return
+        self.warmed_up = True
+
+        log.info("📨 Chargement du cache des invitations...")
+        start = time.perf_counter()
+        loaded, errors = await self.tracker.warm_up(self.bot.guilds)
+        log.info(
+            "✅ Cache des invitations chargé pour %d serveur(s) en %.1fs (%d erreur(s))",
+            loaded, time.perf_counter() - start, errors
+        )
+        await self.tracker.save_snapshot()
+
+    @commands.Cog.listener()
+    @timed("listener")
     async def on_invite_create(self, invite):
-        """Met à jour le cache quand une invitation est créée."""
-        try:
-            invites = await invite.guild.invites()
-            self.invite_cache[invite.guild.id] = {inv.code: inv.uses for inv in invites}
-            print(f"📨 Nouvelle invitation créée dans {invite.guild.name}")
-        except Exception as e:
-            print(f"❌ Erreur lors de la mise à jour du cache : {e}")
+        """Ajoute l'invitation au cache à partir de l'événement (sans appel REST)."""
+        if self.tracker.on_create(invite):
+            log.debug("📨 Nouvelle invitation %s créée dans %s", invite.code, invite.guild.name)
 
     @commands.Cog.listener()
+    @timed("listener")
     async def on_invite_delete(self, invite):
-        """Met à jour le cache quand une invitation est supprimée."""
-        try:
-            invites = await invite.guild.invites()
-            self.invite_cache[invite.guild.id] = {inv.code: inv.uses for inv in invites}
-            print(f"📨 Invitation supprimée dans {invite.guild.name}")
-        except Exception as e:
-            print(f"❌ Erreur lors de la mise à jour du cache : {e}")
+        """Retire l'invitation du cache à partir de l'événement (sans appel REST)."""
+        if self.tracker.on_delete(invite):
+            log.debug("📨 Invitation %s supprimée dans %s", invite.code, invite.guild.name)
+
+    @tasks.loop(minutes=RECONCILE_MINUTES)
+    async def reconcile_invites(self):
+        """Recharge périodiquement les invitations pour corriger les dérives du cache."""
+        for guild in self.bot.guilds:
+            try:
+                drift = await self.tracker.reconcile(guild)
+                if drift:
+                    log.info("🔄 Cache des invitations corrigé pour %s (%d code(s))", guild.name, drift)
+            except Exception as e:
+                log.error("❌ Erreur lors de la réconciliation des invitations de %s: %s", guild.name, e)
+            # Étaler les appels : cette tâche n'est jamais urgente
+            await asyncio.sleep(1)
+        await self.tracker.save_snapshot()
+
+    @reconcile_invites.before_loop
+    async def before_reconcile_invites(self):
+        await self.bot.wait_until_ready()
+        # La première passe attend un intervalle complet : le cache vient d'être chargé
+        await asyncio.sleep(RECONCILE_MINUTES * 60)
 
     @commands.Cog.listener()
+    @timed("listener")
     async def on_member_join(self, member):
         """Détecte qui a invité le membre et donne l'XP."""
         guild = member.guild
 
-        print(f"\n👤 {member.name} a rejoint {guild.name}")
+        log.debug("👤 %s a rejoint %s", member.name, guild.name)
 
         try:
-            # Récupérer les invitations actuelles
-            invites_after = await guild.invites()
-            invites_before_dict = self.invite_cache.get(guild.id, {})
-
-            print(f"🔍 Cache avant : {invites_before_dict}")
-
-            # Trouver quelle invitation a été utilisée
-            inviter_user = None
-            used_invite = None
-
-            for invite in invites_after:
-                before_uses = invites_before_dict.get(invite.code, 0)
-                after_uses = invite.uses
-
-                print(f"🔍 Invite {invite.code}: {before_uses} -> {after_uses}")
-
-                if after_uses > before_uses:
-                    inviter_user = invite.inviter
-                    used_invite = invite
-                    print(f"✅ Inviteur trouvé : {inviter_user.name} (code: {invite.code})")
-                    break
+            # Attribution sérialisée par serveur : les arrivées reçues pendant
+            # un guild.invites() en cours partagent l'appel suivant
+            result = await self.tracker.attribute(guild, member.id)
+            await self.store.prefetch(guild.id)
+
+            previous = self.get_guild_data(guild.id)["users"].get(member.id)
+            ranking = self.rankings.get(str(guild.id))
+            if ranking is not None and previous is not None and previous.invites:
+                # Un inviteur qui revient retrouve sa place dans le classement
+                ranking.update(member.id, previous.invites)
+            if previous is not None and previous.invited_by is not None:
+                # Un membre déjà indexé reste compté pour son premier inviteur :
+                # quitter et revenir ne rapporte pas de nouvelle invitation
+                if self.member_returned(guild.id, member.id) is not None:
+                    log.info("↩️ %s est revenu sur %s, départ retiré à l'inviteur %s", member.name, guild.name, previous.invited_by)
+                return
 
-            # Mettre à jour le cache IMMÉDIATEMENT
-            self.invite_cache[guild.id] = {inv.code: inv.uses for inv in invites_after}
-            print(f"🔄 Cache mis à jour")
+            if not result.known:
+                log.info("❓ Inviteur inconnu pour %s sur %s : %s", member.name, guild.name, result.reason)
+                return
 
-            if not inviter_user or inviter_user.bot:
-                print("❌ Aucun inviteur trouvé ou inviteur est un bot")
+            inviter_user = guild.get_member(result.inviter_id) or self.bot.get_user(result.inviter_id)
+            if inviter_user is None or inviter_user.bot:
+                log.info("❌ Inviteur %s introuvable ou bot", result.inviter_id)
                 return
 
             # Récupérer le Member (pas User) depuis le serveur
             inviter = guild.get_member(inviter_user.id)
             if not inviter:
-                print(f"❌ Impossible de trouver {inviter_user.name} comme membre du serveur")
+                log.info("❌ Impossible de trouver %s comme membre de %s", inviter_user.name, guild.name)
                 return
 
-            print(f"✅ Inviteur (Member) : {inviter.name}")
-
             # Mettre à jour les statistiques de l'inviteur
             guild_data = self.get_guild_data(guild.id)
             user_data = self.get_user_data(guild.id, inviter.id)
-            user_data["invites"] += 1
-            self.save_data()
+            user_data.invites += 1
+            self.get_ranking(guild.id).update(inviter.id, user_data.invites)
+            self.save_data(guild.id, inviter.id)
+            self.record_join(guild.id, member.id, inviter.id, result.code)
 
-            print(f"📊 {inviter.name} a maintenant {user_data['invites']} invitations")
+            log.info(
+                "✅ %s a invité %s sur %s (code: %s), %d invitation(s)",
+                inviter.name, member.name, guild.name, result.code or "plusieurs", user_data.invites
+            )
 
             # Donner de l'XP à l'inviteur
             xp_per_invite = guild_data["settings"]["xp_per_invite"]
@@ -131,73 +423,16 @@ class Invites(commands.Cog):
             # Charger le cog XP pour ajouter l'XP
             xp_cog = self.bot.get_cog("XP")
             if xp_cog:
-                xp_user_data = xp_cog.get_user_data(guild.id, inviter.id)
-                old_xp = xp_user_data["xp"]
-                xp_user_data["xp"] += xp_per_invite
-                xp_cog.save_data()
-                print(f"✅ {xp_per_invite} XP ajoutés à {inviter.name} ({old_xp} -> {xp_user_data['xp']})")
-
-            # Vérifier les rôles automatiques
-            roles_settings = guild_data["settings"]["roles"]
-            total_invites = user_data["invites"]
-
-            print(f"\n🔍 === VÉRIFICATION DES RÔLES AUTOMATIQUES ===")
-            print(f"🔍 {inviter.name} a {total_invites} invitations")
-            print(f"🔍 Rôles configurés : {roles_settings}")
-
-            for role_id, required_invites in roles_settings.items():
-                print(f"\n🔍 Test : Rôle ID {role_id} nécessite {required_invites} invites")
-                print(f"🔍 Condition : {total_invites} >= {required_invites} ? {total_invites >= required_invites}")
-
-                if total_invites >= required_invites:
-                    role = guild.get_role(int(role_id))
-
-                    if not role:
-                        print(f"❌ Rôle {role_id} introuvable sur le serveur")
-                        continue
-
-                    print(f"✅ Rôle trouvé : {role.name}")
-                    print(f"🔍 Rôles actuels de {inviter.name} : {[r.name for r in inviter.roles]}")
-                    print(f"🔍 {inviter.name} a déjà ce rôle ? {role in inviter.roles}")
-
-                    if role not in inviter.roles:
-                        try:
-                            # Vérifier la hiérarchie
-                            bot_top_role = guild.me.top_role
-                            print(f"🔍 Position du bot : {bot_top_role.name} ({bot_top_role.position})")
-                            print(f"🔍 Position du rôle à donner : {role.name} ({role.position})")
-
-                            if bot_top_role.position <= role.position:
-                                print(f"❌ Le bot ne peut pas donner le rôle {role.name} (hiérarchie insuffisante)")
-                                try:
-                                    await inviter.send(
-                                        f"⚠️ Tu devrais avoir le rôle **{role.name}** mais le bot n'a pas les permissions nécessaires. Contacte un administrateur !"
-                                    )
-                                except:
-                                    pass
-                                continue
-
-                            await inviter.add_roles(role)
-                            print(f"✅✅✅ Rôle {role.name} DONNÉ à {inviter.name} !")
-
-                            # Notifier l'inviteur
-                            try:
-                                await inviter.send(
-                                    f"🎉 Félicitations ! Tu as atteint **{total_invites} invitations** et tu as reçu le rôle **{role.name}** sur **{guild.name}** !"
-                                )
-                                print(f"✅ DM de félicitations envoyé")
-                            except:
-                                print(f"❌ Impossible d'envoyer un DM à {inviter.name}")
-                        except discord.Forbidden:
-                            print(f"❌ Pas la permission de donner le rôle {role.name}")
-                        except Exception as e:
-                            print(f"❌ Erreur lors de l'ajout du rôle : {e}")
-                            import traceback
-                            traceback.print_exc()
-                    else:
-                        print(f"ℹ️ {inviter.name} a déjà le rôle {role.name}")
-
-            print(f"=== FIN VÉRIFICATION RÔLES ===\n")
+                # Données XP évincées du cache : les recharger hors de la boucle
+                await xp_cog.store.prefetch(guild.id)
+                xp_user_data = xp_cog.add_xp(guild.id, inviter.id, xp_per_invite)
+                log.debug("✅ %d XP ajoutés à %s (total %d)", xp_per_invite, inviter.name, xp_user_data.xp)
+
+            # Rôles automatiques : seuls les seuils franchis par cette invitation sont évalués
+            total_invites = user_data.invites
+            crossed = self.get_thresholds(guild.id).crossed(total_invites - 1, total_invites)
+            if crossed:
+                await self.reward_inviter(guild, inviter, crossed, total_invites)
 
             # Message de bienvenue avec mention de l'inviteur
             try:
@@ -205,14 +440,26 @@ class Invites(commands.Cog):
                 await channel.send(
                     f"👋 Bienvenue {member.mention} ! Invité par {inviter.mention} (+{xp_per_invite} XP) 🎉"
                 )
-                print(f"✅ Message de bienvenue envoyé dans {channel.name}")
+                log.debug("✅ Message de bienvenue envoyé dans %s", channel.name)
             except Exception as e:
-                print(f"❌ Erreur lors de l'envoi du message de bienvenue : {e}")
+                log.warning("❌ Erreur lors de l'envoi du message de bienvenue sur %s : %s", guild.name, e)
 
         except Exception as e:
-            print(f"❌ ERREUR GLOBALE dans on_member_join : {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("❌ Erreur dans on_member_join : %s", e)
+
+    @commands.Cog.listener()
+    @timed("listener")
+    async def on_member_remove(self, member):
+        """Compte le départ chez l'inviteur du membre."""
+        if member.bot:
+            return
+        await self.store.prefetch(member.guild.id)
+        ranking = self.rankings.get(str(member.guild.id))
+        if ranking is not None:
+            ranking.remove(member.id)
+        inviter_id = self.member_left(member.guild.id, member.id)
+        if inviter_id is not None:
+            log.info("👋 %s a quitté %s, départ compté pour l'inviteur %s", member.name, member.guild.name, inviter_id)
 
     @app_commands.command(name="invites", description="Affiche tes invitations ou celles de quelqu'un")
     @app_commands.describe(membre="Le membre dont tu veux voir les invitations (optionnel)")
@@ -221,9 +468,9 @@ class Invites(commands.Cog):
         target = membre or interaction.user
         user_data = self.get_user_data(interaction.guild.id, target.id)
 
-        invites = user_data["invites"]
-        left = user_data.get("left", 0)
-        real_invites = invites - left
+        invites = user_data.invites
+        left = user_data.left
+        real_invites = max(invites - left, 0)
 
         embed = discord.Embed(
             title=f"📨 Invitations de {target.display_name}",
@@ -237,35 +484,41 @@ class Invites(commands.Cog):
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="invites_top", description="Affiche le classement des meilleurs inviteurs")
-    async def invites_leaderboard(self, interaction: discord.Interaction):
+    @app_commands.describe(page="La page du classement à afficher (10 membres par page)")
+    async def invites_leaderboard(self, interaction: discord.Interaction, page: int = 1):
         """Affiche le classement des invitations."""
         guild_data = self.get_guild_data(interaction.guild.id)
-        users = guild_data["users"]
+        ranking = self.get_ranking(interaction.guild.id)
 
-        sorted_users = sorted(users.items(), key=lambda x: x[1]["invites"], reverse=True)
-
-        if not sorted_users:
+        if not len(ranking):
             await interaction.response.send_message("❌ Aucune invitation enregistrée pour le moment !")
             return
 
+        # Le classement ne contient que les membres présents : la page se lit par position
+        page = max(page, 1)
+        present = len(ranking)
+        pages = (present + 9) // 10
+        if page > pages:
+            await interaction.response.send_message(f"❌ Le classement n'a que **{pages}** page(s) !", ephemeral=True)
+            return
+
         embed = discord.Embed(
             title="🏆 Top Inviteurs",
             description="Les membres qui ont invité le plus de personnes",
             color=discord.Color.gold()
         )
-
-        for i, (user_id, data) in enumerate(sorted_users[:10], start=1):
-            member = interaction.guild.get_member(int(user_id))
-            if member:
-                medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"**{i}.**"
-                invites = data["invites"]
-                left = data.get("left", 0)
-                real = invites - left
-                embed.add_field(
-                    name=f"{medal} {member.display_name}",
-                    value=f"{invites} invitations ({real} réelles)",
-                    inline=False
-                )
+        embed.set_footer(text=f"Page {page}/{pages} • {present} inviteur(s)")
+
+        for rank, (user_id, invites) in enumerate(ranking.range((page - 1) * 10, 10), start=(page - 1) * 10 + 1):
+            member = interaction.guild.get_member(user_id)
+            medal = "🥇" if rank == 1 else "🥈" if rank == 2 else "🥉" if rank == 3 else f"**{rank}.**"
+            left = guild_data["users"][user_id].left
+            real = max(invites - left, 0)
+            embed.add_field(
+                name=f"{medal} {member.display_name if member else f'<@{user_id}>'}",
+                value=f"{invites} invitations ({real} réelles)",
+                inline=False
+            )
 
         await interaction.response.send_message(embed=embed)
 
@@ -280,7 +533,7 @@ class Invites(commands.Cog):
 
         guild_data = self.get_guild_data(interaction.guild.id)
         guild_data["settings"]["xp_per_invite"] = xp
-        self.save_data()
+        self.save_data(interaction.guild.id)
 
         await interaction.response.send_message(f"✅ XP par invitation défini à **{xp} XP**")
 
@@ -300,10 +553,12 @@ class Invites(commands.Cog):
         role_id = str(role.id)
 
         guild_data["settings"]["roles"][role_id] = invitations
-        self.save_data()
+        self.thresholds.pop(str(interaction.guild.id), None)
+        self.save_data(interaction.guild.id)
 
         await interaction.response.send_message(
-            f"✅ Rôle automatique ajouté : {role.mention} après **{invitations} invitations**"
+            f"✅ Rôle automatique ajouté : {role.mention} après **{invitations} invitations**\n"
+            f"ℹ️ Utilise `/inviterole_sync` pour l'appliquer aux membres existants"
         )
 
     @app_commands.command(name="inviterole_remove", description="🔒 ADMIN : Supprime un rôle automatique")
@@ -316,7 +571,8 @@ class Invites(commands.Cog):
 
         if role_id in guild_data["settings"]["roles"]:
             del guild_data["settings"]["roles"][role_id]
-            self.save_data()
+            self.thresholds.pop(str(interaction.guild.id), None)
+            self.save_data(interaction.guild.id)
             await interaction.response.send_message(f"✅ Rôle automatique supprimé : {role.mention}")
         else:
             await interaction.response.send_message(f"❌ Ce rôle n'est pas configuré comme récompense automatique", ephemeral=True)
@@ -351,17 +607,86 @@ class Invites(commands.Cog):
 
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(name="inviterole_sync", description="🔒 ADMIN : Applique les rôles automatiques à tous les membres")
+    @app_commands.describe(retirer="Retirer aussi les rôles automatiques qui ne sont plus mérités")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def invite_role_sync(self, interaction: discord.Interaction, retirer: bool = False):
+        """Lance (ou suit) la resynchronisation des rôles en arrière-plan."""
+        guild = interaction.guild
+        running = self.role_syncs.get(guild.id)
+        if running is not None and not running[0].done():
+            progress = running[1]
+            await interaction.response.send_message(
+                f"⏳ Resynchronisation en cours : {progress['checked']}/{progress['total']} membre(s) vérifié(s), "
+                f"{progress['updated']} mis à jour",
+                ephemeral=True
+            )
+            return
+
+        progress = {"total": 0, "checked": 0, "updated": 0, "errors": 0}
+        task = asyncio.create_task(self.sync_roles(guild, retirer, progress))
+        self.role_syncs[guild.id] = (task, progress)
+        task.add_done_callback(lambda task: self._role_sync_done(guild.id, task))
+        await interaction.response.send_message(
+            "🔄 Resynchronisation des rôles lancée en arrière-plan. Relance la commande pour suivre la progression.",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="invites_cache_stats", description="🔒 ADMIN : Statistiques du cache des invitations")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def invites_cache_stats(self, interaction: discord.Interaction):
+        """Affiche les compteurs d'attribution et d'appels évités."""
+        stats = self.tracker.stats()
+        cached = len(self.tracker.cache.get(interaction.guild.id, {}))
+
+        embed = discord.Embed(
+            title="📨 Cache des invitations",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="🗂️ Invitations en cache (ce serveur)", value=str(cached), inline=False)
+        embed.add_field(name="👤 Arrivées traitées", value=str(stats["joins"]), inline=True)
+        embed.add_field(name="✅ Attribuées", value=str(stats["attributed"]), inline=True)
+        embed.add_field(name="❓ Inconnues", value=str(stats["unknown"]), inline=True)
+        embed.add_field(name="🌐 Appels guild.invites()", value=str(stats["fetches"] + stats["reconcile_fetches"]), inline=True)
+        embed.add_field(name="⚡ Appels évités", value=str(stats["fetches_avoided"] + stats["joins"] - stats["fetches"]), inline=True)
+        embed.add_field(name="🔄 Codes corrigés", value=str(stats["drift_fixed"]), inline=True)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="invites_recount", description="🔒 ADMIN : Recalcule les départs et invitations depuis l'index")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def invites_recount(self, interaction: discord.Interaction):
+        """Recalcule tous les compteurs du serveur en une passe sur l'index."""
+        indexed, fixed, changed = self.recount(interaction.guild)
+        await interaction.response.send_message(
+            f"✅ Recalcul terminé : **{indexed}** membre(s) indexé(s), "
+            f"**{fixed}** présence(s) corrigée(s), **{changed}** compteur(s) mis à jour",
+            ephemeral=True
+        )
+
     @app_commands.command(name="invites_reset", description="🔒 ADMIN : Reset les invitations d'un membre")
     @app_commands.describe(membre="Le membre dont tu veux reset les invitations")
     @app_commands.checks.has_permissions(administrator=True)
     async def invites_reset(self, interaction: discord.Interaction, membre: discord.Member):
         """Reset les invitations d'un membre."""
         guild_data = self.get_guild_data(interaction.guild.id)
-        user_id = str(membre.id)
+        user_id = membre.id
 
         if user_id in guild_data["users"]:
-            guild_data["users"][user_id] = {"invites": 0, "left": 0}
-            self.save_data()
+            # L'index d'arrivée du membre lui-même (qui l'a invité) est conservé
+            user_data = guild_data["users"][user_id]
+            user_data.invites = 0
+            user_data.left = 0
+            self.get_ranking(interaction.guild.id).remove(user_id)
+            self.save_data(interaction.guild.id, membre.id)
+            # Les membres qu'il a invités sortent de l'index : leurs départs et
+            # retours ne doivent plus toucher les compteurs remis à zéro
+            for invited_id, invited_data in guild_data["users"].items():
+                if invited_data.invited_by == user_id:
+                    invited_data.invited_by = None
+                    invited_data.invite_code = None
+                    invited_data.departed = False
+                    self.save_data(interaction.guild.id, invited_id)
             await interaction.response.send_message(f"✅ Invitations de {membre.mention} remises à zéro")
         else:
             await interaction.response.send_message(f"❌ {membre.mention} n'a aucune invitation enregistrée", ephemeral=True)
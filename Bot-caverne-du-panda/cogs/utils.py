@@ -1,10 +1,39 @@
 import json
+import logging
 import os
+import tempfile
+import time
+from itertools import islice
+import discord
 from discord.ext import commands
+from discord import app_commands
+from core.cluster import CLUSTER_ID
+from core.metrics import METRICS_PORT, command_completed, metrics, start_http_server
+
+log = logging.getLogger(__name__)
 
 class Utils(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.metrics_runner = None  # serveur HTTP des métriques (si METRICS_PORT est défini)
+
+    async def cog_load(self):
+        if METRICS_PORT:
+            # Un port par processus en mode cluster : METRICS_PORT, METRICS_PORT + 1...
+            port = METRICS_PORT + CLUSTER_ID
+            try:
+                self.metrics_runner = await start_http_server(port=port)
+            except OSError as e:
+                log.error("❌ Impossible d'exposer les métriques sur le port %d : %s", port, e)
+
+    async def cog_unload(self):
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction, command):
+        """Enregistre la durée d'une commande slash terminée sans erreur."""
+        command_completed(interaction, command)
 
     @staticmethod
     def load_json(filepath):
@@ -15,21 +44,146 @@ class Utils(commands.Cog):
             with open(filepath, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            print(f"❌ Erreur lors de la lecture de {filepath}: {e}")
+            log.error("❌ Erreur lors de la lecture de %s: %s", filepath, e)
             return {}
 
     @staticmethod
     def save_json(filepath, data):
-        """Sauvegarde des données dans un fichier JSON."""
+        """Sauvegarde des données dans un fichier JSON (écriture atomique)."""
+        try:
+            text = json.dumps(data, indent=4, ensure_ascii=False)
+        except Exception as e:
+            log.error("❌ Erreur lors de l'encodage de %s: %s", filepath, e)
+            return False
+        return Utils.save_text(filepath, text)
+
+    @staticmethod
+    def save_text(filepath, text):
+        """Écrit un fichier texte de façon atomique.
+
+        Le contenu part dans un fichier temporaire du même dossier, puis
+        remplace l'ancien fichier d'un seul coup. Un crash en pleine écriture
+        ne laisse donc jamais un fichier tronqué.
+        """
+        tmp_path = None
         try:
             # Créer le dossier si nécessaire
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            directory = os.path.dirname(filepath) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, filepath)
             return True
         except Exception as e:
-            print(f"❌ Erreur lors de l'écriture dans {filepath}: {e}")
+            log.error("❌ Erreur lors de l'écriture dans %s: %s", filepath, e)
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
 
+    @app_commands.command(name="storage_stats", description="🔒 ADMIN : Statistiques d'écriture des données sur disque")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def storage_stats(self, interaction: discord.Interaction):
+        """Affiche les compteurs d'écriture différée de chaque cog."""
+        embed = discord.Embed(
+            title="💾 Écritures sur disque",
+            color=discord.Color.blue()
+        )
+
+        for name, cog in self.bot.cogs.items():
+            store = getattr(cog, "store", None)
+            if store is None:
+                continue
+            stats = store.stats()
+            embed.add_field(
+                name=f"{name} ({stats['namespace']} • {stats['backend']})",
+                value=(
+                    f"**Écritures:** {stats['flush_count']} ({stats['flush_errors']} erreur(s))\n"
+                    f"**En attente:** {stats['pending']}\n"
+                    f"**Durée moyenne:** {stats['avg_flush_duration'] * 1000:.1f} ms\n"
+                    f"**Dernière:** {stats['last_flush_duration'] * 1000:.1f} ms\n"
+                    f"**Serveurs en mémoire:** {stats['resident_guilds']}/{stats['known_guilds']} "
+                    f"({stats['resident_users']} fiches)\n"
+                    f"**Cache:** {stats['cache_hits']} succès • {stats['cache_misses']} chargements • "
+                    f"{stats['cache_evictions']} évictions ({stats['cache_hit_ratio']:.1%})"
+                ),
+                inline=False
+            )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="botstats", description="🔒 ADMIN : Latence et volume des handlers du bot")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def botstats(self, interaction: discord.Interaction):
+        """Affiche les appels, erreurs et latences des événements, commandes et écritures."""
+        uptime = int(time.time() - metrics.started)
+        embed = discord.Embed(
+            title="📈 Statistiques du bot",
+            description=f"Depuis {uptime // 3600} h {uptime % 3600 // 60} min",
+            color=discord.Color.blue()
+        )
+
+        for kind, title in (("listener", "🎧 Événements"), ("command", "⌨️ Commandes"), ("flush", "💾 Écritures")):
+            lines = []
+            for name, histogram in metrics.by_kind(kind)[:10]:
+                lines.append(
+                    f"`{name}` : {histogram.count} ({histogram.errors} err.) • "
+                    f"moy {histogram.average * 1000:.1f} ms • p95 {histogram.quantile(0.95) * 1000:.0f} ms • "
+                    f"max {histogram.max * 1000:.0f} ms"
+                )
+            if lines:
+                embed.add_field(name=title, value="\n".join(lines)[:1024], inline=False)
+
+        if not embed.fields:
+            embed.description += "\nAucune mesure pour le moment."
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="memory_report", description="🔒 ADMIN : Mémoire utilisée par utilisateur (fiches compactes vs dicts)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def memory_report(self, interaction: discord.Interaction):
+        """Compare la mémoire des fiches compactes à l'ancien format en dicts."""
+        from core.records import entries_sizeof
+
+        embed = discord.Embed(
+            title="🧠 Mémoire par utilisateur",
+            description="Mesuré sur un échantillon de 10 000 utilisateurs maximum par cog",
+            color=discord.Color.blue()
+        )
+
+        for name, cog in self.bot.cogs.items():
+            store = getattr(cog, "store", None)
+            if store is None or store.record_type is None:
+                continue
+
+            # Seuls les serveurs en mémoire : les évincés ne coûtent rien
+            resident = list(store.data.resident())
+            total = sum(len(guild_data["users"]) for _, guild_data in resident)
+            # Un même membre peut être présent sur plusieurs serveurs
+            sample = {}
+            for guild_id, guild_data in resident:
+                for user_id, record in islice(guild_data["users"].items(), 10_000 - len(sample)):
+                    sample[(guild_id, user_id)] = record
+                if len(sample) >= 10_000:
+                    break
+            if not sample:
+                continue
+
+            # "Avant" : le même échantillon au format historique (un dict par utilisateur)
+            compact = entries_sizeof([(user_id, record) for (_, user_id), record in sample.items()]) / len(sample)
+            legacy = entries_sizeof([(user_id, record.to_dict()) for (_, user_id), record in sample.items()]) / len(sample)
+            embed.add_field(
+                name=f"{name} ({total} utilisateur(s))",
+                value=(
+                    f"**Avant (dicts):** {legacy:.0f} octets/utilisateur\n"
+                    f"**Après (fiches):** {compact:.0f} octets/utilisateur\n"
+                    f"**Gain estimé:** {(legacy - compact) * total / 1024 / 1024:.2f} Mo"
+                ),
+                inline=False
+            )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(Utils(bot))
\ No newline at end of file
@@ -1,53 +1,133 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from cogs.utils import Utils
+from core.storage import WriteBehindStore
+from core.ranking import RankIndex, is_present
+from core.records import XPUser
+from core.cooldown import CooldownGate
+from core.levels import get_curve, recompute_levels
+from core.announcer import LevelUpAnnouncer
+from core.metrics import timed
+import logging
 import time
-import math
 from typing import Literal
 
+log = logging.getLogger(__name__)
+
 class XP(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.xp_file = "./data/xp.json"
-        self.xp_data = Utils.load_json(self.xp_file)
-
-    def save_data(self):
-        """Sauvegarde les données XP."""
-        Utils.save_json(self.xp_file, self.xp_data)
+        self.store = WriteBehindStore("xp", XPUser)
+        self.xp_data = self.store.data
+        self.rankings = {}  # guild_id -> RankIndex, construit à la demande
+        self.cooldown_gate = CooldownGate()
+        self.announcer = LevelUpAnnouncer()
+        self.store.on_load.append(self.guild_loaded)
+        self.store.on_evict.append(self.guild_evicted)
+
+    async def cog_load(self):
+        await self.store.load()
+        self.store.start()
+
+    async def interaction_check(self, interaction):
+        # Les commandes lisent les données du serveur : on les charge hors de la boucle
+        if interaction.guild is not None:
+            await self.store.prefetch(interaction.guild.id)
+        return True
+
+    def guild_loaded(self, guild_id):
+        """Corrige les niveaux qui ne correspondent plus à l'XP stockée."""
+        changed = self.recompute_guild_levels(guild_id)
+        if changed:
+            log.info("🔧 %d niveau(x) corrigé(s) sur le serveur %s", changed, guild_id)
+
+    def guild_evicted(self, guild_id):
+        """Oublie le classement d'un serveur évincé de la mémoire."""
+        self.rankings.pop(guild_id, None)
+
+    async def cog_unload(self):
+        self.announcer.close()
+        await self.store.close()
+
+    def save_data(self, guild_id, user_id=None):
+        """Marque les données XP comme modifiées (écriture différée)."""
+        self.store.mark_dirty(guild_id, user_id)
 
     def get_guild_data(self, guild_id):
         """Récupère ou initialise les données d'un serveur."""
         guild_id = str(guild_id)
-        if guild_id not in self.xp_data:
-            self.xp_data[guild_id] = {
+        guild_data = self.xp_data.get(guild_id)  # recharge un serveur évincé
+        if guild_data is None:
+            guild_data = self.xp_data[guild_id] = {
                 "users": {},
                 "boosts": {},
                 "cooldown": 60
             }
-        return self.xp_data[guild_id]
+        return guild_data
 
     def get_user_data(self, guild_id, user_id):
         """Récupère ou initialise les données d'un utilisateur."""
         guild_data = self.get_guild_data(guild_id)
-        user_id = str(user_id)
+        user_id = int(user_id)
         if user_id not in guild_data["users"]:
-            guild_data["users"][user_id] = {
-                "xp": 0,
-                "level": 1,
-                "last_message": 0
-            }
+            guild_data["users"][user_id] = XPUser()
         return guild_data["users"][user_id]
 
-    def calculate_level(self, xp):
-        """Calcule le niveau en fonction de l'XP."""
-        return int(math.sqrt(xp / 100)) + 1
+    def get_ranking(self, guild_id):
+        """Récupère (ou construit) le classement XP d'un serveur."""
+        guild_id = str(guild_id)
+        ranking = self.rankings.get(guild_id)
+        if ranking is None:
+            users = self.get_guild_data(guild_id)["users"]
+            guild = self.bot.get_guild(int(guild_id))
+            # Seuls les membres encore présents sont classés
+            ranking = RankIndex({user_id: data.xp for user_id, data in users.items() if is_present(guild, user_id)})
+            if guild is None or guild.chunked:
+                # Sinon, membres pas encore reçus : classement reconstruit au prochain appel
+                self.rankings[guild_id] = ranking
+        return ranking
+
+    def get_curve(self, guild_id):
+        """Courbe de niveaux (table de seuils précalculée) d'un serveur."""
+        return get_curve(self.get_guild_data(guild_id).get("curve"))
+
+    def add_xp(self, guild_id, user_id, amount):
+        """Ajoute de l'XP à un utilisateur, met à jour son niveau et le classement."""
+        user_data = self.get_user_data(guild_id, user_id)
+        user_data.xp += amount
+        user_data.level = self.get_curve(guild_id).level(user_data.xp)
+        self.get_ranking(guild_id).update(int(user_id), user_data.xp)
+        self.save_data(guild_id, user_id)
+        return user_data
+
+    def recompute_guild_levels(self, guild_id):
+        """Recalcule d'un bloc le niveau de tous les membres d'un serveur."""
+        users = self.get_guild_data(guild_id)["users"]
+        changed = recompute_levels(users, self.get_curve(guild_id))
+        for user_id in changed:
+            self.save_data(guild_id, user_id)
+        return len(changed)
 
-    def xp_for_next_level(self, level):
-        """Calcule l'XP nécessaire pour atteindre le prochain niveau."""
-        return (level ** 2) * 100
+    @commands.Cog.listener()
+    @timed("listener")
+    async def on_member_join(self, member):
+        """Remet dans le classement un membre qui revient sur le serveur."""
+        ranking = self.rankings.get(str(member.guild.id))
+        if ranking is not None:
+            user_data = self.get_guild_data(member.guild.id)["users"].get(member.id)
+            if user_data is not None:
+                ranking.update(member.id, user_data.xp)
 
     @commands.Cog.listener()
+    @timed("listener")
+    async def on_member_remove(self, member):
+        """Retire du classement un membre qui quitte le serveur."""
+        ranking = self.rankings.get(str(member.guild.id))
+        if ranking is not None:
+            ranking.remove(member.id)
+
+    @commands.Cog.listener()
+    @timed("listener")
     async def on_message(self, message):
         """Ajoute de l'XP quand un utilisateur envoie un message."""
         if message.author.bot or not message.guild:
@@ -55,16 +135,30 @@ class XP(commands.Cog):
 
         guild_id = message.guild.id
         user_id = message.author.id
-        channel_id = str(message.channel.id)
 
+        # Filtre rapide : la plupart des messages sont en cooldown, on les
+        # rejette sans toucher (ni créer) de fiche XP
+        if not self.cooldown_gate.allow(guild_id, user_id):
+            return
+
+        await self.store.prefetch(guild_id)
+        channel_id = str(message.channel.id)
         guild_data = self.get_guild_data(guild_id)
-        user_data = self.get_user_data(guild_id, user_id)
 
-        # Vérifier le cooldown
+        # Vérifier le cooldown enregistré (utile juste après un redémarrage,
+        # quand le filtre est encore vide)
+        now = time.monotonic()
         current_time = time.time()
         cooldown = guild_data.get("cooldown", 60)
-        if current_time - user_data["last_message"] < cooldown:
-            return
+        user_data = guild_data["users"].get(user_id)
+        if user_data is not None:
+            remaining = cooldown - (current_time - user_data.last_message)
+            if remaining > 0:
+                self.cooldown_gate.block_until(guild_id, user_id, now + remaining)
+                return
+
+        self.cooldown_gate.consume(guild_id, user_id, cooldown, now)
+        user_data = self.get_user_data(guild_id, user_id)
 
         # Calculer l'XP à ajouter
         base_xp = 5
@@ -72,20 +166,13 @@ class XP(commands.Cog):
         xp_gained = int(base_xp * multiplier)
 
         # Ajouter l'XP
-        user_data["xp"] += xp_gained
-        user_data["last_message"] = current_time
+        old_level = user_data.level
+        user_data.last_message = current_time
+        self.add_xp(guild_id, user_id, xp_gained)
 
-        # Vérifier si l'utilisateur monte de niveau
-        old_level = user_data["level"]
-        new_level = self.calculate_level(user_data["xp"])
-
-        if new_level > old_level:
-            user_data["level"] = new_level
-            await message.channel.send(
-                f"🎉 **{message.author.mention}** vient de passer au niveau **{new_level}** ! Bravo ! 🎊"
-            )
-
-        self.save_data()
+        # Vérifier si l'utilisateur monte de niveau (annonce groupée par salon)
+        if user_data.level > old_level:
+            self.announcer.add(message.channel, message.author, user_data.level, guild_data.get("announce"))
 
     @app_commands.command(name="xp", description="Affiche ton XP et ton niveau")
     async def xp_show(self, interaction: discord.Interaction, membre: discord.Member = None):
@@ -93,12 +180,8 @@ class XP(commands.Cog):
         target = membre or interaction.user
         user_data = self.get_user_data(interaction.guild.id, target.id)
 
-        xp = user_data["xp"]
-        level = user_data["level"]
-        xp_needed = self.xp_for_next_level(level)
-        xp_current_level = self.xp_for_next_level(level - 1)
-        xp_progress = xp - xp_current_level
-        xp_required = xp_needed - xp_current_level
+        xp = user_data.xp
+        level, xp_progress, xp_required = self.get_curve(interaction.guild.id).progress(xp)
 
         # Créer un embed propre
         embed = discord.Embed(
@@ -123,38 +206,66 @@ class XP(commands.Cog):
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="leaderboard", description="Affiche le classement XP du serveur")
-    async def leaderboard(self, interaction: discord.Interaction):
+    @app_commands.describe(page="La page du classement à afficher (10 membres par page)")
+    async def leaderboard(self, interaction: discord.Interaction, page: int = 1):
         """Affiche le classement des utilisateurs par XP."""
         guild_data = self.get_guild_data(interaction.guild.id)
-        users = guild_data["users"]
-
-        # Trier les utilisateurs par XP
-        sorted_users = sorted(users.items(), key=lambda x: x[1]["xp"], reverse=True)
+        ranking = self.get_ranking(interaction.guild.id)
 
-        if not sorted_users:
+        if not len(ranking):
             await interaction.response.send_message("❌ Aucun utilisateur n'a encore d'XP !")
             return
 
+        # Le classement ne contient que les membres présents : la page se lit par position
+        page = max(page, 1)
+        present = len(ranking)
+        pages = (present + 9) // 10
+        if page > pages:
+            await interaction.response.send_message(f"❌ Le classement n'a que **{pages}** page(s) !", ephemeral=True)
+            return
+
         # Créer l'embed
         embed = discord.Embed(
             title="🏆 Classement XP",
             description="Les membres les plus actifs du serveur",
             color=discord.Color.gold()
         )
-
-        # Afficher le top 10
-        for i, (user_id, data) in enumerate(sorted_users[:10], start=1):
-            member = interaction.guild.get_member(int(user_id))
-            if member:
-                medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"**{i}.**"
-                embed.add_field(
-                    name=f"{medal} {member.display_name}",
-                    value=f"Niveau {data['level']} • {data['xp']} XP",
-                    inline=False
-                )
+        embed.set_footer(text=f"Page {page}/{pages} • {present} membre(s) classé(s)")
+
+        for rank, (user_id, xp) in enumerate(ranking.range((page - 1) * 10, 10), start=(page - 1) * 10 + 1):
+            member = interaction.guild.get_member(user_id)
+            data = guild_data["users"][user_id]
+            medal = "🥇" if rank == 1 else "🥈" if rank == 2 else "🥉" if rank == 3 else f"**{rank}.**"
+            embed.add_field(
+                name=f"{medal} {member.display_name if member else f'<@{user_id}>'}",
+                value=f"Niveau {data.level} • {xp} XP",
+                inline=False
+            )
 
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(name="rank", description="Affiche ta position dans le classement XP")
+    @app_commands.describe(membre="Le membre dont tu veux voir le rang (optionnel)")
+    async def rank(self, interaction: discord.Interaction, membre: discord.Member = None):
+        """Affiche le rang XP d'un utilisateur."""
+        target = membre or interaction.user
+        ranking = self.get_ranking(interaction.guild.id)
+        position = ranking.rank(target.id)
+
+        if position is None:
+            await interaction.response.send_message(
+                f"❌ {target.display_name} n'est pas encore classé !", ephemeral=True
+            )
+            return
+
+        # Séparateur de milliers à la française : 50 000
+        position_text = f"{position:,}".replace(",", " ")
+        total_text = f"{len(ranking):,}".replace(",", " ")
+        await interaction.response.send_message(
+            f"🏅 **{target.display_name}** est **#{position_text}** sur **{total_text}** "
+            f"avec **{ranking.score(target.id)} XP**"
+        )
+
     @app_commands.command(name="boostxp_add", description="🔒 ADMIN : Ajoute un boost XP sur un salon")
     @app_commands.describe(
         salon="Le salon à booster",
@@ -171,7 +282,7 @@ class XP(commands.Cog):
         channel_id = str(salon.id)
 
         guild_data["boosts"][channel_id] = multiplicateur
-        self.save_data()
+        self.save_data(interaction.guild.id)
 
         await interaction.response.send_message(
             f"✅ Boost XP ajouté : {salon.mention} → **x{multiplicateur}** XP"
@@ -187,7 +298,7 @@ class XP(commands.Cog):
 
         if channel_id in guild_data["boosts"]:
             del guild_data["boosts"][channel_id]
-            self.save_data()
+            self.save_data(interaction.guild.id)
             await interaction.response.send_message(f"✅ Boost XP supprimé pour {salon.mention}")
         else:
             await interaction.response.send_message(f"❌ Aucun boost XP trouvé pour {salon.mention}", ephemeral=True)
@@ -230,9 +341,77 @@ class XP(commands.Cog):
 
         guild_data = self.get_guild_data(interaction.guild.id)
         guild_data["cooldown"] = secondes
-        self.save_data()
+        self.cooldown_gate.reset_guild(interaction.guild.id)
+        self.save_data(interaction.guild.id)
 
         await interaction.response.send_message(f"✅ Cooldown XP défini à **{secondes} secondes**")
 
+    @app_commands.command(name="levelcurve", description="🔒 ADMIN : Choisit la courbe de progression des niveaux")
+    @app_commands.describe(
+        courbe="sqrt (historique), linear (même coût à chaque niveau) ou exponential",
+        base="XP de base de la courbe (100 par défaut)",
+        facteur="Multiplicateur entre deux niveaux (courbe exponential uniquement)"
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def levelcurve(
+        self,
+        interaction: discord.Interaction,
+        courbe: Literal["sqrt", "linear", "exponential"],
+        base: int = 100,
+        facteur: float = 1.2
+    ):
+        """Change la courbe de niveaux et recalcule le niveau de tout le monde."""
+        settings = {"type": courbe, "base": base, "factor": facteur}
+        try:
+            get_curve(settings)
+        except ValueError:
+            await interaction.response.send_message(
+                "❌ Paramètres invalides : la base doit être positive et le facteur supérieur à 1.",
+                ephemeral=True
+            )
+            return
+
+        guild_data = self.get_guild_data(interaction.guild.id)
+        guild_data["curve"] = settings
+        self.save_data(interaction.guild.id)
+        changed = self.recompute_guild_levels(interaction.guild.id)
+
+        await interaction.response.send_message(
+            f"✅ Courbe de niveaux définie sur **{courbe}** (base {base}"
+            f"{f', facteur {facteur}' if courbe == 'exponential' else ''}) • "
+            f"**{changed}** niveau(x) recalculé(s)"
+        )
+
+    @app_commands.command(name="annoncesxp", description="🔒 ADMIN : Règle les annonces de montée de niveau")
+    @app_commands.describe(
+        mode="immediate (tout de suite), batched (regroupées par salon) ou disabled (aucune annonce)",
+        fenetre="Secondes pendant lesquelles les annonces d'un salon sont regroupées (mode batched)",
+        max_par_minute="Nombre maximum de messages d'annonce par salon et par minute"
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def annoncesxp(
+        self,
+        interaction: discord.Interaction,
+        mode: Literal["immediate", "batched", "disabled"],
+        fenetre: app_commands.Range[int, 1, 60] = 3,
+        max_par_minute: app_commands.Range[int, 1, 60] = 10
+    ):
+        """Définit comment les montées de niveau sont annoncées."""
+        guild_data = self.get_guild_data(interaction.guild.id)
+        guild_data["announce"] = {"mode": mode, "window": fenetre, "per_minute": max_par_minute}
+        self.save_data(interaction.guild.id)
+
+        if mode == "disabled":
+            await interaction.response.send_message("✅ Annonces de montée de niveau **désactivées**")
+        elif mode == "immediate":
+            await interaction.response.send_message(
+                f"✅ Annonces **immédiates** (max **{max_par_minute}** message(s)/minute par salon)"
+            )
+        else:
+            await interaction.response.send_message(
+                f"✅ Annonces **regroupées** toutes les **{fenetre} s** "
+                f"(max **{max_par_minute}** message(s)/minute par salon)"
+            )
+
 async def setup(bot):
     await bot.add_cog(XP(bot))
\ No newline at end of file
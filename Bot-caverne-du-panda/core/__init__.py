@@ -0,0 +1 @@
+"""Briques partagées par les cogs (stockage, index, ...), hors extensions."""
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+ANNOUNCE_MODES = ("immediate", "batched", "disabled")
+DEFAULT_ANNOUNCE = {"mode": "batched", "window": 3, "per_minute": 10}
+
+# Limite de longueur d'un message Discord
+MAX_MESSAGE_LENGTH = 2000
+
+
+class LevelUpAnnouncer:
+    """Regroupe les annonces de montée de niveau par salon.
+
+    Les montées de niveau d'un même salon sont mises en attente pendant une
+    courte fenêtre puis envoyées en un seul message. Un plafond de messages
+    par minute et par salon protège le bucket de rate limit du salon : au
+    delà, les annonces continuent de s'accumuler jusqu'au prochain créneau.
+    """
+
+    def __init__(self):
+        self._pending = {}  # channel_id -> {"channel", "entries": {user_id: (mention, level)}, "task"}
+        self._sent = {}     # channel_id -> instants (monotones) des derniers envois
+
+        # Statistiques
+        self.announcements = 0
+        self.messages_sent = 0
+
+    def add(self, channel, member, level, settings=None):
+        """Met en attente l'annonce d'une montée de niveau."""
+        settings = {**DEFAULT_ANNOUNCE, **(settings or {})}
+        if settings["mode"] == "disabled":
+            return
+
+        self.announcements += 1
+        pending = self._pending.get(channel.id)
+        if pending is None:
+            window = 0 if settings["mode"] == "immediate" else settings["window"]
+            pending = self._pending[channel.id] = {"channel": channel, "entries": {}}
+            pending["task"] = asyncio.create_task(
+                self._flush_later(channel.id, window, settings["per_minute"])
+            )
+        # Si quelqu'un monte deux fois pendant la fenêtre, seul le dernier niveau compte
+        pending["entries"][member.id] = (member.mention, level)
+
+    async def _flush_later(self, channel_id, window, per_minute):
+        if window > 0:
+            await asyncio.sleep(window)
+
+        # Attendre un créneau libre sous le plafond de messages par minute
+        sent = self._sent.setdefault(channel_id, deque())
+        while True:
+            now = time.monotonic()
+            while sent and now - sent[0] >= 60:
+                sent.popleft()
+            if len(sent) < per_minute:
+                break
+            await asyncio.sleep(60 - (now - sent[0]))
+
+        pending = self._pending.pop(channel_id)
+        for text in self.format(pending["entries"].values()):
+            try:
+                await pending["channel"].send(text)
+                self.messages_sent += 1
+                sent.append(time.monotonic())
+            except Exception as e:
+                log.error("❌ Erreur lors de l'annonce de niveau dans %s: %s", channel_id, e)
+
+    @staticmethod
+    def format(entries):
+        """Construit le(s) message(s) pour une liste de ``(mention, niveau)``."""
+        entries = list(entries)
+        if len(entries) == 1:
+            mention, level = entries[0]
+            return [f"🎉 **{mention}** vient de passer au niveau **{level}** ! Bravo ! 🎊"]
+
+        messages = []
+        current = "🎉 **Montées de niveau !** 🎊"
+        for mention, level in entries:
+            line = f"\n• {mention} → niveau **{level}**"
+            if len(current) + len(line) > MAX_MESSAGE_LENGTH:
+                messages.append(current)
+                current = line.lstrip("\n")
+            else:
+                current += line
+        messages.append(current)
+        return messages
+
+    def close(self):
+        """Annule les annonces encore en attente."""
+        for pending in self._pending.values():
+            pending["task"].cancel()
+        self._pending.clear()
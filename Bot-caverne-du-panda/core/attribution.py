@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import os
+import time
+from cogs.utils import Utils
+from core.backends import DATA_DIR
+from core.cluster import process_suffix
+from core.storage import run_in_storage_thread
+
+log = logging.getLogger(__name__)
+
+# Intervalle (minutes) de la réconciliation complète du cache
+RECONCILE_MINUTES = float(os.environ.get("INVITE_RECONCILE_MINUTES", 30))
+# Nombre de serveurs chargés en parallèle au démarrage
+WARMUP_CONCURRENCY = int(os.environ.get("INVITE_WARMUP_CONCURRENCY", 5))
+# Délai (secondes) pendant lequel une invitation supprimée à une utilisation
+# de sa limite peut encore expliquer une arrivée (épuisée par cette arrivée)
+EXHAUSTED_DELETE_DELAY = float(os.environ.get("INVITE_EXHAUSTED_DELETE_DELAY", 5))
+
+
+class CachedInvite:
+    """État connu d'une invitation : utilisations, auteur et limite d'utilisations.
+
+    ``deleted_at`` (``time.monotonic()``) est renseigné quand l'invitation
+    a été supprimée mais reste candidate (voir ``InviteTracker.on_delete``).
+    """
+
+    __slots__ = ("uses", "inviter_id", "max_uses", "deleted_at")
+
+    def __init__(self, uses=0, inviter_id=None, max_uses=0):
+        self.uses = uses
+        self.inviter_id = inviter_id
+        self.max_uses = max_uses
+        self.deleted_at = None
+
+    @classmethod
+    def from_invite(cls, invite):
+        return cls(invite.uses or 0, invite.inviter.id if invite.inviter else None, invite.max_uses or 0)
+
+
+class Attribution:
+    """Résultat de l'attribution d'une arrivée.
+
+    ``inviter_id`` vaut ``None`` quand l'inviteur est inconnu ; ``reason``
+    explique alors pourquoi. ``code`` peut être ``None`` même si l'inviteur
+    est connu (plusieurs invitations du même inviteur utilisées à la fois).
+    """
+
+    __slots__ = ("member_id", "code", "inviter_id", "reason")
+
+    def __init__(self, member_id, code=None, inviter_id=None, reason=None):
+        self.member_id = member_id
+        self.code = code
+        self.inviter_id = inviter_id
+        self.reason = reason
+
+    @property
+    def known(self):
+        return self.inviter_id is not None
+
+
+def use_deltas(before, after, joins):
+    """Utilisations gagnées par chaque code entre deux états du cache.
+
+    ``before`` et ``after`` associent chaque code à un ``CachedInvite``.
+    Une invitation absente de ``after`` qui était à une utilisation de sa
+    limite a peut-être été épuisée par une arrivée (Discord la supprime),
+    ou simplement supprimée par un admin : elle ne compte pour une
+    utilisation que si les autres codes n'expliquent pas les ``joins``
+    arrivées du lot, et seulement si sa suppression n'a pas été vue ou
+    date de moins de ``EXHAUSTED_DELETE_DELAY`` secondes (une invitation
+    épuisée disparaît au moment de l'arrivée).
+    """
+    deltas = {}
+    for code, invite in after.items():
+        previous = before.get(code)
+        delta = invite.uses - (previous.uses if previous else 0)
+        if delta > 0:
+            deltas[code] = delta
+    missing = joins - sum(deltas.values())
+    now = time.monotonic()
+    for code, invite in before.items():
+        if missing <= 0:
+            break
+        if invite.deleted_at is not None and now - invite.deleted_at > EXHAUSTED_DELETE_DELAY:
+            continue
+        if code not in after and invite.max_uses and invite.uses + 1 == invite.max_uses:
+            deltas[code] = 1
+            missing -= 1
+    return deltas
+
+
+def attribute(member_ids, before, after):
+    """Attribue un lot d'arrivées à partir des écarts d'utilisation par code (``use_deltas``).
+
+    L'attribution n'est donnée que si elle est certaine : un seul inviteur
+    et au moins autant d'utilisations que d'arrivées. Sinon (plusieurs
+    inviteurs dans le lot, arrivées par un lien non suivi...), on ne peut
+    pas savoir qui a invité qui : tout le lot reste inconnu.
+    """
+    deltas = use_deltas(before, after, len(member_ids))
+    total = sum(deltas.values())
+    if total == 0:
+        reason = "aucune utilisation d'invitation détectée"
+        return [Attribution(member_id, reason=reason) for member_id in member_ids]
+
+    inviters = {(after.get(code) or before[code]).inviter_id for code in deltas}
+    if len(inviters) > 1:
+        reason = "lot partagé entre plusieurs inviteurs"
+    elif None in inviters:
+        reason = "invitation sans auteur"
+    elif total < len(member_ids):
+        # Certaines arrivées sont passées par un lien que l'on ne suit pas (URL personnalisée...)
+        reason = "plus d'arrivées que d'utilisations"
+    else:
+        (inviter_id,) = inviters
+        code = next(iter(deltas)) if len(deltas) == 1 else None
+        return [Attribution(member_id, code, inviter_id) for member_id in member_ids]
+    return [Attribution(member_id, reason=reason) for member_id in member_ids]
+
+
+class InviteTracker:
+    """Cache des invitations et attribution des arrivées, sérialisée par serveur.
+
+    Chaque serveur a au plus un worker : une arrivée déclenche tout de
+    suite un ``guild.invites()`` si aucun n'est en cours ; celles reçues
+    pendant un appel sont regroupées et partagent l'appel suivant. Après
+    chaque appel, le cache est remplacé par l'état récupéré et le lot
+    d'après repart de ce cache.
+
+    Entre deux lots, le cache suit les événements de création et de
+    suppression d'invitations sans appel REST ; une réconciliation peu
+    fréquente corrige les éventuelles dérives.
+    """
+
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path or os.path.join(DATA_DIR, f"invite_cache{process_suffix()}.json")
+        self.cache = {}     # guild_id -> {code: CachedInvite}
+        self._locks = {}    # guild_id -> asyncio.Lock (accès au cache pendant un fetch)
+        self._pending = {}  # guild_id -> [(member_id, future), ...]
+        self._workers = {}  # guild_id -> tâche d'attribution
+
+        # Statistiques
+        self.joins = 0
+        self.fetches = 0
+        self.attributed = 0
+        self.unknown = 0
+        self.fetches_avoided = 0   # événements appliqués sans guild.invites()
+        self.reconcile_fetches = 0
+        self.drift_fixed = 0       # codes corrigés par la réconciliation
+
+    def lock(self, guild_id):
+        lock = self._locks.get(guild_id)
+        if lock is None:
+            lock = self._locks[guild_id] = asyncio.Lock()
+        return lock
+
+    def set_invites(self, guild_id, invites):
+        """Remplace le cache d'un serveur par une liste d'invitations Discord."""
+        self.cache[guild_id] = {invite.code: CachedInvite.from_invite(invite) for invite in invites}
+
+    def on_create(self, invite):
+        """Ajoute au cache une invitation qui vient d'être créée."""
+        invites = self.cache.get(invite.guild.id)
+        if invites is None:
+            return False
+        invites[invite.code] = CachedInvite.from_invite(invite)
+        self.fetches_avoided += 1
+        return True
+
+    def on_delete(self, invite):
+        """Retire une invitation supprimée du cache.
+
+        Une invitation à une utilisation de sa limite a peut-être été
+        supprimée parce qu'une arrivée l'a épuisée : elle reste en cache
+        comme candidate pour le prochain lot, qui ne la compte que s'il en a
+        besoin (``use_deltas``), puis disparaît au remplacement du cache.
+        """
+        invites = self.cache.get(invite.guild.id)
+        if invites is None:
+            return False
+        cached = invites.get(invite.code)
+        if cached is not None:
+            if cached.max_uses and cached.uses + 1 == cached.max_uses:
+                cached.deleted_at = time.monotonic()
+            else:
+                del invites[invite.code]
+        self.fetches_avoided += 1
+        return True
+
+    async def reconcile(self, guild):
+        """Recharge toutes les invitations d'un serveur pour corriger les dérives.
+
+        Retourne le nombre de codes corrigés, ou ``None`` si la
+        réconciliation a été sautée parce que des arrivées sont en cours
+        d'attribution (leur lot va de toute façon recharger le cache).
+        """
+        if guild.id in self._workers:
+            return None
+        async with self.lock(guild.id):
+            self.reconcile_fetches += 1
+            invites = await guild.invites()
+            if guild.id in self._workers:
+                # Une arrivée est survenue pendant l'appel : remplacer le
+                # cache maintenant effacerait son écart d'utilisation
+                return None
+            before = self.cache.get(guild.id, {})
+            self.set_invites(guild.id, invites)
+            after = self.cache[guild.id]
+
+        drift = sum(
+            1 for code in before.keys() | after.keys()
+            if code not in before or code not in after or before[code].uses != after[code].uses
+        )
+        self.drift_fixed += drift
+        return drift
+
+    async def warm_up(self, guilds, concurrency=WARMUP_CONCURRENCY):
+        """Charge les invitations de tous les serveurs, ``concurrency`` à la fois.
+
+        Un serveur dont des arrivées sont déjà en cours d'attribution est
+        sauté : son lot recharge le cache lui-même, en partant du snapshot.
+        Retourne ``(serveurs chargés, erreurs)``.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load(guild):
+            async with semaphore:
+                try:
+                    await self.reconcile(guild)
+                    return True
+                except Exception as e:
+                    log.error("❌ Erreur de chargement des invitations pour %s: %s", guild.name, e)
+                    return False
+
+        results = await asyncio.gather(*(load(guild) for guild in guilds))
+        return results.count(True), results.count(False)
+
+    # ---- SNAPSHOT ----
+    def _snapshot(self):
+        return {
+            str(guild_id): {code: [cached.uses, cached.inviter_id, cached.max_uses] for code, cached in invites.items()}
+            for guild_id, invites in self.cache.items()
+        }
+
+    async def save_snapshot(self):
+        """Écrit le cache sur disque (dans le pool de stockage)."""
+        return await run_in_storage_thread(Utils.save_json, self.snapshot_path, self._snapshot())
+
+    async def load_snapshot(self):
+        """Repart du dernier cache connu pour attribuer dès le démarrage."""
+        data = await run_in_storage_thread(Utils.load_json, self.snapshot_path)
+        for guild_id, invites in data.items():
+            # Un cache déjà chargé est plus récent que le snapshot
+            self.cache.setdefault(int(guild_id), {
+                code: CachedInvite(*values) for code, values in invites.items()
+            })
+        return len(data)
+
+    async def attribute(self, guild, member_id):
+        """Attend l'attribution d'une arrivée (regroupée avec celles reçues pendant un appel en cours)."""
+        self.joins += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(guild.id, []).append((member_id, future))
+        if guild.id not in self._workers:
+            self._workers[guild.id] = asyncio.create_task(self._work(guild))
+        return await future
+
+    async def _work(self, guild):
+        try:
+            while True:
+                batch = self._pending.pop(guild.id, None)
+                if not batch:
+                    return
+                try:
+                    await self._resolve(guild, batch)
+                except asyncio.CancelledError:
+                    self._fail(batch, "attribution interrompue")
+                    raise
+                except Exception as e:
+                    log.exception("❌ Erreur d'attribution sur %s : %s", guild.name, e)
+                    self._fail(batch, f"erreur d'attribution ({e})")
+        finally:
+            self._workers.pop(guild.id, None)
+            # Worker interrompu : ne laisser personne attendre indéfiniment
+            self._fail(self._pending.pop(guild.id, []), "attribution interrompue")
+
+    def _fail(self, batch, reason):
+        """Résout comme inconnues les arrivées d'un lot qui n'a pas pu être attribué."""
+        for member_id, future in batch:
+            if not future.done():
+                self.unknown += 1
+                future.set_result(Attribution(member_id, reason=reason))
+
+    async def _resolve(self, guild, batch):
+        member_ids = [member_id for member_id, _ in batch]
+        async with self.lock(guild.id):
+            before = self.cache.get(guild.id, {})
+            try:
+                self.fetches += 1
+                invites = await guild.invites()
+            except Exception as e:
+                results = [Attribution(member_id, reason=f"invitations illisibles ({e})") for member_id in member_ids]
+            else:
+                self.set_invites(guild.id, invites)
+                after = self.cache[guild.id]
+                # La réponse compte déjà des arrivées reçues pendant l'appel. On
+                # ne sait pas lesquelles (certaines ont pu passer par un lien non
+                # suivi) : elles rejoignent toutes le lot, attribué ensemble
+                surplus = sum(use_deltas(before, after, len(batch)).values()) - len(batch)
+                pending = self._pending.get(guild.id)
+                if surplus > 0 and pending:
+                    # Ajout en place : en cas d'erreur, _work résout aussi ces arrivées
+                    batch.extend(pending)
+                    pending.clear()
+                    member_ids = [member_id for member_id, _ in batch]
+                results = attribute(member_ids, before, after)
+                if log.isEnabledFor(logging.DEBUG):
+                    # Le dump du cache n'est construit que si le niveau DEBUG est actif
+                    log.debug(
+                        "📨 Lot de %d arrivée(s) sur %s, utilisations : %s",
+                        len(member_ids), guild.name,
+                        {code: cached.uses for code, cached in self.cache[guild.id].items()}
+                    )
+
+        for (_, future), result in zip(batch, results):
+            if result.known:
+                self.attributed += 1
+            else:
+                self.unknown += 1
+            if not future.done():
+                future.set_result(result)
+
+    def close(self):
+        for task in self._workers.values():
+            task.cancel()
+
+    def stats(self):
+        return {
+            "joins": self.joins,
+            "fetches": self.fetches,
+            "attributed": self.attributed,
+            "unknown": self.unknown,
+            "fetches_avoided": self.fetches_avoided,
+            "reconcile_fetches": self.reconcile_fetches,
+            "drift_fixed": self.drift_fixed,
+        }
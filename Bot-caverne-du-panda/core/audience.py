@@ -0,0 +1,145 @@
+from bisect import bisect_right, insort
+from itertools import islice
+
+
+class GuildAudience:
+    """Index des membres humains d'un serveur pour le ciblage des broadcasts.
+
+    Garde l'ensemble des membres, l'ensemble des membres de chaque rôle et
+    la liste des arrivées triée par date. Construit en une passe sur
+    ``guild.members`` puis tenu à jour par les événements de membres.
+    """
+
+    def __init__(self, members=()):
+        self.members = set()
+        self.roles = {}       # role_id -> ids des membres ayant ce rôle
+        self._joined_at = {}  # member_id -> timestamp d'arrivée
+        self._joined = []     # (timestamp d'arrivée, member_id), trié
+
+        for member in members:
+            if member.bot:
+                continue
+            self.members.add(member.id)
+            for role in member.roles:
+                self.roles.setdefault(role.id, set()).add(member.id)
+            self._joined_at[member.id] = self._timestamp(member)
+        self._joined = sorted((joined, member_id) for member_id, joined in self._joined_at.items())
+
+    def __len__(self):
+        return len(self.members)
+
+    @staticmethod
+    def _timestamp(member):
+        return member.joined_at.timestamp() if member.joined_at else 0.0
+
+    def add(self, member):
+        """Ajoute un membre qui vient d'arriver."""
+        if member.bot or member.id in self.members:
+            return
+        self.members.add(member.id)
+        for role in member.roles:
+            self.roles.setdefault(role.id, set()).add(member.id)
+        joined = self._timestamp(member)
+        self._joined_at[member.id] = joined
+        insort(self._joined, (joined, member.id))
+
+    def remove(self, member_id):
+        """Retire un membre qui a quitté le serveur."""
+        if member_id not in self.members:
+            return
+        self.members.discard(member_id)
+        for members in self.roles.values():
+            members.discard(member_id)
+        joined = self._joined_at.pop(member_id)
+        i = bisect_right(self._joined, (joined, member_id)) - 1
+        if i >= 0 and self._joined[i] == (joined, member_id):
+            del self._joined[i]
+
+    def update_roles(self, member_id, before, after):
+        """Applique un changement de rôles (ids avant / après)."""
+        if member_id not in self.members:
+            return
+        for role_id in before - after:
+            self.roles.get(role_id, set()).discard(member_id)
+        for role_id in after - before:
+            self.roles.setdefault(role_id, set()).add(member_id)
+
+    def remove_role(self, role_id):
+        self.roles.pop(role_id, None)
+
+    def joined_after(self, timestamp):
+        """``(nombre, itérateur)`` des membres arrivés après ``timestamp``."""
+        start = bisect_right(self._joined, (timestamp, float("inf")))
+        return len(self._joined) - start, (member_id for _, member_id in islice(self._joined, start, None))
+
+    def joined_at(self, member_id):
+        return self._joined_at.get(member_id, 0.0)
+
+
+def _ranked_at_least(ranking, minimum):
+    """Ids d'un classement dont le score est au moins ``minimum`` (du meilleur au moins bon)."""
+    for _, user_id, score in ranking.iter_from(0):
+        if score < minimum:
+            return
+        yield user_id
+
+
+class AudienceSelection:
+    """Audience d'un broadcast : intersection de filtres évaluée sur les index.
+
+    Le filtre le plus sélectif fournit les candidats ; les autres sont
+    vérifiés un par un en temps constant (appartenance à un ensemble,
+    score dans un classement). Les destinataires sont produits au fil de
+    l'eau, sans construire de liste : le flux parcourt directement les
+    index et doit donc être consommé sans rendre la main à la boucle.
+    """
+
+    def __init__(self, audience, role_id=None, xp_ranking=None, min_xp=None,
+                 invite_ranking=None, min_invites=None, joined_after=None):
+        self.audience = audience
+        # (taille, fabrique d'itérateur, exact) pour chaque filtre actif ;
+        # « exact » : la source ne contient que des membres actuels
+        self._sources = []
+        self._checks = []
+
+        if role_id is not None:
+            members = audience.roles.get(role_id, set())
+            self._sources.append((len(members), lambda: iter(members), True))
+            self._checks.append(lambda member_id: member_id in members)
+        if min_xp:
+            self._sources.append((
+                xp_ranking.count_at_least(min_xp), lambda: _ranked_at_least(xp_ranking, min_xp), False
+            ))
+            self._checks.append(lambda member_id: (xp_ranking.score(member_id) or 0) >= min_xp)
+        if min_invites:
+            self._sources.append((
+                invite_ranking.count_at_least(min_invites), lambda: _ranked_at_least(invite_ranking, min_invites), False
+            ))
+            self._checks.append(lambda member_id: (invite_ranking.score(member_id) or 0) >= min_invites)
+        if joined_after is not None:
+            count, _ = audience.joined_after(joined_after)
+            self._sources.append((count, lambda: audience.joined_after(joined_after)[1], True))
+            self._checks.append(lambda member_id: audience.joined_at(member_id) > joined_after)
+
+        if not self._sources:
+            self._sources.append((len(audience.members), lambda: iter(audience.members), True))
+
+    def __iter__(self):
+        """Ids des destinataires, produits un par un."""
+        size, source, exact = min(self._sources, key=lambda item: item[0])
+        members = self.audience.members
+        checks = self._checks
+        for member_id in source():
+            if member_id in members and all(check(member_id) for check in checks):
+                yield member_id
+
+    def count(self):
+        """Taille exacte de l'audience.
+
+        Avec un seul filtre sur un index de membres (rôle, date d'arrivée ou
+        aucun filtre), c'est la taille de l'index ; sinon on parcourt la
+        source la plus petite.
+        """
+        if len(self._sources) == 1 and self._sources[0][2]:
+            return self._sources[0][0]
+        return sum(1 for _ in self)
@@ -0,0 +1,44 @@
+import os
+from bisect import bisect_right
+
+# Resynchronisation des rôles : membres traités par lot, puis pause (secondes)
+ROLE_SYNC_BATCH = int(os.environ.get("ROLE_SYNC_BATCH", 10))
+ROLE_SYNC_PAUSE = float(os.environ.get("ROLE_SYNC_PAUSE", 5.0))
+
+
+class RoleThresholds:
+    """Seuils des rôles automatiques, triés par nombre d'invitations requis.
+
+    Construit depuis ``settings["roles"]`` (``{role_id: invitations}``).
+    Les rôles atteints entre deux compteurs s'obtiennent par recherche
+    dichotomique, sans parcourir toute la configuration.
+    """
+
+    def __init__(self, roles=None):
+        entries = sorted((required, int(role_id)) for role_id, required in (roles or {}).items())
+        self._required = [required for required, _ in entries]
+        self._role_ids = [role_id for _, role_id in entries]
+
+    def __len__(self):
+        return len(self._role_ids)
+
+    def __bool__(self):
+        return bool(self._role_ids)
+
+    @property
+    def minimum(self):
+        """Plus petit seuil configuré, ou ``None`` sans rôle automatique."""
+        return self._required[0] if self._required else None
+
+    def crossed(self, before, after):
+        """Rôles dont le seuil est franchi en passant de ``before`` à ``after`` invitations."""
+        if after <= before:
+            return []
+        return self._role_ids[bisect_right(self._required, before):bisect_right(self._required, after)]
+
+    def earned(self, count):
+        """Tous les rôles mérités avec ``count`` invitations."""
+        return self._role_ids[:bisect_right(self._required, count)]
+
+    def role_ids(self):
+        return set(self._role_ids)
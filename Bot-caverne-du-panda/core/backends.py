@@ -0,0 +1,556 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from cogs.utils import Utils
+
+log = logging.getLogger(__name__)
+
+# Choix du stockage : "sharded" (par défaut), "json" ou "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sharded").lower()
+DATA_DIR = os.environ.get("DATA_DIR", "./data")
+
+# Espaces de noms connus : un par cog qui persiste des données
+NAMESPACES = ("xp", "invites")
+# Ancien historique des broadcasts, remplacé par core.history : seulement relu pour la migration
+LEGACY_HISTORY = "broadcast"
+
+
+class JsonBackend:
+    """Stockage historique : un fichier ``data/<namespace>.json`` par cog.
+
+    Chaque serveur est gardé sous forme de fragment JSON déjà encodé : une
+    écriture ne réencode que les serveurs modifiés, puis assemble le
+    fichier complet.
+    """
+
+    name = "json"
+    # Les écritures ont besoin du document complet de chaque serveur modifié
+    partial_writes = False
+    # Un seul fichier : impossible de recharger un serveur sans relire tout le reste
+    lazy_loading = False
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self._fragments = {}  # namespace -> {guild_id: fragment JSON}
+
+    def path(self, namespace):
+        return os.path.join(self.data_dir, f"{namespace}.json")
+
+    @staticmethod
+    def _encode(doc):
+        # Même rendu que json.dump(..., indent=4) une fois imbriqué d'un niveau
+        return json.dumps(doc, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+
+    def load(self, namespace):
+        """Charge toutes les données d'un espace de noms."""
+        data = Utils.load_json(self.path(namespace))
+        self._fragments[namespace] = {guild_id: self._encode(doc) for guild_id, doc in data.items()}
+        return data
+
+    def write(self, namespace, docs, dirty):
+        """Réencode les serveurs de ``docs`` et réécrit le fichier."""
+        fragments = self._fragments.setdefault(namespace, {})
+        try:
+            for guild_id, doc in docs.items():
+                fragments[guild_id] = self._encode(doc)
+        except Exception as e:
+            log.error("❌ Erreur lors de l'encodage de %s: %s", namespace, e)
+            return False
+
+        if not fragments:
+            return Utils.save_text(self.path(namespace), "{}")
+        body = ",\n".join(
+            f"    {json.dumps(guild_id)}: {fragment}" for guild_id, fragment in fragments.items()
+        )
+        return Utils.save_text(self.path(namespace), "{\n" + body + "\n}")
+
+    def close(self):
+        pass
+
+
+class ShardedJsonBackend:
+    """Un fichier JSON par serveur : ``data/<namespace>/<guild_id>.json``.
+
+    Un manifeste (``data/<namespace>/manifest.json``) liste les serveurs
+    connus. Une écriture ne touche que les fichiers des serveurs modifiés,
+    et un fichier corrompu n'affecte qu'un seul serveur : il est mis de
+    côté (``.corrupt``) au lieu d'être écrasé.
+    """
+
+    name = "sharded"
+    # Chaque fichier contient un serveur complet
+    partial_writes = False
+    # Un serveur peut être chargé seul, à la demande
+    lazy_loading = True
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self._guilds = {}  # namespace -> ids des serveurs présents dans le manifeste
+
+    def directory(self, namespace):
+        return os.path.join(self.data_dir, namespace)
+
+    def shard_path(self, namespace, guild_id):
+        return os.path.join(self.directory(namespace), f"{guild_id}.json")
+
+    def manifest_path(self, namespace):
+        return os.path.join(self.directory(namespace), "manifest.json")
+
+    def _save_manifest(self, namespace):
+        return Utils.save_json(self.manifest_path(namespace), {
+            "version": 1,
+            "guilds": sorted(self._guilds.get(namespace, ())),
+        })
+
+    # ---- MIGRATION ----
+    def migrate_monolithic(self, namespace):
+        """Découpe l'ancien ``data/<namespace>.json`` en un fichier par serveur.
+
+        L'ancien fichier est conservé sous ``<namespace>.json.bak``.
+        """
+        legacy_path = os.path.join(self.data_dir, f"{namespace}.json")
+        if not os.path.exists(legacy_path) or os.path.exists(self.manifest_path(namespace)):
+            return False
+
+        data = Utils.load_json(legacy_path)
+        for guild_id, doc in data.items():
+            if not Utils.save_json(self.shard_path(namespace, guild_id), doc):
+                return False
+        self._guilds[namespace] = set(data)
+        if not self._save_manifest(namespace):
+            return False
+
+        os.replace(legacy_path, legacy_path + ".bak")
+        log.info("✅ %s.json découpé en %d fichier(s) par serveur", namespace, len(data))
+        return True
+
+    # ---- LECTURE ----
+    def guild_ids(self, namespace):
+        """Ids des serveurs connus, sans charger leurs données."""
+        self.migrate_monolithic(namespace)
+
+        manifest = Utils.load_json(self.manifest_path(namespace))
+        guild_ids = manifest.get("guilds")
+        if guild_ids is None:
+            # Manifeste absent ou illisible : on le reconstruit depuis le dossier
+            directory = self.directory(namespace)
+            guild_ids = [
+                filename[:-5] for filename in os.listdir(directory)
+                if filename.endswith(".json") and filename != "manifest.json"
+            ] if os.path.isdir(directory) else []
+        self._guilds[namespace] = set(guild_ids)
+        return list(guild_ids)
+
+    def load(self, namespace):
+        """Charge tous les serveurs listés dans le manifeste."""
+        data = {}
+        for guild_id in self.guild_ids(namespace):
+            doc = self.load_guild(namespace, guild_id)
+            if doc is not None:
+                data[guild_id] = doc
+        self._guilds[namespace] = set(data)
+        return data
+
+    def load_guild(self, namespace, guild_id):
+        """Charge un seul serveur, ou ``None`` s'il n'existe pas ou est corrompu."""
+        path = self.shard_path(namespace, guild_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            log.error("❌ Fichier corrompu %s, mis de côté : %s", path, e)
+            os.replace(path, path + ".corrupt")
+            return None
+
+    # ---- ÉCRITURE ----
+    def write(self, namespace, docs, dirty):
+        """Réécrit uniquement les fichiers des serveurs de ``docs``."""
+        ok = True
+        for guild_id, doc in docs.items():
+            ok = Utils.save_json(self.shard_path(namespace, guild_id), doc) and ok
+
+        known = self._guilds.setdefault(namespace, set())
+        if not known.issuperset(docs):
+            known.update(docs)
+            ok = self._save_manifest(namespace) and ok
+        return ok
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS guild_settings (
+    namespace TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, guild_id, key)
+);
+CREATE TABLE IF NOT EXISTS xp_users (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    last_message REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS xp_boosts (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    multiplier REAL NOT NULL,
+    PRIMARY KEY (guild_id, channel_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS invite_users (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    invites INTEGER NOT NULL DEFAULT 0,
+    left_count INTEGER NOT NULL DEFAULT 0,
+    invited_by INTEGER,
+    invite_code TEXT,
+    departed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS invite_roles (
+    guild_id INTEGER NOT NULL,
+    role_id INTEGER NOT NULL,
+    required INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, role_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS broadcast_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    author INTEGER NOT NULL,
+    titre TEXT NOT NULL,
+    description TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'done',
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS broadcast_history_guild ON broadcast_history (guild_id, id);
+"""
+
+
+class SqliteBackend:
+    """Stockage SQLite (mode WAL) avec mises à jour ligne par ligne.
+
+    Les données restent exposées aux cogs sous la même forme que les
+    fichiers JSON ; seules les lignes des utilisateurs modifiés sont
+    réécrites à chaque flush.
+    """
+
+    name = "sqlite"
+    # Seuls les utilisateurs modifiés sont nécessaires à une écriture
+    partial_writes = True
+    # Un serveur peut être chargé seul, à la demande
+    lazy_loading = True
+
+    def __init__(self, path=None, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.path = path or os.path.join(data_dir, "bot.db")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+        self.upgrade_schema()
+
+        self.migrate_from_json()
+
+    def upgrade_schema(self):
+        """Ajoute les colonnes apparues après la création d'une base existante."""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(broadcast_history)")}
+        if "status" not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE broadcast_history ADD COLUMN status TEXT NOT NULL DEFAULT 'done'")
+
+        # Les classements sont tenus en mémoire (RankIndex) : les index de tri ne servent plus
+        with self.conn:
+            self.conn.execute("DROP INDEX IF EXISTS xp_users_rank")
+            self.conn.execute("DROP INDEX IF EXISTS invite_users_rank")
+
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(invite_users)")}
+        with self.conn:
+            if "invited_by" not in columns:
+                self.conn.execute("ALTER TABLE invite_users ADD COLUMN invited_by INTEGER")
+            if "invite_code" not in columns:
+                self.conn.execute("ALTER TABLE invite_users ADD COLUMN invite_code TEXT")
+            if "departed" not in columns:
+                self.conn.execute("ALTER TABLE invite_users ADD COLUMN departed INTEGER NOT NULL DEFAULT 0")
+
+    # ---- MIGRATION ----
+    def migrate_from_json(self):
+        """Importe une seule fois les anciens fichiers JSON (monolithiques ou par serveur)."""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if row:
+            return False
+
+        sharded = ShardedJsonBackend(self.data_dir)
+        for namespace in NAMESPACES:
+            # Les données peuvent être au format monolithique ou déjà découpées
+            if os.path.exists(sharded.manifest_path(namespace)):
+                data = sharded.load(namespace)
+            else:
+                data = JsonBackend(self.data_dir).load(namespace)
+            if data:
+                self.write(namespace, data, {guild_id: None for guild_id in data})
+                log.info("✅ %s migré vers SQLite (%d serveur(s))", namespace, len(data))
+
+        history = load_legacy_history(self.data_dir)
+        if history:
+            self._import_history(history)
+            log.info("✅ Historique des broadcasts migré vers SQLite (%d serveur(s))", len(history))
+
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+        return True
+
+    # ---- LECTURE ----
+    def load(self, namespace):
+        """Reconstruit les données d'un espace de noms au format des cogs."""
+        with self._lock:
+            if namespace == "xp":
+                return self._load_xp()
+            if namespace == "invites":
+                return self._load_invites()
+        raise ValueError(f"Espace de noms inconnu : {namespace}")
+
+    # Tables contenant des données de chaque espace de noms (hors réglages)
+    GUILD_TABLES = {"xp": ("xp_users", "xp_boosts"), "invites": ("invite_users", "invite_roles")}
+
+    def guild_ids(self, namespace):
+        """Ids des serveurs connus, sans charger leurs données."""
+        queries = [f"SELECT guild_id FROM {table}" for table in self.GUILD_TABLES[namespace]]
+        queries.append("SELECT guild_id FROM guild_settings WHERE namespace = ?")
+        with self._lock:
+            rows = self.conn.execute(" UNION ".join(queries), (namespace,)).fetchall()
+        return [str(row["guild_id"]) for row in rows]
+
+    def load_guild(self, namespace, guild_id):
+        """Charge un seul serveur, ou ``None`` s'il n'a aucune donnée."""
+        with self._lock:
+            if namespace == "xp":
+                data = self._load_xp(int(guild_id))
+            elif namespace == "invites":
+                data = self._load_invites(int(guild_id))
+            else:
+                raise ValueError(f"Espace de noms inconnu : {namespace}")
+        return data.get(str(guild_id))
+
+    @staticmethod
+    def _filter(guild_id, prefix):
+        """Clause SQL (et paramètres) limitant une requête à un serveur."""
+        if guild_id is None:
+            return "", ()
+        return f"{prefix} guild_id = ?", (guild_id,)
+
+    def _settings(self, namespace, guild_id=None):
+        settings = {}
+        clause, params = self._filter(guild_id, "AND")
+        rows = self.conn.execute(
+            f"SELECT guild_id, key, value FROM guild_settings WHERE namespace = ? {clause}", (namespace, *params)
+        )
+        for row in rows:
+            settings.setdefault(str(row["guild_id"]), {})[row["key"]] = json.loads(row["value"])
+        return settings
+
+    def _load_xp(self, guild_id=None):
+        data = {}
+        clause, params = self._filter(guild_id, "WHERE")
+
+        def guild(guild_id):
+            return data.setdefault(str(guild_id), {"users": {}, "boosts": {}, "cooldown": 60})
+
+        for settings_guild_id, settings in self._settings("xp", guild_id).items():
+            guild(settings_guild_id).update(settings)
+        for row in self.conn.execute(f"SELECT * FROM xp_users {clause}", params):
+            guild(row["guild_id"])["users"][str(row["user_id"])] = {
+                "xp": row["xp"],
+                "level": row["level"],
+                "last_message": row["last_message"],
+            }
+        for row in self.conn.execute(f"SELECT * FROM xp_boosts {clause}", params):
+            guild(row["guild_id"])["boosts"][str(row["channel_id"])] = row["multiplier"]
+        return data
+
+    def _load_invites(self, guild_id=None):
+        data = {}
+        clause, params = self._filter(guild_id, "WHERE")
+
+        def guild(guild_id):
+            return data.setdefault(str(guild_id), {"users": {}, "settings": {"xp_per_invite": 50, "roles": {}}})
+
+        for settings_guild_id, settings in self._settings("invites", guild_id).items():
+            guild(settings_guild_id)["settings"].update(settings)
+        for row in self.conn.execute(f"SELECT * FROM invite_users {clause}", params):
+            guild(row["guild_id"])["users"][str(row["user_id"])] = {
+                "invites": row["invites"],
+                "left": row["left_count"],
+                "invited_by": row["invited_by"],
+                "invite_code": row["invite_code"],
+                "departed": bool(row["departed"]),
+            }
+        for row in self.conn.execute(f"SELECT * FROM invite_roles {clause}", params):
+            guild(row["guild_id"])["settings"]["roles"][str(row["role_id"])] = row["required"]
+        return data
+
+    @staticmethod
+    def history_entry(row):
+        """Ligne de ``broadcast_history`` au format des entrées d'historique."""
+        return {
+            "author": str(row["author"]),
+            "titre": row["titre"],
+            "description": row["description"],
+            "success": row["success"],
+            "failed": row["failed"],
+            "status": row["status"],
+            "timestamp": row["timestamp"],
+        }
+
+    # ---- ÉCRITURE ----
+    def write(self, namespace, docs, dirty):
+        """Écrit uniquement ce qui a changé.
+
+        ``dirty`` associe chaque serveur modifié à l'ensemble des
+        utilisateurs modifiés, ou à ``None`` pour réécrire tout le serveur.
+        Un utilisateur modifié absent de ``docs`` est supprimé.
+        """
+        try:
+            with self._lock, self.conn:
+                for guild_id, users in dirty.items():
+                    guild_data = docs.get(guild_id)
+                    if guild_data is None:
+                        continue
+                    if namespace == "xp":
+                        self._write_xp(int(guild_id), guild_data, users)
+                    elif namespace == "invites":
+                        self._write_invites(int(guild_id), guild_data, users)
+                    else:
+                        raise ValueError(f"Espace de noms inconnu : {namespace}")
+            return True
+        except Exception as e:
+            log.error("❌ Erreur SQLite lors de l'écriture de %s: %s", namespace, e)
+            return False
+
+    def _write_settings(self, namespace, guild_id, settings):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO guild_settings (namespace, guild_id, key, value) VALUES (?, ?, ?, ?)",
+            [(namespace, guild_id, key, json.dumps(value)) for key, value in settings.items()]
+        )
+
+    def _write_users(self, table, columns, guild_id, users, wanted):
+        """Upsert des utilisateurs modifiés (ou de tous si ``wanted`` vaut None)."""
+        user_ids = users.keys() if wanted is None else wanted
+        rows = []
+        removed = []
+        for user_id in user_ids:
+            user = users.get(user_id)
+            if user is None:
+                removed.append((guild_id, int(user_id)))
+            else:
+                rows.append((guild_id, int(user_id), *(getter(user) for getter in columns.values())))
+        if rows:
+            names = ", ".join(columns)
+            marks = ", ".join("?" for _ in columns)
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {table} (guild_id, user_id, {names}) VALUES (?, ?, {marks})",
+                rows
+            )
+        if removed:
+            self.conn.executemany(f"DELETE FROM {table} WHERE guild_id = ? AND user_id = ?", removed)
+
+    def _write_xp(self, guild_id, guild_data, users):
+        self._write_users("xp_users", {
+            "xp": lambda u: u["xp"],
+            "level": lambda u: u["level"],
+            "last_message": lambda u: u["last_message"],
+        }, guild_id, guild_data["users"], users)
+
+        # Les réglages du serveur (cooldown, courbe...) sont petits : on les
+        # réécrit à chaque fois
+        self._write_settings("xp", guild_id, {
+            key: value for key, value in guild_data.items() if key not in ("users", "boosts")
+        })
+        self.conn.execute("DELETE FROM xp_boosts WHERE guild_id = ?", (guild_id,))
+        self.conn.executemany(
+            "INSERT INTO xp_boosts (guild_id, channel_id, multiplier) VALUES (?, ?, ?)",
+            [(guild_id, int(channel_id), multiplier) for channel_id, multiplier in guild_data["boosts"].items()]
+        )
+
+    def _write_invites(self, guild_id, guild_data, users):
+        self._write_users("invite_users", {
+            "invites": lambda u: u["invites"],
+            "left_count": lambda u: u.get("left", 0),
+            "invited_by": lambda u: u.get("invited_by"),
+            "invite_code": lambda u: u.get("invite_code"),
+            "departed": lambda u: int(u.get("departed", False)),
+        }, guild_id, guild_data["users"], users)
+
+        settings = guild_data["settings"]
+        self._write_settings("invites", guild_id, {"xp_per_invite": settings["xp_per_invite"]})
+        self.conn.execute("DELETE FROM invite_roles WHERE guild_id = ?", (guild_id,))
+        self.conn.executemany(
+            "INSERT INTO invite_roles (guild_id, role_id, required) VALUES (?, ?, ?)",
+            [(guild_id, int(role_id), required) for role_id, required in settings["roles"].items()]
+        )
+
+    def _import_history(self, history):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO broadcast_history "
+                "(guild_id, author, titre, description, success, failed, status, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (int(guild_id), int(entry["author"]), entry["titre"], entry["description"],
+                     entry["success"], entry["failed"], entry.get("status", "done"), entry["timestamp"])
+                    for guild_id, entries in history.items() for entry in entries
+                ]
+            )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def load_legacy_history(data_dir=DATA_DIR):
+    """Lit l'ancien historique des broadcasts sans le modifier.
+
+    Il se trouve dans ``broadcast.json``, ou dans ``broadcast/`` s'il a
+    déjà été découpé par serveur. Retourne ``{guild_id: [entrées]}``.
+    """
+    sharded = ShardedJsonBackend(data_dir)
+    if os.path.exists(sharded.manifest_path(LEGACY_HISTORY)):
+        return sharded.load(LEGACY_HISTORY)
+    return Utils.load_json(os.path.join(data_dir, f"{LEGACY_HISTORY}.json"))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Retourne le stockage partagé par tous les cogs (créé au premier appel)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STORAGE_BACKEND == "sqlite":
+                _backend = SqliteBackend()
+            elif STORAGE_BACKEND == "json":
+                _backend = JsonBackend()
+            else:
+                _backend = ShardedJsonBackend()
+    return _backend
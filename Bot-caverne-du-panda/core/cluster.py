@@ -0,0 +1,57 @@
+import os
+from discord.ext import commands
+
+# Mode cluster : renseigné par cluster.py pour chaque processus.
+# SHARD_COUNT=0 (par défaut) : un seul processus, sans sharding explicite.
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", 0))
+SHARD_IDS = [int(shard_id) for shard_id in os.environ.get("SHARD_IDS", "").split(",") if shard_id.strip()] or None
+CLUSTER_ID = int(os.environ.get("CLUSTER_ID", 0))
+CLUSTER_COUNT = int(os.environ.get("CLUSTER_COUNT", 1))
+
+
+def shard_for(guild_id, shard_count=SHARD_COUNT):
+    """Shard qui reçoit les événements d'un serveur (formule de Discord)."""
+    if shard_count <= 1:
+        return 0
+    return (int(guild_id) >> 22) % shard_count
+
+
+def owns(guild_id, shard_ids=SHARD_IDS, shard_count=SHARD_COUNT):
+    """Vrai si les événements de ce serveur arrivent dans ce processus.
+
+    Chaque serveur appartient à un seul processus du cluster : lui seul
+    garde ses données en mémoire et les écrit.
+    """
+    if shard_count <= 1 or shard_ids is None:
+        return True
+    return shard_for(guild_id, shard_count) in shard_ids
+
+
+def plan_clusters(shard_count, processes):
+    """Répartit les shards ``0..shard_count-1`` en ``processes`` blocs contigus."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    plan = []
+    start = 0
+    for cluster_id in range(processes):
+        stop = start + size + (1 if cluster_id < extra else 0)
+        plan.append(list(range(start, stop)))
+        start = stop
+    return plan
+
+
+def is_primary():
+    """Le premier processus se charge des tâches globales (synchronisation des commandes)."""
+    return CLUSTER_ID == 0
+
+
+def process_suffix():
+    """Suffixe des fichiers propres à un processus (vide hors cluster)."""
+    return f".{CLUSTER_ID}" if CLUSTER_COUNT > 1 else ""
+
+
+def make_bot(**kwargs):
+    """``AutoShardedBot`` limité aux shards de ce processus en mode cluster, sinon ``Bot``."""
+    if SHARD_COUNT:
+        return commands.AutoShardedBot(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **kwargs)
+    return commands.Bot(**kwargs)
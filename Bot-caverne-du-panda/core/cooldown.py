@@ -0,0 +1,91 @@
+import time
+
+
+class CooldownGate:
+    """Filtre anti-spam placé devant ``XP.on_message``.
+
+    Pour chaque serveur, garde l'instant (horloge monotone) à partir duquel
+    chaque utilisateur peut de nouveau gagner de l'XP. Un message en
+    cooldown est rejeté par deux lookups de dict, sans créer ni toucher de
+    fiche XP. Les entrées expirées sont rangées par tranches de
+    ``bucket_width`` secondes et supprimées tranche par tranche.
+    """
+
+    def __init__(self, bucket_width=60):
+        self.bucket_width = bucket_width
+
+        self._next = {}     # guild_id -> {user_id: prochain instant éligible}
+        self._buckets = {}  # tranche de temps -> [(guild_id, user_id), ...]
+        self._next_sweep = time.monotonic() + bucket_width
+
+        # Statistiques
+        self.passed = 0
+        self.rejected = 0
+        self.swept = 0
+
+    def __len__(self):
+        return sum(len(users) for users in self._next.values())
+
+    def reset_guild(self, guild_id):
+        """Oublie les échéances d'un serveur (après un changement de cooldown).
+
+        Le cog retombe alors sur la date du dernier message enregistrée,
+        comparée au nouveau cooldown.
+        """
+        self._next.pop(guild_id, None)
+
+    def allow(self, guild_id, user_id, now=None):
+        """Retourne False si l'utilisateur est encore en cooldown."""
+        if now is None:
+            now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        users = self._next.get(guild_id)
+        if users is not None:
+            eligible_at = users.get(user_id)
+            if eligible_at is not None and now < eligible_at:
+                self.rejected += 1
+                return False
+        self.passed += 1
+        return True
+
+    def consume(self, guild_id, user_id, cooldown, now=None):
+        """Démarre le cooldown d'un utilisateur qui vient de gagner de l'XP."""
+        if now is None:
+            now = time.monotonic()
+        self.block_until(guild_id, user_id, now + cooldown)
+
+    def block_until(self, guild_id, user_id, eligible_at):
+        """Bloque un utilisateur jusqu'à l'instant monotone ``eligible_at``."""
+        users = self._next.get(guild_id)
+        if users is None:
+            users = self._next[guild_id] = {}
+        users[user_id] = eligible_at
+
+        bucket = int(eligible_at // self.bucket_width)
+        entries = self._buckets.get(bucket)
+        if entries is None:
+            entries = self._buckets[bucket] = []
+        entries.append((guild_id, user_id))
+
+    def sweep(self, now=None):
+        """Supprime les entrées dont le cooldown est terminé."""
+        if now is None:
+            now = time.monotonic()
+        current = int(now // self.bucket_width)
+
+        for bucket in [b for b in self._buckets if b < current]:
+            for guild_id, user_id in self._buckets.pop(bucket):
+                users = self._next.get(guild_id)
+                if users is None:
+                    continue
+                eligible_at = users.get(user_id)
+                # L'entrée a pu être repoussée depuis : on ne retire que les expirées
+                if eligible_at is not None and eligible_at <= now:
+                    del users[user_id]
+                    self.swept += 1
+                    if not users:
+                        del self._next[guild_id]
+
+        self._next_sweep = (current + 1) * self.bucket_width
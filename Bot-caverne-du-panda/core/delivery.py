@@ -0,0 +1,229 @@
+import asyncio
+import os
+import random
+import time
+import aiohttp
+
+# Réglages par défaut, modifiables via les variables d'environnement
+DEFAULT_WORKERS = int(os.environ.get("BROADCAST_WORKERS", 4))
+DEFAULT_RATE = float(os.environ.get("BROADCAST_RATE", 4))
+DEFAULT_MAX_RATE = float(os.environ.get("BROADCAST_MAX_RATE", 8))
+
+# Codes d'erreur Discord définitifs pour un DM
+DM_CLOSED_CODES = {50007}         # Cannot send messages to this user
+UNKNOWN_TARGET_CODES = {10007, 10013}  # Unknown member / Unknown user
+
+# Issues possibles d'un envoi
+SENT = "sent"
+BLOCKED = "blocked"   # DMs fermés : inutile de réessayer
+FAILED = "failed"     # erreur définitive ou trop de tentatives
+
+
+class AdaptiveTokenBucket:
+    """Seau à jetons qui s'adapte aux réponses 429.
+
+    Chaque réponse « rate limited » suspend tous les envois pendant le
+    ``retry_after`` indiqué et divise le débit par deux ; chaque succès le
+    fait remonter doucement jusqu'à ``max_rate`` (AIMD).
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, max_rate=DEFAULT_MAX_RATE, min_rate=0.5, increase=0.1):
+        self.rate = rate
+        self.max_rate = max(max_rate, rate)
+        self.min_rate = min_rate
+        self.increase = increase
+        self.capacity = max(1.0, rate)
+
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Attend qu'un envoi soit autorisé."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_rate_limited(self, retry_after):
+        now = time.monotonic()
+        # Plusieurs workers reçoivent souvent le même 429 : on ne ralentit
+        # qu'une fois par pause
+        if now >= self.blocked_until:
+            self.rate = max(self.min_rate, self.rate / 2)
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.tokens = 0.0
+
+
+def classify_error(error):
+    """Classe une exception d'envoi.
+
+    Retourne ``("rate_limited", retry_after)``, ``("transient", None)``,
+    ``(BLOCKED, None)`` ou ``(FAILED, None)``. Se base uniquement sur les
+    attributs ``status``, ``code`` et ``retry_after`` pour pouvoir être
+    testé avec de fausses exceptions.
+    """
+    status = getattr(error, "status", None)
+    code = getattr(error, "code", None)
+    retry_after = getattr(error, "retry_after", None)
+
+    if status == 429 or retry_after is not None:
+        return "rate_limited", float(retry_after or 1.0)
+    if code in DM_CLOSED_CODES or status == 403:
+        return BLOCKED, None
+    if code in UNKNOWN_TARGET_CODES or status == 404:
+        return FAILED, None
+    if status is not None and status >= 500:
+        return "transient", None
+    if isinstance(error, (asyncio.TimeoutError, OSError, aiohttp.ClientError)):
+        return "transient", None
+    return FAILED, None
+
+
+class DeliveryReport:
+    """Compteurs d'un envoi en masse."""
+
+    def __init__(self):
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def duration(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self):
+        """Messages traités par seconde."""
+        return self.done / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "sent": self.sent,
+            "blocked": self.blocked,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "duration": round(self.duration, 3),
+            "throughput": round(self.throughput, 3),
+        }
+
+
+class DeliveryEngine:
+    """Envoie un message à une liste de destinataires avec un pool de workers.
+
+    ``send`` est une coroutine appelée avec chaque destinataire (par exemple
+    ``lambda member: member.send(embed=embed)``). Les erreurs passagères
+    sont réessayées avec un backoff exponentiel, les 429 ralentissent le
+    seau à jetons commun, les DMs fermés sont comptés à part.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, bucket=None, max_retries=3, base_backoff=1.0, max_rate_limits=10):
+        self.workers = workers
+        self.bucket = bucket or AdaptiveTokenBucket()
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_rate_limits = max_rate_limits
+
+    async def deliver(self, recipient, send, report):
+        """Envoie à un destinataire et retourne l'issue (SENT, BLOCKED ou FAILED)."""
+        attempts = 0
+        rate_limits = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await send(recipient)
+                self.bucket.on_success()
+                return SENT
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                kind, retry_after = classify_error(e)
+
+            if kind == "rate_limited":
+                report.rate_limited += 1
+                rate_limits += 1
+                self.bucket.on_rate_limited(retry_after)
+                if rate_limits > self.max_rate_limits:
+                    return FAILED
+            elif kind == "transient":
+                attempts += 1
+                if attempts > self.max_retries:
+                    return FAILED
+                delay = self.base_backoff * 2 ** (attempts - 1)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            else:
+                return kind
+            report.retries += 1
+
+    async def run(self, recipients, send, on_result=None, report=None, stop=None):
+        """Envoie à tous les destinataires (itérable, éventuellement asynchrone).
+
+        ``on_result(recipient, issue, report)`` est appelé après chaque
+        destinataire, par exemple pour afficher la progression. Dès que
+        ``stop()`` retourne vrai, plus aucun envoi ne démarre : les
+        destinataires restants sont ignorés sans être comptés.
+        """
+        report = report or DeliveryReport()
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def producer():
+            if hasattr(recipients, "__aiter__"):
+                async for recipient in recipients:
+                    if stop is not None and stop():
+                        break
+                    await queue.put(recipient)
+            else:
+                for recipient in recipients:
+                    if stop is not None and stop():
+                        break
+                    await queue.put(recipient)
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def worker():
+            while True:
+                recipient = await queue.get()
+                if recipient is None:
+                    return
+                if stop is not None and stop():
+                    continue
+                outcome = await self.deliver(recipient, send, report)
+                if outcome == SENT:
+                    report.sent += 1
+                elif outcome == BLOCKED:
+                    report.blocked += 1
+                else:
+                    report.failed += 1
+                if on_result is not None:
+                    await on_result(recipient, outcome, report)
+
+        tasks = [asyncio.create_task(producer())]
+        tasks += [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            report.finished_at = time.monotonic()
+        return report
@@ -0,0 +1,362 @@
+import json
+import logging
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from core.backends import DATA_DIR, STORAGE_BACKEND, SqliteBackend, get_backend, load_legacy_history
+from core.cluster import owns
+from core.storage import run_in_storage_thread
+
+log = logging.getLogger(__name__)
+
+# Rotation de l'historique, modifiable via les variables d'environnement
+HISTORY_MAX_ENTRIES = int(os.environ.get("HISTORY_MAX_ENTRIES", 500))
+HISTORY_MAX_AGE_DAYS = float(os.environ.get("HISTORY_MAX_AGE_DAYS", 0))  # 0 = pas de limite d'âge
+
+# Taille d'une entrée du fichier d'index (un offset 64 bits)
+OFFSET_SIZE = array("q").itemsize
+
+
+def _parse_time(timestamp):
+    moment = datetime.fromisoformat(timestamp)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class JsonlHistory:
+    """Historique des broadcasts en journal JSON Lines, un fichier par serveur.
+
+    ``data/broadcast_history/<guild_id>.jsonl`` reçoit une ligne par
+    broadcast, uniquement en ajout. ``<guild_id>.idx`` contient l'offset de
+    chaque ligne (entiers 64 bits) : lire une page ne coûte que quelques
+    ``seek``, quelle que soit la taille du journal. Les entrées trop
+    anciennes ou en surnombre sont déplacées dans ``<guild_id>.archive.jsonl``
+    lors du compactage.
+    """
+
+    name = "jsonl"
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(DATA_DIR, "broadcast_history")
+        self._lock = threading.Lock()
+        self._checked = set()  # serveurs dont l'index a été vérifié
+
+    def log_path(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.jsonl")
+
+    def index_path(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.idx")
+
+    def archive_path(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.archive.jsonl")
+
+    # ---- MIGRATION ----
+    def migrate(self):
+        """Importe une seule fois l'ancien historique stocké avec les données du cog."""
+        marker = os.path.join(self.directory, ".migrated")
+        if os.path.exists(marker):
+            return False
+
+        legacy = load_legacy_history()
+        with self._lock:
+            for guild_id, entries in legacy.items():
+                if os.path.exists(self.log_path(guild_id)):
+                    continue
+                for entry in entries:
+                    self._append(guild_id, entry)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(marker, "w", encoding="utf-8") as f:
+                f.write("1\n")
+        if legacy:
+            log.info("✅ Historique des broadcasts converti en journal (%d serveur(s))", len(legacy))
+        return True
+
+    # ---- INDEX ----
+    def _read_offsets(self, guild_id, start, stop):
+        offsets = array("q")
+        with open(self.index_path(guild_id), "rb") as f:
+            f.seek(start * OFFSET_SIZE)
+            offsets.frombytes(f.read((stop - start) * OFFSET_SIZE))
+        return offsets
+
+    def _count(self, guild_id):
+        try:
+            return os.path.getsize(self.index_path(guild_id)) // OFFSET_SIZE
+        except OSError:
+            return 0
+
+    def _check(self, guild_id):
+        """Vérifie (une fois par serveur) que l'index couvre tout le journal.
+
+        Après un crash entre l'écriture d'une ligne et celle de son offset,
+        ou au milieu d'un compactage, l'index est reconstruit.
+        """
+        if guild_id in self._checked:
+            return
+        self._checked.add(guild_id)
+
+        log_path = self.log_path(guild_id)
+        if not os.path.exists(log_path):
+            return
+        log_size = os.path.getsize(log_path)
+        index_path = self.index_path(guild_id)
+        index_size = os.path.getsize(index_path) if os.path.exists(index_path) else -1
+
+        if index_size < 0 or index_size % OFFSET_SIZE:
+            index_ok = False
+        elif index_size == 0:
+            index_ok = log_size == 0
+        else:
+            count = index_size // OFFSET_SIZE
+            first = self._read_offsets(guild_id, 0, 1)[0]
+            last = self._read_offsets(guild_id, count - 1, count)[0]
+            with open(log_path, "rb") as f:
+                f.seek(max(0, last - 1))
+                before = f.read(1) if last else b"\n"
+                line = f.readline()
+            index_ok = first == 0 and before == b"\n" and line.endswith(b"\n") and last + len(line) == log_size
+
+        if not index_ok:
+            log.warning("⚠️ Index de l'historique %s incohérent, reconstruction", guild_id)
+            self._rebuild_index(guild_id)
+
+    def _rebuild_index(self, guild_id):
+        offsets = array("q")
+        position = 0
+        with open(self.log_path(guild_id), "r+b") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Dernière ligne interrompue en pleine écriture : on la retire
+                    f.truncate(position)
+                    break
+                offsets.append(position)
+                position += len(line)
+        with open(self.index_path(guild_id), "wb") as f:
+            f.write(offsets.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ---- ÉCRITURE ----
+    def _append(self, guild_id, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        self._check(guild_id)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.log_path(guild_id), "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_path(guild_id), "ab") as f:
+            f.write(array("q", [offset]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return self._count(guild_id)
+
+    def append(self, guild_id, entry):
+        """Ajoute une entrée puis compacte si le journal dépasse sa taille maximale."""
+        guild_id = str(guild_id)
+        with self._lock:
+            count = self._append(guild_id, entry)
+            # Une marge de 10 % évite de réécrire le journal à chaque ajout
+            if HISTORY_MAX_ENTRIES and count > HISTORY_MAX_ENTRIES + max(1, HISTORY_MAX_ENTRIES // 10):
+                self._compact(guild_id, HISTORY_MAX_ENTRIES, None)
+        return True
+
+    # ---- LECTURE ----
+    def count(self, guild_id):
+        guild_id = str(guild_id)
+        with self._lock:
+            self._check(guild_id)
+            return self._count(guild_id)
+
+    def _read_range(self, guild_id, start, stop):
+        """Entrées ``[start, stop)`` dans l'ordre chronologique."""
+        if start >= stop:
+            return []
+        offsets = self._read_offsets(guild_id, start, stop)
+        entries = []
+        with open(self.log_path(guild_id), "rb") as f:
+            f.seek(offsets[0])
+            for _ in offsets:
+                entries.append(json.loads(f.readline()))
+        return entries
+
+    def page(self, guild_id, page, per_page):
+        """Page ``page`` (0 = la plus récente), entrées de la plus récente à la plus ancienne."""
+        guild_id = str(guild_id)
+        with self._lock:
+            self._check(guild_id)
+            count = self._count(guild_id)
+            stop = max(0, count - page * per_page)
+            start = max(0, stop - per_page)
+            entries = self._read_range(guild_id, start, stop)
+        entries.reverse()
+        return entries, count
+
+    # ---- ROTATION ----
+    def _first_recent(self, guild_id, count, cutoff):
+        """Index de la première entrée postérieure à ``cutoff`` (recherche dichotomique)."""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            (entry,) = self._read_range(guild_id, middle, middle + 1)
+            if _parse_time(entry["timestamp"]) < cutoff:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _compact(self, guild_id, max_entries, max_age_days):
+        self._check(guild_id)
+        count = self._count(guild_id)
+        keep_from = 0
+        if max_entries:
+            keep_from = max(keep_from, count - max_entries)
+        if max_age_days:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+            keep_from = max(keep_from, self._first_recent(guild_id, count, cutoff))
+        if keep_from == 0:
+            return 0
+
+        log_path = self.log_path(guild_id)
+        offsets = self._read_offsets(guild_id, 0, count)
+        cut = offsets[keep_from] if keep_from < count else os.path.getsize(log_path)
+        with open(log_path, "rb") as f:
+            dropped = f.read(cut)
+            kept = f.read()
+
+        # Les entrées retirées sont conservées dans l'archive
+        with open(self.archive_path(guild_id), "ab") as f:
+            f.write(dropped)
+            f.flush()
+            os.fsync(f.fileno())
+
+        new_offsets = array("q", (offset - cut for offset in offsets[keep_from:]))
+        for path, content in ((log_path, kept), (self.index_path(guild_id), new_offsets.tobytes())):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        return keep_from
+
+    def compact(self, guild_id, max_entries=HISTORY_MAX_ENTRIES, max_age_days=HISTORY_MAX_AGE_DAYS):
+        """Archive les entrées en surnombre ou trop anciennes ; retourne leur nombre."""
+        with self._lock:
+            return self._compact(str(guild_id), max_entries, max_age_days)
+
+    def guild_ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [
+            filename[:-6] for filename in os.listdir(self.directory)
+            if filename.endswith(".jsonl") and not filename.endswith(".archive.jsonl")
+        ]
+
+
+class SqliteHistory:
+    """Même interface que ``JsonlHistory`` sur la table ``broadcast_history``.
+
+    L'index ``(guild_id, id)`` sert à la fois aux ajouts et à la pagination.
+    Le compactage supprime les lignes (pas d'archive).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def migrate(self):
+        # L'import des fichiers JSON est déjà fait par SqliteBackend
+        return False
+
+    def append(self, guild_id, entry):
+        backend = self.backend
+        with backend._lock, backend.conn:
+            backend.conn.execute(
+                "INSERT INTO broadcast_history "
+                "(guild_id, author, titre, description, success, failed, status, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (int(guild_id), int(entry["author"]), entry["titre"], entry["description"],
+                 entry["success"], entry["failed"], entry.get("status", "done"), entry["timestamp"])
+            )
+        if HISTORY_MAX_ENTRIES:
+            self.compact(guild_id, HISTORY_MAX_ENTRIES, None)
+        return True
+
+    def count(self, guild_id):
+        with self.backend._lock:
+            (count,) = self.backend.conn.execute(
+                "SELECT COUNT(*) FROM broadcast_history WHERE guild_id = ?", (int(guild_id),)
+            ).fetchone()
+        return count
+
+    def page(self, guild_id, page, per_page):
+        with self.backend._lock:
+            rows = self.backend.conn.execute(
+                "SELECT * FROM broadcast_history WHERE guild_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (int(guild_id), per_page, page * per_page)
+            ).fetchall()
+        return [SqliteBackend.history_entry(row) for row in rows], self.count(guild_id)
+
+    def compact(self, guild_id, max_entries=HISTORY_MAX_ENTRIES, max_age_days=HISTORY_MAX_AGE_DAYS):
+        backend = self.backend
+        removed = 0
+        with backend._lock, backend.conn:
+            if max_entries:
+                removed += backend.conn.execute(
+                    "DELETE FROM broadcast_history WHERE guild_id = ? AND id <= ("
+                    "SELECT id FROM broadcast_history WHERE guild_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (int(guild_id), int(guild_id), max_entries)
+                ).rowcount
+            if max_age_days:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+                removed += backend.conn.execute(
+                    "DELETE FROM broadcast_history WHERE guild_id = ? AND timestamp < ?",
+                    (int(guild_id), cutoff.isoformat())
+                ).rowcount
+        return removed
+
+    def guild_ids(self):
+        with self.backend._lock:
+            rows = self.backend.conn.execute("SELECT DISTINCT guild_id FROM broadcast_history").fetchall()
+        return [str(row[0]) for row in rows]
+
+
+class BroadcastHistory:
+    """Accès asynchrone à l'historique : tout le travail disque passe par le pool de stockage."""
+
+    def __init__(self, log=None):
+        self.log = log
+
+    def _resolve(self):
+        if self.log is None:
+            self.log = SqliteHistory(get_backend()) if STORAGE_BACKEND == "sqlite" else JsonlHistory()
+        return self.log
+
+    async def load(self):
+        log = await run_in_storage_thread(self._resolve)
+        await run_in_storage_thread(log.migrate)
+
+    async def append(self, guild_id, entry):
+        return await run_in_storage_thread(self.log.append, guild_id, entry)
+
+    async def count(self, guild_id):
+        return await run_in_storage_thread(self.log.count, guild_id)
+
+    async def page(self, guild_id, page, per_page=5):
+        """Retourne ``(entrées, total)`` ; page 0 = les plus récentes."""
+        return await run_in_storage_thread(self.log.page, guild_id, page, per_page)
+
+    async def compact(self, guild_id, max_entries=HISTORY_MAX_ENTRIES, max_age_days=HISTORY_MAX_AGE_DAYS):
+        return await run_in_storage_thread(self.log.compact, guild_id, max_entries, max_age_days)
+
+    async def compact_all(self):
+        """Applique la rotation à tous les serveurs de ce processus (au démarrage)."""
+        removed = 0
+        for guild_id in await run_in_storage_thread(self.log.guild_ids):
+            if not owns(guild_id):
+                continue
+            removed += await self.compact(guild_id)
+        return removed
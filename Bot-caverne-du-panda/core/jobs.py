@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from cogs.utils import Utils
+from core.backends import DATA_DIR
+from core.storage import run_in_storage_thread
+
+log = logging.getLogger(__name__)
+
+# Statuts d'un job de broadcast
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+
+
+class BroadcastJob:
+    """Un broadcast durable : destinataires figés et curseur de progression.
+
+    ``cursor`` est l'index du premier destinataire pas encore traité ;
+    ``done_ahead`` contient les index déjà traités au-delà du curseur (les
+    workers terminent dans le désordre). Reprendre un job ne renvoie donc
+    jamais un message déjà enregistré comme traité.
+    """
+
+    def __init__(self, guild_id, author_id, titre, description, embed, recipients, job_id=None,
+                 status=RUNNING, cursor=0, done_ahead=None, sent=0, blocked=0, failed=0, created_at=None):
+        self.id = job_id or uuid.uuid4().hex[:8]
+        self.guild_id = int(guild_id)
+        self.author_id = int(author_id)
+        self.titre = titre
+        self.description = description
+        self.embed = embed  # embed.to_dict()
+        self.recipients = recipients  # ids des membres, dans l'ordre d'envoi
+        self.status = status
+        self.cursor = cursor
+        self.done_ahead = set(done_ahead or ())
+        self.sent = sent
+        self.blocked = blocked
+        self.failed = failed
+        self.created_at = created_at
+
+    @property
+    def total(self):
+        return len(self.recipients)
+
+    @property
+    def processed(self):
+        return self.cursor + len(self.done_ahead)
+
+    def pending(self):
+        """Index des destinataires restant à traiter."""
+        for index in range(self.cursor, self.total):
+            if index not in self.done_ahead:
+                yield index
+
+    def mark_done(self, index, outcome):
+        """Enregistre le résultat d'un destinataire et avance le curseur."""
+        if outcome == "sent":
+            self.sent += 1
+        elif outcome == "blocked":
+            self.blocked += 1
+        else:
+            self.failed += 1
+
+        self.done_ahead.add(index)
+        while self.cursor in self.done_ahead:
+            self.done_ahead.remove(self.cursor)
+            self.cursor += 1
+
+    def state(self):
+        """Partie du job qui change pendant l'envoi (sauvegardée par lots)."""
+        return {
+            "id": self.id,
+            "guild_id": self.guild_id,
+            "author_id": self.author_id,
+            "titre": self.titre,
+            "description": self.description,
+            "embed": self.embed,
+            "status": self.status,
+            "cursor": self.cursor,
+            "done_ahead": sorted(self.done_ahead),
+            "sent": self.sent,
+            "blocked": self.blocked,
+            "failed": self.failed,
+            "created_at": self.created_at,
+            "total": self.total,
+        }
+
+
+class JobStore:
+    """Jobs de broadcast sur disque : ``data/broadcast_jobs/<id>.json``.
+
+    La liste des destinataires, qui ne change jamais, est écrite une seule
+    fois à part (``<id>.recipients.json``) ; les points de contrôle ne
+    réécrivent que le petit fichier d'état. Les écritures d'un même job
+    passent l'une après l'autre : un état plus ancien ne peut pas écraser
+    un état plus récent dans le pool de stockage.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(DATA_DIR, "broadcast_jobs")
+        self._locks = {}  # job_id -> asyncio.Lock des écritures de ce job
+
+    def _lock(self, job_id):
+        lock = self._locks.get(job_id)
+        if lock is None:
+            lock = self._locks[job_id] = asyncio.Lock()
+        return lock
+
+    def _state_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _recipients_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.recipients.json")
+
+    async def create(self, job):
+        await run_in_storage_thread(Utils.save_text, self._recipients_path(job.id), json.dumps(job.recipients))
+        await self.checkpoint(job)
+
+    async def checkpoint(self, job):
+        """Sauvegarde l'état (curseur, compteurs, statut) d'un job."""
+        lock = self._lock(job.id)
+        async with lock:
+            if self._locks.get(job.id) is not lock:
+                return False  # job supprimé pendant l'attente : ne pas recréer son fichier
+            # État capturé une fois le tour venu : toujours le plus récent
+            return await run_in_storage_thread(Utils.save_json, self._state_path(job.id), job.state())
+
+    async def delete(self, job):
+        async with self._lock(job.id):
+            await run_in_storage_thread(self._delete, job.id)
+            del self._locks[job.id]
+
+    def _delete(self, job_id):
+        for path in (self._state_path(job_id), self._recipients_path(job_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def load_all(self):
+        """Recharge tous les jobs encore présents sur disque."""
+        return await run_in_storage_thread(self._load_all)
+
+    def _load_all(self):
+        if not os.path.isdir(self.directory):
+            return []
+        jobs = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json") or filename.endswith(".recipients.json"):
+                continue
+            state = Utils.load_json(os.path.join(self.directory, filename))
+            if not state:
+                continue
+            recipients = Utils.load_json(self._recipients_path(state["id"]))
+            if not isinstance(recipients, list):
+                log.error("❌ Destinataires introuvables pour le job %s, ignoré", state["id"])
+                continue
+            jobs.append(BroadcastJob(
+                state["guild_id"], state["author_id"], state["titre"], state["description"],
+                state["embed"], recipients, job_id=state["id"], status=state["status"],
+                cursor=state["cursor"], done_ahead=state["done_ahead"], sent=state["sent"],
+                blocked=state["blocked"], failed=state["failed"], created_at=state["created_at"],
+            ))
+        return jobs
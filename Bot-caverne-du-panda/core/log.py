@@ -0,0 +1,95 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+# Niveau global (DEBUG, INFO, WARNING...) et format de sortie (text ou json)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# discord.py est très bavard en DEBUG : il a son propre niveau
+DISCORD_LOG_LEVEL = os.environ.get("DISCORD_LOG_LEVEL", "WARNING").upper()
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+# En mode cluster, chaque ligne indique le processus qui l'a écrite
+CLUSTER_ID = os.environ.get("CLUSTER_ID")
+if CLUSTER_ID is not None:
+    TEXT_FORMAT = f"%(asctime)s %(levelname)-7s [cluster {CLUSTER_ID}] %(name)s: %(message)s"
+
+_listener = None
+
+
+class LoopQueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` qui ne résout que le message dans le thread appelant.
+
+    Horodatage, trace d'exception et mise en forme (texte ou JSON) sont
+    laissés au thread du listener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par message, pour les agrégateurs de logs."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if CLUSTER_ID is not None:
+            entry["cluster"] = int(CLUSTER_ID)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, fmt=None, stream=None):
+    """Configure la journalisation de tout le bot.
+
+    Les handlers des modules déposent seulement les messages dans une file
+    (``QueueHandler``) ; un ``QueueListener`` les formate et les écrit
+    depuis son propre thread, jamais dans la boucle asyncio. Idempotent.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = level or LOG_LEVEL
+    fmt = fmt or LOG_FORMAT
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LoopQueueHandler(log_queue))
+    root.setLevel(level)
+    logging.getLogger("discord").setLevel(DISCORD_LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Vide la file et arrête le thread d'écriture."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,181 @@
+import functools
+import logging
+import os
+import time
+from bisect import bisect_left
+from discord import app_commands
+
+log = logging.getLogger(__name__)
+
+# Endpoint HTTP au format Prometheus, désactivé sans METRICS_PORT
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+
+# Bornes supérieures (secondes) des seaux des histogrammes de latence
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Compteurs et histogramme de latence d'un handler.
+
+    Un appel coûte une recherche dichotomique et quelques additions :
+    assez peu pour rester actif en permanence.
+    """
+
+    __slots__ = ("buckets", "count", "errors", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # le dernier seau est +Inf
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Estimation d'un quantile : borne supérieure du seau qui le contient."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Registre des mesures, indexé par ``(type, nom)``.
+
+    Types utilisés : ``listener`` (événements Discord), ``command``
+    (commandes slash) et ``flush`` (écritures du stockage).
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.started = time.time()
+
+    def observe(self, kind, name, seconds, error=False):
+        key = (kind, name)
+        histogram = self.series.get(key)
+        if histogram is None:
+            histogram = self.series[key] = Histogram()
+        histogram.observe(seconds, error)
+
+    def by_kind(self, kind):
+        """``[(nom, histogramme)]`` d'un type, du plus coûteux au moins coûteux."""
+        series = [(name, histogram) for (k, name), histogram in self.series.items() if k == kind]
+        return sorted(series, key=lambda item: item[1].total, reverse=True)
+
+    def render_prometheus(self):
+        """Toutes les mesures au format texte de Prometheus."""
+        lines = [
+            "# HELP bot_handler_duration_seconds Durée des handlers du bot.",
+            "# TYPE bot_handler_duration_seconds histogram",
+        ]
+        for (kind, name), histogram in sorted(self.series.items()):
+            labels = f'kind="{kind}",name="{_escape(name)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.buckets):
+                cumulative += count
+                lines.append(f'bot_handler_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'bot_handler_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"bot_handler_duration_seconds_sum{{{labels}}} {histogram.total}")
+            lines.append(f"bot_handler_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        lines.append("# HELP bot_handler_errors_total Appels terminés par une exception.")
+        lines.append("# TYPE bot_handler_errors_total counter")
+        for (kind, name), histogram in sorted(self.series.items()):
+            lines.append(f'bot_handler_errors_total{{kind="{kind}",name="{_escape(name)}"}} {histogram.errors}')
+
+        lines.append("# HELP bot_uptime_seconds Temps écoulé depuis le démarrage.")
+        lines.append("# TYPE bot_uptime_seconds gauge")
+        lines.append(f"bot_uptime_seconds {time.time() - self.started}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Registre partagé par tout le processus
+metrics = Metrics()
+
+
+def timed(kind):
+    """Décorateur qui mesure une coroutine sous ``Classe.méthode``.
+
+    À placer sous ``@commands.Cog.listener()`` : le nom de la fonction
+    (donc de l'événement) est conservé.
+    """
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                metrics.observe(kind, name, time.perf_counter() - start, error)
+
+        return wrapper
+    return decorator
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Arbre de commandes qui mesure chaque commande slash.
+
+    Le départ est noté dans ``interaction.extras`` avant l'exécution ; la
+    fin est enregistrée par ``command_completed`` (événement
+    ``on_app_command_completion``) ou par ``on_error``.
+    """
+
+    async def interaction_check(self, interaction):
+        interaction.extras["metrics_start"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction, error):
+        command_completed(interaction, interaction.command, error=True)
+        await super().on_error(interaction, error)
+
+
+def command_completed(interaction, command, error=False):
+    start = interaction.extras.pop("metrics_start", None)
+    if start is None:
+        return
+    name = command.qualified_name if command is not None else "inconnue"
+    metrics.observe("command", name, time.perf_counter() - start, error)
+
+
+async def start_http_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Expose ``/metrics`` en HTTP local. Retourne le runner aiohttp (à nettoyer)."""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("📈 Métriques exposées sur http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,77 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class RankIndex:
+    """Classement d'un serveur tenu trié en permanence.
+
+    Les entrées sont des tuples ``(-score, user_id)`` dans une liste triée :
+    le rang d'un utilisateur s'obtient par recherche dichotomique, et un
+    changement de score ne déplace qu'une seule entrée. Les cogs n'y
+    gardent que les membres présents (retirés au départ, remis au retour) :
+    une page se lit directement par position.
+    """
+
+    def __init__(self, scores=None):
+        self._scores = dict(scores or {})  # user_id -> score
+        self._entries = sorted((-score, user_id) for user_id, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return user_id in self._scores
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def update(self, user_id, score):
+        """Enregistre le nouveau score d'un utilisateur."""
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._remove_entry(old, user_id)
+        self._scores[user_id] = score
+        insort(self._entries, (-score, user_id))
+
+    def remove(self, user_id):
+        """Retire un utilisateur du classement."""
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            self._remove_entry(old, user_id)
+
+    def _remove_entry(self, score, user_id):
+        entry = (-score, user_id)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def rank(self, user_id):
+        """Rang (à partir de 1) d'un utilisateur, ou ``None`` s'il n'est pas classé."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._entries, (-score, user_id)) + 1
+
+    def count_at_least(self, score):
+        """Nombre d'utilisateurs dont le score est supérieur ou égal à ``score``."""
+        return bisect_right(self._entries, -score, key=lambda entry: entry[0])
+
+    def range(self, start, count):
+        """Entrées ``(user_id, score)`` à partir du rang ``start`` (0 = premier)."""
+        return [(user_id, -neg) for neg, user_id in self._entries[start:start + count]]
+
+    def iter_from(self, start=0):
+        """Parcourt le classement à partir du rang ``start`` (0 = premier)."""
+        for i in range(start, len(self._entries)):
+            neg, user_id = self._entries[i]
+            yield i + 1, user_id, -neg
+
+
+def is_present(guild, user_id):
+    """Vrai si ``user_id`` est membre de ``guild``.
+
+    Sans liste des membres (serveur inconnu de ce processus, ou membres pas
+    encore reçus), tout le monde est considéré comme présent.
+    """
+    return guild is None or not guild.chunked or guild.get_member(user_id) is not None
@@ -0,0 +1,111 @@
+import sys
+
+
+class Record:
+    """Fiche utilisateur compacte (``__slots__``) à la place d'un dict.
+
+    Les sous-classes déclarent leurs champs et leurs valeurs par défaut dans
+    ``FIELDS``. Les clés inconnues lues sur disque sont gardées dans
+    ``extra`` pour que la conversion reste sans perte.
+    """
+
+    __slots__ = ("extra",)
+    FIELDS = {}
+
+    def __init__(self, **values):
+        for name, default in self.FIELDS.items():
+            setattr(self, name, values.pop(name, default))
+        self.extra = values or None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Construit une fiche depuis le format JSON stocké sur disque."""
+        return cls(**data)
+
+    def to_dict(self):
+        """Retourne la fiche au format JSON stocké sur disque."""
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class XPUser(Record):
+    """Fiche XP d'un utilisateur sur un serveur."""
+
+    __slots__ = ("xp", "level", "last_message")
+    FIELDS = {"xp": 0, "level": 1, "last_message": 0}
+
+
+class InviteUser(Record):
+    """Compteurs d'invitations d'un utilisateur sur un serveur.
+
+    ``invited_by`` et ``invite_code`` indiquent qui a invité ce membre
+    (index membre -> inviteur) ; ``departed`` vaut vrai tant qu'il est
+    compté dans les départs de son inviteur.
+    """
+
+    __slots__ = ("invites", "left", "invited_by", "invite_code", "departed")
+    FIELDS = {"invites": 0, "left": 0, "invited_by": None, "invite_code": None, "departed": False}
+
+
+def decode_users(users, record_type):
+    """Format disque (clés texte, dicts) -> mémoire (clés entières, fiches)."""
+    return {int(user_id): record_type.from_dict(data) for user_id, data in users.items()}
+
+
+def encode_users(users, user_ids=None):
+    """Format mémoire -> format disque, éventuellement pour certains utilisateurs seulement."""
+    if user_ids is None:
+        user_ids = users.keys()
+    return {str(user_id): users[user_id].to_dict() for user_id in user_ids if user_id in users}
+
+
+def _is_shared(obj):
+    """Objets partagés par tout l'interpréteur : ils ne coûtent rien à une fiche."""
+    if obj is None or isinstance(obj, bool):
+        return True
+    if type(obj) is int:
+        return -5 <= obj <= 256  # petits entiers préalloués par CPython
+    if type(obj) is str:
+        # sys.intern d'une copie ne rend l'original que s'il est déjà interné
+        return sys.intern(obj[:1] + obj[1:]) is obj
+    return False
+
+
+def deep_sizeof(obj, seen=None):
+    """Taille mémoire approximative d'un objet et de tout ce qu'il référence.
+
+    Les petits entiers et les chaînes internées (noms de champs...) sont
+    partagés : ils ne sont pas comptés.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or _is_shared(obj):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    elif isinstance(obj, Record):
+        for name in ("extra", *obj.FIELDS):
+            size += deep_sizeof(getattr(obj, name), seen)
+    return size
+
+
+def entries_sizeof(entries):
+    """Taille mémoire de paires ``(identifiant, valeur)``, sans le conteneur qui les regroupe.
+
+    ``entries`` doit être une liste : les valeurs doivent rester en vie
+    pendant la mesure, sinon leurs ids pourraient être réutilisés.
+    """
+    seen = set()
+    return sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in entries)
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from cogs.utils import Utils
+from core.backends import DATA_DIR
+from core.storage import run_in_storage_thread
+
+log = logging.getLogger(__name__)
+
+# Fichier du dernier arbre de commandes synchronisé
+TREE_SYNC_PATH = os.path.join(DATA_DIR, "tree_sync.json")
+# FORCE_TREE_SYNC=1 synchronise même si l'arbre n'a pas changé
+FORCE_TREE_SYNC = os.environ.get("FORCE_TREE_SYNC", "") not in ("", "0")
+
+# Événements dont le premier traité marque la fin du démarrage à froid
+FIRST_EVENTS = ("on_message", "on_interaction", "on_member_join")
+
+
+def tree_hash(tree):
+    """Empreinte des commandes globales, calculée sur le payload envoyé à Discord."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: (c.get("type", 1), c["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+async def sync_tree(bot, force=FORCE_TREE_SYNC, path=TREE_SYNC_PATH):
+    """Synchronise l'arbre de commandes seulement s'il a changé depuis la dernière fois.
+
+    L'empreinte et l'id de l'application sont gardés sur disque : un
+    redémarrage avec les mêmes commandes ne refait pas l'appel global (lent
+    et limité). Retourne la liste synchronisée, ou ``None`` si rien n'a changé.
+    """
+    digest = tree_hash(bot.tree)
+    state = await run_in_storage_thread(Utils.load_json, path)
+    if not force and state.get("hash") == digest and state.get("application_id") == bot.application_id:
+        log.info("✅ Commandes slash inchangées, synchronisation ignorée")
+        return None
+
+    synced = await bot.tree.sync()
+    await run_in_storage_thread(Utils.save_json, path, {"hash": digest, "application_id": bot.application_id})
+    return synced
+
+
+class StartupProfile:
+    """Chronologie du démarrage : chargement des cogs, données, ready, premier événement."""
+
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.cogs = {}       # extension -> durée de load_extension (import, setup, cog_load)
+        self.ready = None    # secondes entre le démarrage et le premier on_ready
+        self.first_event = None
+        self._bot = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def cog_loaded(self, name, duration):
+        self.cogs[name] = duration
+
+    def report_cogs(self, bot):
+        """Journalise la durée de chargement de chaque cog et de ses données."""
+        for name, duration in sorted(self.cogs.items(), key=lambda item: item[1], reverse=True):
+            log.info("⏱️ %s : %.0f ms", name, duration * 1000)
+        for cog_name, cog in bot.cogs.items():
+            store = getattr(cog, "store", None)
+            if store is not None:
+                log.info("⏱️ Données de %s (%s) : %.0f ms", cog_name, store.namespace, store.load_duration * 1000)
+
+    def mark_ready(self, bot):
+        """À appeler dans on_ready : note le premier ready et guette le premier événement."""
+        if self.ready is not None:
+            return
+        self.ready = self.elapsed()
+        log.info("⏱️ Prêt %.2f s après le démarrage", self.ready)
+        self._bot = bot
+        for event in FIRST_EVENTS:
+            bot.add_listener(self._first_event, event)
+
+    async def _first_event(self, *args):
+        if self.first_event is not None:
+            return
+        self.first_event = self.elapsed()
+        log.info("⏱️ Premier événement traité %.2f s après le démarrage", self.first_event)
+        for event in FIRST_EVENTS:
+            self._bot.remove_listener(self._first_event, event)
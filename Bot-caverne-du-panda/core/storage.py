@@ -0,0 +1,497 @@
+import asyncio
+import copy
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from core.backends import get_backend
+from core.cluster import owns
+from core.metrics import metrics
+from core.records import decode_users, encode_users
+
+log = logging.getLogger(__name__)
+
+# Réglages par défaut, modifiables via les variables d'environnement
+DEFAULT_FLUSH_INTERVAL = float(os.environ.get("FLUSH_INTERVAL", 30))
+DEFAULT_FLUSH_MAX_DIRTY = int(os.environ.get("FLUSH_MAX_DIRTY", 500))
+STORAGE_WORKERS = int(os.environ.get("STORAGE_WORKERS", 2))
+
+# Budget du cache des serveurs (par store) ; 0 = illimité
+GUILD_CACHE_MAX_GUILDS = int(os.environ.get("GUILD_CACHE_MAX_GUILDS", 200))
+GUILD_CACHE_MAX_USERS = int(os.environ.get("GUILD_CACHE_MAX_USERS", 100_000))
+# Un serveur utilisé depuis moins longtemps n'est jamais évincé : un handler
+# peut encore tenir une référence à ses données entre deux await
+GUILD_CACHE_MIN_IDLE = float(os.environ.get("GUILD_CACHE_MIN_IDLE", 60))
+
+# Pool borné partagé par tous les stores : encodage JSON et accès disque
+# se font ici, jamais dans la boucle asyncio.
+_executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+
+
+async def run_in_storage_thread(func, *args):
+    """Exécute une fonction d'entrée/sortie bloquante dans le pool de stockage."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def snapshot_guild(doc, users=None):
+    """Copie d'un serveur, au format disque, qu'un autre thread peut sérialiser.
+
+    Avec ``users``, seuls ces utilisateurs sont copiés (écritures
+    partielles) ; sinon tous les utilisateurs du serveur le sont.
+    """
+    if isinstance(doc, list):
+        return [dict(entry) for entry in doc]
+
+    snapshot = {}
+    for key, value in doc.items():
+        if key == "users":
+            snapshot["users"] = encode_users(value, users)
+        else:
+            snapshot[key] = copy.deepcopy(value)
+    return snapshot
+
+
+class GuildCache(MutableMapping):
+    """Dictionnaire ``guild_id -> données`` dont seule une partie est en mémoire.
+
+    Les serveurs connus du backend mais absents de la mémoire sont chargés
+    au premier accès (``loader``) ; l'ordre des serveurs résidents suit le
+    dernier accès, pour évincer les moins récemment utilisés. ``in``,
+    ``len`` et l'itération portent sur tous les serveurs connus, sans rien
+    charger.
+    """
+
+    def __init__(self, loader=None):
+        self.loader = loader
+        self._resident = OrderedDict()  # guild_id -> données, du plus ancien au plus récent
+        self._last_used = {}            # guild_id -> time.monotonic() du dernier accès
+        self.known = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, guild_id):
+        doc = self._resident.get(guild_id)
+        if doc is not None:
+            self.hits += 1
+            self._resident.move_to_end(guild_id)
+            self._last_used[guild_id] = time.monotonic()
+            return doc
+        if guild_id not in self.known or self.loader is None:
+            raise KeyError(guild_id)
+        self.misses += 1
+        # Lecture synchrone : les handlers fréquents passent par prefetch()
+        return self.loader(guild_id)
+
+    def __setitem__(self, guild_id, doc):
+        self.known.add(guild_id)
+        self._resident[guild_id] = doc
+        self._resident.move_to_end(guild_id)
+        self._last_used[guild_id] = time.monotonic()
+
+    def __delitem__(self, guild_id):
+        self.known.remove(guild_id)
+        self._resident.pop(guild_id, None)
+        self._last_used.pop(guild_id, None)
+
+    def __contains__(self, guild_id):
+        return guild_id in self.known
+
+    def __iter__(self):
+        return iter(list(self.known))
+
+    def __len__(self):
+        return len(self.known)
+
+    def clear(self):
+        self._resident.clear()
+        self._last_used.clear()
+        self.known.clear()
+
+    def peek(self, guild_id):
+        """Données d'un serveur résident, ou ``None`` (sans chargement ni effet sur l'ordre)."""
+        return self._resident.get(guild_id)
+
+    def is_resident(self, guild_id):
+        return guild_id in self._resident
+
+    def resident(self):
+        """``[(guild_id, données)]`` des serveurs en mémoire, du moins au plus récent."""
+        return list(self._resident.items())
+
+    def idle_since(self, guild_id):
+        return self._last_used.get(guild_id, 0.0)
+
+    def evict(self, guild_id):
+        """Retire un serveur de la mémoire ; il reste connu et sera rechargé au besoin."""
+        self._resident.pop(guild_id, None)
+        self._last_used.pop(guild_id, None)
+        self.evictions += 1
+
+    def resident_users(self):
+        return sum(len(doc.get("users", ())) for doc in self._resident.values() if isinstance(doc, dict))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_evictions": self.evictions,
+            "cache_hit_ratio": self.hits / lookups if lookups else 1.0,
+            "resident_guilds": len(self._resident),
+            "known_guilds": len(self.known),
+            "resident_users": self.resident_users(),
+        }
+
+
+class WriteBehindStore:
+    """Données d'un cog gardées en mémoire et écrites sur disque en différé.
+
+    Les cogs modifient ``data`` directement puis appellent ``mark_dirty``.
+    Une tâche de fond transmet les changements au backend (JSON ou SQLite)
+    toutes les ``flush_interval`` secondes, ou plus tôt dès que
+    ``max_dirty`` entrées sont en attente. Lecture, encodage et écriture
+    tournent dans un pool de threads : seule la copie des serveurs modifiés
+    est faite dans la boucle.
+
+    Avec ``record_type``, les utilisateurs de chaque serveur sont gardés en
+    mémoire sous forme de fiches compactes indexées par id entier.
+
+    Si le backend sait charger un serveur seul (``lazy_loading``), ``data``
+    est un ``GuildCache`` borné par ``max_guilds`` serveurs et ``max_users``
+    fiches : au-delà, les serveurs propres les moins récemment utilisés
+    sont évincés après chaque écriture, puis rechargés à leur prochain
+    événement. Les cogs enregistrent dans ``on_load`` et ``on_evict`` ce
+    qu'ils dérivent des données d'un serveur (niveaux, classements...).
+
+    En mode cluster, seuls les serveurs de ce processus (``owns``) sont
+    écrits. Ceux des autres processus sont en lecture seule : ``prefetch``
+    relit à chaque fois leur dernière version écrite par leur propriétaire.
+    """
+
+    def __init__(self, namespace, record_type=None, backend=None, flush_interval=None, max_dirty=None,
+                 max_guilds=None, max_users=None, owns=owns):
+        self.namespace = namespace
+        self.record_type = record_type
+        self.backend = backend  # résolu dans load() si absent
+        self.flush_interval = flush_interval if flush_interval is not None else DEFAULT_FLUSH_INTERVAL
+        self.max_dirty = max_dirty if max_dirty is not None else DEFAULT_FLUSH_MAX_DIRTY
+        self.max_guilds = max_guilds if max_guilds is not None else GUILD_CACHE_MAX_GUILDS
+        self.max_users = max_users if max_users is not None else GUILD_CACHE_MAX_USERS
+        self.min_idle = GUILD_CACHE_MIN_IDLE
+        self.owns = owns
+
+        # Rempli par load() ; les cogs peuvent garder une référence à ce dict
+        self.data = GuildCache(self._load_guild)
+        self.lazy = False  # True quand le backend permet le chargement à la demande
+
+        # Appelés avec guild_id après chaque chargement / éviction d'un serveur
+        self.on_load = []
+        self.on_evict = []
+        self._loading = {}  # guild_id -> future du chargement en cours (prefetch)
+        self._inflight = set()  # serveurs dont une copie est en cours d'écriture
+
+        # guild_id -> ensemble des user_id (entiers) modifiés depuis la dernière écriture
+        self.dirty = {}
+        self.dirty_count = 0
+
+        # Statistiques d'écriture
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.flush_time_total = 0.0
+        self.last_flush_duration = 0.0
+        self.last_snapshot_duration = 0.0
+        self.coalesced_saves = 0
+        self.load_duration = 0.0
+
+        self._wakeup = None
+        self._task = None
+        self._closing = False
+        self._writing = None  # écriture en cours
+        self._queued = None   # écriture suivante, partagée par les appels concurrents
+
+    async def load(self):
+        """Charge les données depuis le backend sans bloquer la boucle."""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if self.backend is None:
+            # L'ouverture du backend (et une éventuelle migration) touche le disque
+            self.backend = await loop.run_in_executor(_executor, get_backend)
+        self.lazy = getattr(self.backend, "lazy_loading", False) and (self.max_guilds > 0 or self.max_users > 0)
+        self.data.clear()
+        if self.lazy:
+            # Seule la liste des serveurs est lue : leurs données viendront à la demande
+            self.data.known.update(await loop.run_in_executor(_executor, self.backend.guild_ids, self.namespace))
+        else:
+            data = await loop.run_in_executor(_executor, self._load_in_thread)
+            for guild_id, doc in data.items():
+                self.data[guild_id] = doc
+            for guild_id in data:
+                self._loaded(guild_id)
+        self.load_duration = time.perf_counter() - start
+        return self.data
+
+    def _load_in_thread(self):
+        data = self.backend.load(self.namespace)
+        if self.record_type is not None:
+            for guild_data in data.values():
+                guild_data["users"] = decode_users(guild_data.get("users", {}), self.record_type)
+        return data
+
+    def _fetch_guild(self, guild_id):
+        """Lit et décode un seul serveur (thread de stockage ou boucle)."""
+        doc = self.backend.load_guild(self.namespace, guild_id)
+        if doc is not None and self.record_type is not None:
+            doc["users"] = decode_users(doc.get("users", {}), self.record_type)
+        return doc
+
+    def _load_guild(self, guild_id):
+        """Chargement synchrone d'un serveur connu absent de la mémoire (défaut de cache)."""
+        doc = self._fetch_guild(guild_id)
+        return self._install(guild_id, doc)
+
+    def _install(self, guild_id, doc):
+        if doc is None:
+            # Serveur listé mais illisible ou vide : on repart de zéro, comme un nouveau serveur
+            self.data.known.discard(guild_id)
+            raise KeyError(guild_id)
+        self.data[guild_id] = doc
+        self._loaded(guild_id)
+        # Le serveur qu'on vient de charger va être utilisé : jamais évincé ici
+        self._evict(keep=guild_id)
+        return doc
+
+    def _loaded(self, guild_id):
+        for callback in self.on_load:
+            try:
+                callback(guild_id)
+            except Exception:
+                log.exception("❌ Erreur après le chargement du serveur %s (%s)", guild_id, self.namespace)
+
+    async def prefetch(self, guild_id):
+        """Charge un serveur évincé dans le pool de stockage, avant qu'un handler y accède.
+
+        Sans effet si le serveur est déjà en mémoire ou inconnu, sauf pour
+        un serveur d'un autre processus du cluster, toujours relu. Les appels
+        concurrents pour un même serveur partagent la même lecture.
+        """
+        guild_id = str(guild_id)
+        refresh = self.lazy and not self.owns(guild_id)
+        if not refresh and (self.data.is_resident(guild_id) or guild_id not in self.data.known):
+            return
+        future = self._loading.get(guild_id)
+        if future is None:
+            future = self._loading[guild_id] = asyncio.ensure_future(self._prefetch(guild_id, refresh))
+            future.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+        await asyncio.shield(future)
+
+    async def _prefetch(self, guild_id, refresh=False):
+        try:
+            doc = await run_in_storage_thread(self._fetch_guild, guild_id)
+        except Exception as e:
+            log.error("❌ Erreur lors du chargement du serveur %s (%s): %s", guild_id, self.namespace, e)
+            return
+        if refresh:
+            # La copie en mémoire (et ce qui en dérive) est remplacée par la version du propriétaire
+            if doc is None:
+                return
+            self._forget(guild_id)
+            self.data.known.add(guild_id)
+        elif self.data.is_resident(guild_id) or guild_id not in self.data.known:
+            # Un accès synchrone a pu le charger (et le modifier) pendant la lecture
+            return
+        self.data.misses += 1
+        try:
+            self._install(guild_id, doc)
+        except KeyError:
+            pass
+
+    def _evict(self, keep=None):
+        """Évince les serveurs les moins récemment utilisés au-delà du budget.
+
+        Un serveur modifié (ou en cours d'écriture) n'est jamais évincé :
+        s'il bloque le budget, une écriture est demandée pour le libérer.
+        """
+        if not self.lazy:
+            return
+        resident = self.data.resident()
+        guilds = len(resident)
+        users = self.data.resident_users() if self.max_users > 0 else 0
+        if (self.max_guilds <= 0 or guilds <= self.max_guilds) and (self.max_users <= 0 or users <= self.max_users):
+            return
+
+        now = time.monotonic()
+        blocked = False
+        for guild_id, doc in resident:
+            over_guilds = self.max_guilds > 0 and guilds > self.max_guilds
+            over_users = self.max_users > 0 and users > self.max_users
+            if not over_guilds and not over_users:
+                break
+            if now - self.data.idle_since(guild_id) < self.min_idle:
+                # La suite est encore plus récente
+                break
+            if guild_id == keep:
+                continue
+            if guild_id in self.dirty or guild_id in self._inflight:
+                blocked = True
+                continue
+            self.data.evict(guild_id)
+            guilds -= 1
+            users -= len(doc.get("users", ())) if isinstance(doc, dict) else 0
+            self._forget(guild_id)
+
+        if blocked and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _forget(self, guild_id):
+        """Prévient les cogs que les données en mémoire d'un serveur ne sont plus valides."""
+        for callback in self.on_evict:
+            try:
+                callback(guild_id)
+            except Exception:
+                log.exception("❌ Erreur après l'éviction du serveur %s (%s)", guild_id, self.namespace)
+
+    def mark_dirty(self, guild_id, user_id=None):
+        """Signale qu'un serveur (et éventuellement un utilisateur) a changé."""
+        guild_id = str(guild_id)
+        if not self.owns(guild_id):
+            # Serveur d'un autre processus du cluster : c'est lui qui l'écrit
+            return
+        if guild_id not in self.dirty:
+            self.dirty[guild_id] = set()
+            self.dirty_count += 1
+        if user_id is not None:
+            users = self.dirty[guild_id]
+            user_id = int(user_id)
+            if user_id not in users:
+                users.add(user_id)
+                self.dirty_count += 1
+
+        if self.dirty_count >= self.max_dirty and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def save(self):
+        """Écrit les changements en attente.
+
+        Les appels qui arrivent pendant une écriture sont regroupés : ils
+        attendent tous la même écriture suivante.
+        """
+        if self._queued is None:
+            self._queued = asyncio.ensure_future(self._write_after(self._writing))
+        else:
+            self.coalesced_saves += 1
+        return await asyncio.shield(self._queued)
+
+    async def _write_after(self, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+        current = self._queued
+        self._writing = current
+        self._queued = None
+        try:
+            return await self._write()
+        finally:
+            if self._writing is current:
+                self._writing = None
+
+    async def _write(self):
+        if not self.dirty:
+            self._evict()
+            return True
+
+        # Copie des serveurs modifiés dans la boucle : les handlers peuvent
+        # continuer à modifier self.data pendant l'écriture.
+        start = time.perf_counter()
+        dirty = self.dirty
+        self.dirty = {}
+        self.dirty_count = 0
+        partial = getattr(self.backend, "partial_writes", False)
+        docs = {}
+        for guild_id, users in dirty.items():
+            doc = self.data.peek(guild_id)
+            if doc is not None:
+                docs[guild_id] = snapshot_guild(doc, users if partial else None)
+            elif guild_id in self.data:
+                # Jamais évincé sale : une modification arrivée après l'éviction serait perdue
+                log.warning("⚠️ Serveur %s (%s) modifié hors de la mémoire, changement ignoré", guild_id, self.namespace)
+        self._inflight = set(docs)
+        # Les backends travaillent avec les ids texte du format disque
+        changes = {guild_id: {str(user_id) for user_id in users} for guild_id, users in dirty.items()}
+        self.last_snapshot_duration = time.perf_counter() - start
+
+        loop = asyncio.get_running_loop()
+        try:
+            ok = await loop.run_in_executor(_executor, self.backend.write, self.namespace, docs, changes)
+        except Exception as e:
+            log.error("❌ Erreur lors de l'écriture de %s: %s", self.namespace, e)
+            ok = False
+        finally:
+            self._inflight = set()
+        duration = time.perf_counter() - start
+
+        self.last_flush_duration = duration
+        self.flush_time_total += duration
+        metrics.observe("flush", self.namespace, duration, error=not ok)
+        if not ok:
+            # On remet les entrées sales : la prochaine écriture réessaiera
+            self.flush_errors += 1
+            for guild_id, users in dirty.items():
+                for user_id in users:
+                    self.mark_dirty(guild_id, user_id)
+                self.mark_dirty(guild_id)
+            return False
+
+        self.flush_count += 1
+        self._evict()
+        return True
+
+    def start(self):
+        """Lance la tâche d'écriture en arrière-plan (à appeler dans la boucle)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                break
+            await self.save()
+
+    async def close(self):
+        """Arrête la tâche de fond et force une dernière écriture."""
+        if self._task is not None:
+            # Pas d'annulation : sous Python 3.11, wait_for peut l'avaler si
+            # le réveil arrive au même moment, et la tâche ne s'arrêterait jamais
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.save()
+
+    def stats(self):
+        """Retourne les compteurs d'écriture pour le suivi des performances."""
+        return {
+            "namespace": self.namespace,
+            "backend": getattr(self.backend, "name", None),
+            "pending": self.dirty_count,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "flush_time_total": self.flush_time_total,
+            "last_flush_duration": self.last_flush_duration,
+            "last_snapshot_duration": self.last_snapshot_duration,
+            "avg_flush_duration": self.flush_time_total / self.flush_count if self.flush_count else 0.0,
+            "coalesced_saves": self.coalesced_saves,
+            "load_duration": self.load_duration,
+            "lazy": self.lazy,
+            **self.data.stats(),
+        }
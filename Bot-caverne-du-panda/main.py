@@ -1,6 +1,18 @@
+import time
+BOOT = time.perf_counter()  # avant les imports lourds : début du profil de démarrage
+
 import os
+import signal
+import asyncio
+import logging
 import discord
-from discord.ext import commands, tasks
+from discord.ext import tasks
+from core.cluster import CLUSTER_ID, SHARD_COUNT, SHARD_IDS, is_primary, make_bot
+from core.log import setup_logging
+from core.metrics import InstrumentedTree
+from core.startup import StartupProfile, sync_tree
+
+log = logging.getLogger("bot")
 
 # ---- INTENTS ----
 intents = discord.Intents.default()
@@ -10,63 +22,96 @@ intents.guilds = True
 intents.invites = True
 
 # ---- BOT ----
-bot = commands.Bot(command_prefix="!", intents=intents)
+# InstrumentedTree mesure la durée de chaque commande slash ; en mode cluster
+# (lancé par cluster.py), AutoShardedBot ne gère que les shards de ce processus
+bot = make_bot(command_prefix="!", intents=intents, tree_cls=InstrumentedTree)
+profile = StartupProfile(BOOT)
+tree_synced = False  # on_ready est rappelé à chaque reconnexion
 
 # ---- KEEP AWAKE FUNCTION ----
 @tasks.loop(minutes=10)
 async def keep_awake():
     """Empêche le bot de s'endormir sur Render."""
-    print("🔄 Keep-awake ping - Bot toujours actif !")
+    log.debug("🔄 Keep-awake ping - Bot toujours actif !")
 
 # ---- LOAD COGS ----
+async def load_extension(filename):
+    start = time.perf_counter()
+    try:
+        await bot.load_extension(f"cogs.{filename[:-3]}")
+    except Exception as e:
+        log.exception("   ❌ Erreur lors du chargement de %s: %s", filename, e)
+        return False
+    profile.cog_loaded(filename, time.perf_counter() - start)
+    log.info("   ✅ %s chargé avec succès", filename)
+    return True
+
 async def load_cogs():
-    print("📦 Chargement des cogs...")
-    cogs_loaded = 0
-    for filename in os.listdir("./cogs"):
-        if filename.endswith(".py") and not filename.startswith("_"):
-            try:
-                await bot.load_extension(f"cogs.{filename[:-3]}")
-                print(f"   ✅ {filename} chargé avec succès")
-                cogs_loaded += 1
-            except Exception as e:
-                print(f"   ❌ Erreur lors du chargement de {filename}: {e}")
-    print(f"📊 Total : {cogs_loaded} cog(s) chargé(s)\n")
+    log.info("📦 Chargement des cogs...")
+    start = time.perf_counter()
+    filenames = sorted(
+        filename for filename in os.listdir("./cogs")
+        if filename.endswith(".py") and not filename.startswith("_")
+    )
+    # Un cog après l'autre : la durée mesurée pour chacun est bien la sienne
+    loaded = 0
+    for filename in filenames:
+        loaded += await load_extension(filename)
+    log.info("📊 Total : %d cog(s) chargé(s) en %.2f s", loaded, time.perf_counter() - start)
+    profile.report_cogs(bot)
 
 # ---- ON READY ----
 @bot.event
 async def on_ready():
-    print(f"\n{'='*50}")
-    print(f"🔵 Le bot est connecté en tant que {bot.user}")
-    print(f"📊 Connecté à {len(bot.guilds)} serveur(s)")
-    print(f"{'='*50}\n")
+    global tree_synced
+    profile.mark_ready(bot)
+    log.info("🔵 Le bot est connecté en tant que %s", bot.user)
+    log.info("📊 Connecté à %d serveur(s)", len(bot.guilds))
+    if SHARD_COUNT:
+        log.info("🧩 Cluster %d : shard(s) %s sur %d", CLUSTER_ID, SHARD_IDS or "tous", SHARD_COUNT)
 
     # Démarrer la boucle keep-awake
     if not keep_awake.is_running():
         keep_awake.start()
-        print("✅ Système keep-awake activé (ping toutes les 10 minutes)")
+        log.info("✅ Système keep-awake activé (ping toutes les 10 minutes)")
 
-    # Synchroniser les commandes slash
-    try:
-        synced = await bot.tree.sync()
-        print(f"✅ {len(synced)} commande(s) slash synchronisée(s)")
-        print(f"\n📋 Liste des commandes disponibles :")
-        for cmd in synced:
-            print(f"   • /{cmd.name} - {cmd.description}")
-        print(f"\n{'='*50}")
-    except Exception as e:
-        print(f"❌ Erreur lors de la synchronisation : {e}")
+    # Synchroniser les commandes slash, une fois par session et seulement si elles ont changé.
+    # Les commandes sont globales : en mode cluster, seul le premier processus s'en charge.
+    if not tree_synced and not is_primary():
+        tree_synced = True
+    if not tree_synced:
+        try:
+            synced = await sync_tree(bot)
+            tree_synced = True
+            if synced is not None:
+                log.info("✅ %d commande(s) slash synchronisée(s)", len(synced))
+                if log.isEnabledFor(logging.DEBUG):
+                    for cmd in synced:
+                        log.debug("   • /%s - %s", cmd.name, cmd.description)
+        except Exception as e:
+            log.error("❌ Erreur lors de la synchronisation : %s", e)
 
-    print("✅ Bot opérationnel et protégé contre l'endormissement !\n")
+    log.info("✅ Bot opérationnel et protégé contre l'endormissement !")
 
 # ---- START BOT ----
 async def main():
-    await load_cogs()
+    setup_logging()
     token = os.environ.get("Token_bot")
     if not token:
         raise ValueError("❌ Le token n'est pas défini dans les variables d'environnement.")
-    await bot.start(token)
+
+    # Arrêt propre sur SIGTERM (redémarrage Discloud) : bot.close() décharge
+    # les cogs, ce qui force l'écriture des données en attente.
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except NotImplementedError:
+        pass
+
+    async with bot:
+        await load_cogs()
+        await bot.start(token)
 
 # ---- RUN ----
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())